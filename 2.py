@@ -1,17 +1,21 @@
 import time
 import csv
 import os
-import re
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.webdriver.support.ui import WebDriverWait
 from bs4 import BeautifulSoup
 import urllib.parse
 
+from scraping_task import tracing
+from scraping_task.chromedriver import make_chrome
+from scraping_task.dates import date_from_text, month_name
+from scraping_task.rate_scheduler import default_scheduler
+
+# Google page loads are paced by the shared per-host scheduler instead of fixed sleeps
+scheduler = default_scheduler()
+
 def setup_driver():
     """Set up and return a Chrome webdriver."""
     chrome_options = Options()
@@ -22,14 +26,15 @@ def setup_driver():
     chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
     chrome_options.add_argument("--log-level=3")
     
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    # Cached driver path: no version check or download on every start
+    driver = make_chrome(chrome_options)
     return driver
 
 def google_search(driver, query):
     """Perform a Google search with the given query and handle verification."""
     print("Opening Google...")
-    driver.get("https://www.google.com")
+    with scheduler.slot("https://www.google.com"):
+        driver.get("https://www.google.com")
     
     # Accept cookies if the dialog appears
     try:
@@ -70,8 +75,14 @@ def navigate_to_page(driver, query, page_num):
         url += f"&start={start_index}"
         
     print(f"Navigating to page {page_num} with URL: {url}")
-    driver.get(url)
-    time.sleep(3)  # Allow time for the page to load
+    with scheduler.slot(url) as slot:
+        driver.get(url)
+        # Wait for the page to load rather than a fixed 3 s
+        WebDriverWait(driver, 30).until(lambda d: d.execute_script("return document.readyState") == "complete")
+        if "/sorry/" in driver.current_url:
+            # Google's rate limit is a CAPTCHA page: slow down for the next pages
+            slot.throttled()
+            input("Google is asking for verification. Complete it, then press Enter to continue...")
     
     if page_num > 1:
         # Give additional time for the second page and validate we're actually on page 2
@@ -85,60 +96,11 @@ def navigate_to_page(driver, query, page_num):
 
 def extract_date_from_link(link):
     """Extract month and year from link if available."""
-    month = None
-    year = None
-    
-    # Try to find patterns like MM.YYYY or MM/YYYY or similar in the URL or filename
-    date_patterns = [
-        r'(\d{1,2})\.(\d{4})',  # MM.YYYY
-        r'(\d{1,2})/(\d{4})',   # MM/YYYY
-        r'(\d{1,2})-(\d{4})',   # MM-YYYY
-        r'(\d{1,2})_(\d{4})',   # MM_YYYY
-    ]
-    
-    for pattern in date_patterns:
-        matches = re.search(pattern, link)
-        if matches:
-            try:
-                month_num = int(matches.group(1))
-                year = matches.group(2)
-                
-                # Convert month number to name
-                if 1 <= month_num <= 12:
-                    month = datetime(2000, month_num, 1).strftime('%b')
-                    return month, year
-            except:
-                continue
-    
-    # Try to find month names in the URL
-    month_patterns = [
-        r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[^a-z].*?(\d{4})',
-        r'(january|february|march|april|may|june|july|august|september|october|november|december)[^a-z].*?(\d{4})'
-    ]
-    
-    for pattern in month_patterns:
-        matches = re.search(pattern, link.lower())
-        if matches:
-            try:
-                month_str = matches.group(1)
-                year = matches.group(2)
-                
-                # Convert full month name to abbreviated version if needed
-                if len(month_str) > 3:
-                    month_map = {
-                        'january': 'Jan', 'february': 'Feb', 'march': 'Mar', 'april': 'Apr',
-                        'may': 'May', 'june': 'Jun', 'july': 'Jul', 'august': 'Aug',
-                        'september': 'Sep', 'october': 'Oct', 'november': 'Nov', 'december': 'Dec'
-                    }
-                    month = month_map.get(month_str)
-                else:
-                    month = month_str.capitalize()
-                
-                return month, year
-            except:
-                continue
-    
-    return month, year
+    # Numeric MM.YYYY-style dates first, then month names (patterns are compiled once in scraping_task.dates)
+    month, year = date_from_text(link)
+    if month is None:
+        return None, None
+    return month_name(month, abbreviated=True), str(year)
 
 def extract_links(driver, page_number=1):
     """Extract links from Google search results."""
@@ -200,31 +162,34 @@ def save_to_file(results, filename="2.csv"):
 
 def main():
     query = input("Enter your search query: ")
-    driver = setup_driver()
+    # Timing report, when SCRAPING_TASK_TRACE (or SCRAPING_TASK_PROFILE) is set
+    tracing.start("search")
+    with tracing.span("driver"):
+        driver = setup_driver()
     all_results = []
     
     try:
-        # Initial search and verification
-        google_search(driver, query)
-        time.sleep(2)
+        # Initial search and verification (the wait for a CAPTCHA is part of this span)
+        with tracing.span("search"):
+            google_search(driver, query)
         
         # Loop through pages 1 to 4
         for page_num in range(1, 5):
             # Navigate to the specific page (page 1 is already loaded after initial search)
             if page_num > 1:
-                navigate_to_page(driver, query, page_num)
+                with tracing.span("navigate", page=page_num):
+                    navigate_to_page(driver, query, page_num)
             
             # Take a screenshot for verification
             driver.save_screenshot(f"page{page_num}_results.png")
             print(f"Saved screenshot of page {page_num} results")
             
             # Extract links from current page
-            page_results = extract_links(driver, page_number=page_num)
+            with tracing.span("extract_links", page=page_num):
+                page_results = extract_links(driver, page_number=page_num)
+            tracing.count("results", len(page_results))
             all_results.extend(page_results)
             print(f"Found {len(page_results)} results on web search page {page_num}.")
-            
-            # Short delay between page navigations
-            time.sleep(2)
         
         # Print a preview of the results with month and year information
         print(f"\nTotal results found: {len(all_results)}")
@@ -247,6 +212,7 @@ def main():
     finally:
         print("Closing browser...")
         driver.quit()
+        tracing.finish()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
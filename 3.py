@@ -5,31 +5,45 @@ import csv
 from datetime import datetime
 import os
 
+from scraping_task import tracing
+from scraping_task.dates import MONTH_NAMES, month_name
+from scraping_task.rate_scheduler import ScheduledSession
+
+# Month name pattern for regex
+MONTHS_PATTERN = "|".join(MONTH_NAMES)
+
+# Link patterns, compiled once rather than for every link on the page
+GUIDELINE_URL = re.compile(r'\/(\d{2})\.(\d{4})_Commercial\s*Truck')
+ALT_GUIDELINE_URL = re.compile(r'(\d{2})\.(\d{4}).*(?:Commercial.*Truck|Truck.*Guidelines)', re.IGNORECASE)
+ARTICLE_URL = re.compile(rf'/article/.*(?:{MONTHS_PATTERN}).*(?:truck|auction)', re.IGNORECASE)
+LINK_TEXT_PATTERNS = [
+    re.compile(rf"(?:Download the|Read the)(?: free)?(?: monthly)? (?:({MONTHS_PATTERN})(?: (\d{{4}}))?) "
+               r"Commercial Truck Guidelines", re.IGNORECASE),
+    re.compile(rf"({MONTHS_PATTERN}) (\d{{4}}) Commercial Truck Guidelines", re.IGNORECASE),
+]
+MONTHLY_REPORT_TEXT = re.compile(r"free monthly (?:commercial truck )?report", re.IGNORECASE)
+
 def scrape_jdpower_guidelines():
     base_url = "https://www.jdpowervalues.com"
     url = f"{base_url}/industry-guidelines"
     
     # Send request to the website
     try:
-        response = requests.get(url)
+        with tracing.span("fetch", url=url), ScheduledSession() as session:
+            response = session.get(url)
         response.raise_for_status()  # Raise exception for 4XX/5XX responses
     except requests.exceptions.RequestException as e:
         print(f"Error fetching the website: {e}")
         return []
     
     # Parse HTML content
-    soup = BeautifulSoup(response.text, 'html.parser')
+    with tracing.span("parse"):
+        soup = BeautifulSoup(response.text, 'html.parser')
     
     # Find all links
     guidelines_data = []
     links = soup.find_all('a')
-    
-    # Define month names for pattern matching
-    months = ["January", "February", "March", "April", "May", "June", 
-              "July", "August", "September", "October", "November", "December"]
-    
-    # Month name pattern for regex
-    months_pattern = "|".join(months)
+    tracing.count("links", len(links))
     
     for link in links:
         if not link.text:
@@ -51,48 +65,34 @@ def scrape_jdpower_guidelines():
         year = None
         
         # Case 1: URL contains month.year pattern
-        url_match = re.search(r'\/(\d{2})\.(\d{4})_Commercial\s*Truck', href)
+        url_match = GUIDELINE_URL.search(href)
         if url_match:
-            month_num = url_match.group(1)
             year = url_match.group(2)  # This captures the actual year from URL
-            try:
-                month = datetime.strptime(month_num, "%m").strftime("%B")
-                is_guideline = True
-            except ValueError:
-                pass
+            month = month_name(url_match.group(1))
+            is_guideline = month is not None
         
         # Also check for alternative URL patterns
         if not is_guideline:
-            alt_url_match = re.search(r'(\d{2})\.(\d{4}).*(?:Commercial.*Truck|Truck.*Guidelines)', href, re.IGNORECASE)
+            alt_url_match = ALT_GUIDELINE_URL.search(href)
             if alt_url_match:
-                month_num = alt_url_match.group(1)
                 year = alt_url_match.group(2)
-                try:
-                    month = datetime.strptime(month_num, "%m").strftime("%B")
-                    is_guideline = True
-                except ValueError:
-                    pass
+                month = month_name(alt_url_match.group(1))
+                is_guideline = month is not None
                 
         # If not found in URL, try to extract from text
         if not is_guideline:
             # Check if "february" appears in the URL path or article title related to trucks
-            if re.search(r'/article/.*(?:february|march|january|april|may|june|july|august|september|october|november|december).*(?:truck|auction)', href, re.IGNORECASE):
-                # Extract month from URL
-                for m in months:
-                    if m.lower() in href.lower():
-                        month = m
-                        break
+            if ARTICLE_URL.search(href):
+                # Extract month from URL (the first month in calendar order, as before)
+                href_lower = href.lower()
+                month = next(m for m in MONTH_NAMES if m.lower() in href_lower)
                 # Use current year as default if no year in URL
                 year = str(datetime.now().year)
                 is_guideline = True
             
             # Various text patterns
-            pattern1 = rf"(?:Download the|Read the)(?: free)?(?: monthly)? (?:({months_pattern})(?: (\d{{4}}))?) Commercial Truck Guidelines"
-            pattern2 = rf"({months_pattern}) (\d{{4}}) Commercial Truck Guidelines"
-            pattern3 = r"free monthly (?:commercial truck )?report"
-            
-            for pattern in [pattern1, pattern2]:
-                match = re.search(pattern, link_text, re.IGNORECASE)
+            for pattern in LINK_TEXT_PATTERNS:
+                match = pattern.search(link_text)
                 if match:
                     month = match.group(1)
                     # Group 2 might not exist in some patterns
@@ -101,7 +101,7 @@ def scrape_jdpower_guidelines():
                     break
                     
             # For generic monthly report links without specific month/year
-            if not is_guideline and re.search(pattern3, link_text, re.IGNORECASE):
+            if not is_guideline and MONTHLY_REPORT_TEXT.search(link_text):
                 is_guideline = True
                 # Use current date for generic monthly reports
                 current_date = datetime.now()
@@ -142,9 +142,11 @@ def save_to_csv(data, filename="commercial_truck_guidelines.csv"):
     print(f"Data saved to {filepath}")
     return filepath
 
-def main():
+def scrape_and_save():
     print("Scraping JD Power Commercial Truck Guidelines...")
-    guidelines_data = scrape_jdpower_guidelines()
+    with tracing.span("scrape"):
+        guidelines_data = scrape_jdpower_guidelines()
+    tracing.count("guidelines", len(guidelines_data))
     
     if guidelines_data:
         print(f"Found {len(guidelines_data)} Commercial Truck Guidelines links")
@@ -157,5 +159,10 @@ def main():
     else:
         print("No Commercial Truck Guidelines links found")
 
+def main():
+    # Timing report, when SCRAPING_TASK_TRACE (or SCRAPING_TASK_PROFILE) is set
+    with tracing.run("guidelines"):
+        scrape_and_save()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,20 @@
 import os
 import pandas as pd
-import glob
 import time
 
+from scraping_task.catalogue_store import CatalogueStore
+from scraping_task.image_catalogue import ImageCatalogue
+
 # Define the CSV file path
 csv_file_path = r"C:\Users\clint\Desktop\Scraping Task\df_6.csv"
 
+# Notes are written to the catalogue store as they are made; df_6.csv seeds it on the first run
+store = CatalogueStore(r"C:\Users\clint\Desktop\Scraping Task\catalogue.sqlite")
+if len(store) == 0:
+    store.import_csv(csv_file_path)
+
 # Load the dataframe
-data = pd.read_csv(csv_file_path)
+data = pd.DataFrame(store.rows())
 
 # Convert date column to datetime format
 data['date'] = pd.to_datetime(data['date'])
@@ -19,10 +26,13 @@ data = data.sort_values(by='date')
 pdf_directory = r"C:\Users\clint\Desktop\Scraping Task\pdfs"
 image_directory = r"C:\Users\clint\Desktop\Scraping Task\pdfs\Images"
 
-# Function to save dataframe to CSV
+# Index the images by PDF once instead of globbing the directory for every PDF
+catalogue = ImageCatalogue(image_directory)
+
+# Function to export the catalogue to CSV
 def save_dataframe():
     new_csv_file_path = r"C:\Users\clint\Desktop\Scraping Task\df_7.csv"
-    data.to_csv(new_csv_file_path, index=False)
+    store.export_csv(new_csv_file_path, "df_7")
     print(f"CSV file updated at: {new_csv_file_path}")
 
 # Function to open a file with default Windows application
@@ -39,15 +49,8 @@ def open_file(file_path):
 
 # Function to update note column preserving existing content
 def update_note(index, message):
-    if pd.isna(data.loc[index, 'note']):
-        data.loc[index, 'note'] = message
-    else:
-        data.loc[index, 'note'] = f"{data.loc[index, 'note']}; {message}"
-    
-    # Save the changes immediately to CSV
-    save_dataframe()
-    
-    return data.loc[index, 'note']
+    # A single-row update, committed immediately; the CSV is exported once at the end
+    return store.append_note(data.loc[index, 'pdf_filename'], message)
 
 
 # Iterate through each row in the dataframe (sorted by date)
@@ -66,26 +69,9 @@ for index, row in data.iterrows():
     if open_file(pdf_path):
         input(f"Opened {pdf_filename}. Press Enter to continue to associated images...")
         
-        # Try multiple patterns to find associated images
-        # Pattern 1: Exact prefix match (e.g., "01_2018_*.png")
-        image_pattern = os.path.join(image_directory, f"{pdf_basename}_*.png")
-        matching_images = glob.glob(image_pattern)
-        
-        # Pattern 2: Try with dashes instead of underscores in case of naming inconsistency
-        if not matching_images:
-            alt_basename = pdf_basename.replace('_', '-')
-            image_pattern = os.path.join(image_directory, f"{alt_basename}*.png")
-            matching_images.extend(glob.glob(image_pattern))
-        
-        # Pattern 3: Try more lenient matching (any file containing the basename)
-        if not matching_images:
-            # Get all image files
-            all_image_files = glob.glob(os.path.join(image_directory, "*.png"))
-            # Filter those containing the basename
-            matching_images = [img for img in all_image_files if pdf_basename.lower() in os.path.basename(img).lower()]
-        
-        # Debug info
-        print(f"Using pattern: {image_pattern}")
+        # Images whose names start with this PDF's MM_YYYY (or MM-YYYY)
+        catalogue.refresh()
+        matching_images = [image.path for image in catalogue.images_for(pdf_filename)]
         print(f"Found {len(matching_images)} matching images")
         
         delete_count = 0
@@ -110,6 +96,7 @@ for index, row in data.iterrows():
                         if decision == 'd' or decision == 'delete':
                             try:
                                 os.remove(img_path)
+                                catalogue.remove(img_path)
                                 delete_count += 1
                                 print(f"Deleted: {img_filename}")
                                 break
@@ -144,4 +131,4 @@ for index, row in data.iterrows():
 
 # Final save of the dataframe as a safeguard
 save_dataframe()
-print("Process complete. All changes have been saved.")d
+print("Process complete. All changes have been saved.")
@@ -0,0 +1,7 @@
+"""
+Reusable building blocks for the Commercial Truck Guidelines scraping task.
+
+The numbered scripts and notebooks in the repository root remain the
+interactive entry points; the modules in this package hold the pieces that
+are shared between them or that need to run unattended.
+"""
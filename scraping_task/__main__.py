@@ -0,0 +1,5 @@
+import sys
+
+from scraping_task.cli import main
+
+sys.exit(main())
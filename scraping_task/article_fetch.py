@@ -0,0 +1,165 @@
+"""
+Fetch layer for the jdpowervalues article scraper (1.py).
+
+Pages are first fetched with a plain HTTP request and parsed with
+BeautifulSoup. A headless Chrome is only started, once, for pages where
+that fails: listing pages without article links, or articles where neither
+the "March 15, 2023" date pattern nor the .date/.post-date/time selectors
+match in the static HTML. Both paths take their slots from the same per-host
+rate scheduler.
+"""
+import re
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+
+from scraping_task import tracing
+from scraping_task.dates import MONTH_NAMES
+from scraping_task.rate_scheduler import ScheduledSession, default_scheduler
+
+MONTHS = "(" + "|".join(MONTH_NAMES) + ")"
+
+# Dates in format like "March 15, 2023"
+DATE_PATTERN = re.compile(MONTHS + r'\s+\d{1,2},\s+(\d{4})')
+MONTH_PATTERN = re.compile(MONTHS)
+YEAR_PATTERN = re.compile(r'\b(20\d{2})\b')
+
+DATE_SELECTORS = ".date, .post-date, .article-date, .meta-date, time"
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+
+def find_date(page_source, element_texts=()):
+    """
+    Month and year from a page's source, or from the text of its date
+    elements when the source has no full date. Returns (month, year) or
+    (None, None).
+    """
+    match = DATE_PATTERN.search(page_source)
+    if match:
+        return match.group(1), match.group(2)
+
+    for date_text in element_texts:
+        month_match = MONTH_PATTERN.search(date_text)
+        year_match = YEAR_PATTERN.search(date_text)
+        if month_match and year_match:
+            return month_match.group(1), year_match.group(1)
+
+    return None, None
+
+
+def article_links_from_html(html, page_url, base_url):
+    """Absolute /article/ links on a listing page, without duplicates."""
+    soup = BeautifulSoup(html, "html.parser")
+    links = set()
+    for a in soup.find_all("a", href=True):
+        href = urljoin(page_url, a["href"])
+        if href.startswith('http') and '/article/' in href and href != base_url:
+            links.add(href)
+    return sorted(links)
+
+
+def make_headless_driver():
+    """Headless Chrome for the pages plain HTTP cannot handle."""
+    # Imported here so the HTTP-only path never loads selenium
+    from selenium.webdriver.chrome.options import Options
+
+    from scraping_task.chromedriver import make_chrome
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    return make_chrome(chrome_options)
+
+
+class ArticleFetcher:
+    """HTTP-first page fetcher with a lazily started browser fallback."""
+
+    def __init__(self, timeout=20, driver_factory=make_headless_driver, session=None, scheduler=None):
+        self.timeout = timeout
+        self.driver_factory = driver_factory
+        self.scheduler = scheduler or default_scheduler()
+        self.session = session or ScheduledSession(self.scheduler)
+        self.session.headers.setdefault("User-Agent", USER_AGENT)
+        self._driver = None
+        self.stats = {"http": 0, "browser": 0}
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            print("Starting headless browser for pages that need rendering...")
+            self._driver = self.driver_factory()
+        return self._driver
+
+    def _get_html(self, url):
+        """Static HTML of a page, or None if the request fails."""
+        with tracing.span("fetch", via="http") as span:
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                span.set(status=response.status_code, bytes=len(response.content))
+                response.raise_for_status()
+                return response.text
+            except requests.RequestException as e:
+                print(f"HTTP fetch failed for {url}: {e}")
+                return None
+
+    def _render(self, url):
+        """Load a page in the browser and wait until the document is ready."""
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        with tracing.span("fetch", via="browser"), self.scheduler.slot(url):
+            self.driver.get(url)
+            WebDriverWait(self.driver, self.timeout).until(
+                lambda d: d.execute_script("return document.readyState") == "complete")
+            return self.driver.page_source
+
+    def listing_links(self, page_url, base_url):
+        """Article links on a listing page."""
+        with tracing.span("listing", url=page_url):
+            html = self._get_html(page_url)
+            if html is not None:
+                with tracing.span("parse"):
+                    links = article_links_from_html(html, page_url, base_url)
+                if links:
+                    self.stats["http"] += 1
+                    tracing.count("pages_http")
+                    return links
+
+            self.stats["browser"] += 1
+            tracing.count("pages_browser")
+            html = self._render(page_url)
+            with tracing.span("parse"):
+                return article_links_from_html(html, page_url, base_url)
+
+    def article_date(self, url):
+        """(month, year) published on an article page, or (None, None)."""
+        with tracing.span("article", url=url):
+            html = self._get_html(url)
+            if html is not None:
+                with tracing.span("parse"):
+                    soup = BeautifulSoup(html, "html.parser")
+                    element_texts = [el.get_text(" ", strip=True) for el in soup.select(DATE_SELECTORS)]
+                    month, year = find_date(html, element_texts)
+                if month:
+                    self.stats["http"] += 1
+                    tracing.count("pages_http")
+                    return month, year
+
+            # The date is probably rendered by JavaScript
+            from selenium.webdriver.common.by import By
+
+            self.stats["browser"] += 1
+            tracing.count("pages_browser")
+            page_source = self._render(url)
+            with tracing.span("parse"):
+                element_texts = [el.text.strip() for el in self.driver.find_elements(By.CSS_SELECTOR, DATE_SELECTORS)]
+                return find_date(page_source, element_texts)
+
+    def close(self):
+        if self._driver is not None:
+            self._driver.quit()
+            self._driver = None
+        self.session.close()
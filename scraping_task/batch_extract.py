@@ -0,0 +1,309 @@
+"""
+Batch entry point for the 5.ipynb and 5_5.ipynb extractors.
+
+PDFs (or individual pages) are spread over a process pool. Workers only
+detect and encode; the parent process is the single writer for both the
+chart images and pdf_image_data.csv, so CSV rows are never interleaved.
+Image files are written on an ImageWriter's threads while the pool keeps
+extracting; a PDF is recorded only once all of its charts are on disk.
+PDFs whose content and extractor parameters are unchanged since a previous
+run are served from the result cache without being opened.
+
+Usage:
+    python -m scraping_task.batch_extract --workers 8
+    python -m scraping_task.batch_extract --by-page --pdf-dir backup_pdfs
+    python -m scraping_task.batch_extract --extractor images --no-cache
+    python -m scraping_task.batch_extract --image-format webp --image-quality 85
+    python -m scraping_task.batch_extract --trace-report traces/ --profile sample
+"""
+import argparse
+import csv
+import datetime
+import multiprocessing
+import os
+
+import fitz  # PyMuPDF
+
+from scraping_task import chart_extractor, image_extractor, tracing
+from scraping_task.catalogue_store import CatalogueStore
+from scraping_task.image_writer import EXTENSIONS, ImageWriter
+from scraping_task.result_cache import DEFAULT_MAX_BYTES, ResultCache
+
+CSV_FIELDNAMES = ['date_extracted', 'pdf_filename', 'accepted_images_count']
+
+DEFAULT_CACHE_DIR = ".extract_cache"
+
+# Per-extractor entry points: rendered-page charts (5_5.ipynb) and embedded images (5.ipynb)
+EXTRACTORS = {
+    "charts": {
+        "defaults": chart_extractor.DEFAULT_PARAMS,
+        "pdf": chart_extractor.extract_charts_from_pdf,
+        "page": chart_extractor.extract_page_charts_from_file,
+        "pages": chart_extractor.pages_to_process,
+        "name": chart_extractor.name_page_charts,
+    },
+    "images": {
+        "defaults": image_extractor.DEFAULT_PARAMS,
+        "pdf": image_extractor.extract_images_from_pdf,
+        "page": image_extractor.extract_page_images_from_file,
+        "pages": image_extractor.pages_to_process,
+        "name": image_extractor.name_page_images,
+    },
+}
+
+
+def _process_pdf(task):
+    """Worker: extract every chart of one PDF."""
+    extractor, pdf_dir, pdf_file, params = task
+    try:
+        outputs = EXTRACTORS[extractor]["pdf"](os.path.join(pdf_dir, pdf_file), params=params)
+        return pdf_file, outputs, None
+    except Exception as e:
+        return pdf_file, None, str(e)
+    finally:
+        tracing.flush()
+
+
+def _process_page(task):
+    """Worker: extract the charts of a single page."""
+    extractor, pdf_dir, pdf_file, page_num, params = task
+    try:
+        charts = EXTRACTORS[extractor]["page"](os.path.join(pdf_dir, pdf_file), page_num, params=params)
+        return pdf_file, page_num, charts, None
+    except Exception as e:
+        return pdf_file, page_num, None, str(e)
+    finally:
+        tracing.flush()
+
+
+def write_outputs(output_dir, outputs):
+    """Write (filename, bytes) pairs produced by the extractor."""
+    for filename, data in outputs:
+        with open(os.path.join(output_dir, filename), "wb") as f:
+            f.write(data)
+
+
+def list_pdfs(pdf_dir):
+    """PDF files in a directory, in a stable order."""
+    return sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith('.pdf'))
+
+
+def _iter_pdf_results(pool, extractor, pdf_dir, pdf_files, params):
+    """Yield (pdf_file, outputs, error) with one task per PDF."""
+    tasks = [(extractor, pdf_dir, pdf_file, params) for pdf_file in pdf_files]
+    for result in pool.imap_unordered(_process_pdf, tasks):
+        yield result
+
+
+def _iter_page_results(pool, extractor, pdf_dir, pdf_files, params):
+    """
+    Yield (pdf_file, outputs, error) with one task per page.
+
+    Pages finish in any order, so each PDF is held back until all of its
+    pages are in and can be numbered in page order.
+    """
+    tasks = []
+    pending = {}
+    for pdf_file in pdf_files:
+        try:
+            with fitz.open(os.path.join(pdf_dir, pdf_file)) as doc:
+                pages = EXTRACTORS[extractor]["pages"](len(doc), params)
+        except Exception as e:
+            yield pdf_file, None, str(e)
+            continue
+        if not pages:
+            yield pdf_file, [], None
+            continue
+        pending[pdf_file] = {"remaining": len(pages), "pages": {}, "error": None}
+        tasks.extend((extractor, pdf_dir, pdf_file, page_num, params) for page_num in pages)
+
+    for pdf_file, page_num, charts, error in pool.imap_unordered(_process_page, tasks):
+        state = pending[pdf_file]
+        state["remaining"] -= 1
+        if error is not None:
+            state["error"] = f"page {page_num + 1}: {error}"
+        else:
+            state["pages"][page_num] = charts
+
+        if state["remaining"] == 0:
+            del pending[pdf_file]
+            if state["error"] is not None:
+                yield pdf_file, None, state["error"]
+            else:
+                page_results = [state["pages"][n] for n in sorted(state["pages"])]
+                yield pdf_file, EXTRACTORS[extractor]["name"](pdf_file, page_results), None
+
+
+def extract_charts_from_all_pdfs(pdf_dir, output_dir, csv_path, workers=None, by_page=False, params=None,
+                                 extractor="charts", cache_dir=DEFAULT_CACHE_DIR, cache_max_bytes=DEFAULT_MAX_BYTES,
+                                 store_path=None):
+    """
+    Extract charts from all PDFs in `pdf_dir` using a pool of `workers`
+    processes (defaults to the number of CPUs).
+
+    `extractor` is "charts" (5_5.ipynb) or "images" (5.ipynb). Pass
+    cache_dir=None to disable the result cache.
+
+    Appends one row per PDF to `csv_path`, like the notebook version, and
+    upserts it into the catalogue store at `store_path` if one is given.
+    Returns the number of PDFs processed successfully.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    pdf_files = list_pdfs(pdf_dir)
+    if not pdf_files:
+        print("No PDF files found in the directory.")
+        return 0
+
+    # Resolve the full parameter set so a change to any default invalidates the cache
+    params = {**EXTRACTORS[extractor]["defaults"], **(params or {})}
+    cache = ResultCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir else None
+
+    workers = workers or os.cpu_count() or 1
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    csv_exists = os.path.isfile(csv_path)
+    store = CatalogueStore(store_path) if store_path else None
+    image_writer = ImageWriter(output_dir)
+
+    total_pdfs_processed = 0
+    total_charts_saved = 0
+
+    try:
+        with open(csv_path, 'a', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES)
+            if not csv_exists:
+                writer.writeheader()
+
+            def record(pdf_file, outputs, source, cache_key=None):
+                """Save a PDF's charts and, once they are all on disk, record it."""
+                nonlocal total_pdfs_processed, total_charts_saved
+                try:
+                    for future in image_writer.write_all(outputs):
+                        future.result()
+                except Exception as e:
+                    print(f"Error saving charts of {pdf_file}: {e}")
+                    return
+                writer.writerow({
+                    'date_extracted': timestamp,
+                    'pdf_filename': pdf_file,
+                    'accepted_images_count': len(outputs)
+                })
+                csvfile.flush()
+                if store is not None:
+                    store.record_extraction(pdf_file, len(outputs), timestamp)
+                if cache_key is not None:
+                    cache.put(cache_key, pdf_file, outputs)
+                    cache.save()
+
+                total_pdfs_processed += 1
+                total_charts_saved += len(outputs)
+                print(f"[{total_pdfs_processed}/{len(pdf_files)}] {pdf_file}: "
+                      f"{len(outputs)} charts saved ({source})")
+
+            # Serve unchanged PDFs from the cache; only the rest go to the pool
+            to_extract = []
+            cache_keys = {}
+            for pdf_file in pdf_files:
+                if cache is None:
+                    to_extract.append(pdf_file)
+                    continue
+                with tracing.span("cache_lookup", pdf=pdf_file):
+                    key = cache.key_for(os.path.join(pdf_dir, pdf_file), extractor, params)
+                    cached = cache.get(key, pdf_file)
+                tracing.count("cache_misses" if cached is None else "cache_hits")
+                if cached is None:
+                    cache_keys[pdf_file] = key
+                    to_extract.append(pdf_file)
+                else:
+                    record(pdf_file, cached, "cached")
+
+            if to_extract:
+                print(f"Extracting {len(to_extract)} PDFs with {workers} worker(s), "
+                      f"one task per {'page' if by_page else 'PDF'}")
+                with multiprocessing.Pool(processes=workers) as pool:
+                    iter_results = _iter_page_results if by_page else _iter_pdf_results
+                    for pdf_file, outputs, error in iter_results(pool, extractor, pdf_dir, to_extract, params):
+                        if error is not None:
+                            print(f"Error processing PDF {pdf_file}: {error}")
+                            continue
+
+                        record(pdf_file, outputs, "extracted", cache_keys.get(pdf_file))
+
+            if cache is not None:
+                cache.save()
+    finally:
+        try:
+            image_writer.close()
+        except OSError:
+            pass  # every failed write was reported with its PDF, which was not recorded
+        if store is not None:
+            store.close()
+
+    print(f"\nComplete! Processed {total_pdfs_processed} PDFs")
+    print(f"Total charts saved: {total_charts_saved}")
+    return total_pdfs_processed
+
+
+# Extractor params that can be set from the command line (argparse dests of the same name)
+_CLI_PARAMS = ("max_render_mb", "image_format", "png_compression", "image_quality", "image_max_side",
+               "encode_threads", "debug_dir", "raster_cache_dir", "raster_cache_mb")
+
+
+def _cli_params(args):
+    """Extractor params set from the command line (only the ones given)."""
+    params = {name: getattr(args, name) for name in _CLI_PARAMS if getattr(args, name) is not None}
+    return params or None
+
+
+def add_chart_arguments(parser):
+    """The charts extractor's rendering and output options, shared with the pipeline."""
+    parser.add_argument("--max-render-mb", type=int, default=None,
+                        help="charts: render each page in bands of at most this many MB per worker")
+    parser.add_argument("--image-format", choices=sorted(EXTENSIONS), default=None,
+                        help="charts: format of the saved crops (default: png)")
+    parser.add_argument("--png-compression", type=int, choices=range(10), default=None, metavar="0-9",
+                        help="charts: PNG compression level (default: OpenCV's)")
+    parser.add_argument("--image-quality", type=int, default=None,
+                        help="charts: WebP/JPEG quality, 1-100 (default: 90)")
+    parser.add_argument("--image-max-side", type=int, default=None,
+                        help="charts: downscale saved crops so their longer side is at most this many pixels")
+    parser.add_argument("--encode-threads", type=int, default=None,
+                        help="charts: encode crops on this many threads per worker (when cores are spare)")
+    parser.add_argument("--debug-dir", default=None,
+                        help="charts: write detection overlays and candidate metrics here")
+    parser.add_argument("--raster-cache-dir", default=None,
+                        help="charts: keep whole-page renders here and reuse them across runs and variants")
+    parser.add_argument("--raster-cache-mb", type=int, default=None,
+                        help="charts: disk budget of the raster cache (default: 8192)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract charts from all guideline PDFs in parallel.")
+    parser.add_argument("--pdf-dir", default=os.path.join("pdfs", "pdfs"))
+    parser.add_argument("--output-dir", default=os.path.join("pdfs", "Images"))
+    parser.add_argument("--csv-path", default="pdf_image_data.csv")
+    parser.add_argument("--extractor", choices=sorted(EXTRACTORS), default="charts",
+                        help="charts: rendered pages (5_5.ipynb), images: embedded images (5.ipynb)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--by-page", action="store_true",
+                        help="Schedule individual pages instead of whole PDFs")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2,
+                        help="Evict least recently used results beyond this size")
+    parser.add_argument("--no-cache", action="store_true", help="Re-extract every PDF")
+    add_chart_arguments(parser)
+    parser.add_argument("--store", default=None, help="Also record each PDF in this catalogue store (SQLite)")
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tracing.run_from_args(args, "extract"):
+        extract_charts_from_all_pdfs(args.pdf_dir, args.output_dir, args.csv_path,
+                                     workers=args.workers, by_page=args.by_page, extractor=args.extractor,
+                                     params=_cli_params(args),
+                                     cache_dir=None if args.no_cache else args.cache_dir,
+                                     cache_max_bytes=args.cache_size_mb * 1024 ** 2, store_path=args.store)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Benchmark for the extraction variants over the committed PDF corpus.
+
+Every variant is run in-process over pdfs/pdfs and backup_pdfs, one PDF at
+a time, recording per-PDF and per-page wall time, peak RSS and images per
+second. The number of images a variant keeps for each PDF is scored against
+accepted_images_count in Reference.csv (or df_8.csv), so a speedup can be
+checked against how many charts it still finds.
+
+Variants:
+    4          embedded images, shape filter only (4.ipynb)
+    5          embedded images with content analysis (5.ipynb)
+    5_5        rendered chart regions (5_5.ipynb, region rendering)
+    5_5_page   rendered whole pages (5_5.ipynb as written)
+    3          fixed strip below "Retail Selling Price" (3.ipynb)
+
+With --raster-cache-dir the rendering variants share one page-raster
+cache, so each page is rendered once for all of them (and for later runs).
+With --trace-report the stage timings (render, threshold, contours, ...)
+are reported as well; they add up over all variants run, so trace one
+variant at a time to compare its stages.
+
+Peak RSS is per PDF on Linux, where the high-water mark can be reset
+through /proc/self/clear_refs; elsewhere it is the process peak so far.
+
+Results are written as JSON; --compare prints the change against an
+earlier results file.
+
+Usage:
+    python -m scraping_task.benchmark --output benchmark.json
+    python -m scraping_task.benchmark --variants 5_5 5_5_page --limit 10 --compare benchmark.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import fitz  # PyMuPDF
+
+from scraping_task import chart_extractor, image_extractor, near_text, tracing
+from scraping_task.dates import canonical_pdf_name
+
+DEFAULT_CORPORA = [os.path.join("pdfs", "pdfs"), "backup_pdfs"]
+
+
+def _page_variant(module, page_func, params):
+    """Run a per-page extractor over a PDF, timing every page."""
+    def run(pdf_path, raster_cache_dir=None):
+        params_full = {**module.DEFAULT_PARAMS, **params}
+        if raster_cache_dir and "raster_cache_dir" in params_full:
+            params_full["raster_cache_dir"] = raster_cache_dir
+        page_seconds = []
+        images = 0
+        with fitz.open(pdf_path) as doc:
+            for page_num in module.pages_to_process(len(doc), params_full):
+                started = time.perf_counter()
+                images += len(page_func(doc[page_num], params=params_full))
+                page_seconds.append(time.perf_counter() - started)
+        return images, page_seconds
+    return run
+
+
+def _near_text_variant(pdf_path, raster_cache_dir=None):
+    """3.ipynb stops at the first page with the heading, so there are no per-page times."""
+    result = near_text.extract_chart_near_text(pdf_path, ["Retail Selling Price"], pixels_above=20,
+                                               pixels_below=300, raster_cache_dir=raster_cache_dir)
+    return (0 if result is None else 1), []
+
+
+VARIANTS = {
+    "4": _page_variant(image_extractor, image_extractor.extract_page_images, image_extractor.SHAPE_ONLY_PARAMS),
+    "5": _page_variant(image_extractor, image_extractor.extract_page_images, {}),
+    "5_5": _page_variant(chart_extractor, chart_extractor.extract_page_charts, {}),
+    "5_5_page": _page_variant(chart_extractor, chart_extractor.extract_page_charts, {"render_mode": "page"}),
+    "3": _near_text_variant,
+}
+
+
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark for this process, if possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size in MB (since the last reset, where supported)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+
+
+def load_reference(path):
+    """accepted_images_count per MM_YYYY.pdf from Reference.csv or df_8.csv."""
+    with open(path, newline='', encoding='utf-8') as f:
+        return {row["pdf_filename"]: int(row["accepted_images_count"])
+                for row in csv.DictReader(f) if row.get("accepted_images_count")}
+
+
+def reference_name(pdf_file):
+    """Reference.csv key for a corpus file (backup_pdfs keep their download names)."""
+    return canonical_pdf_name(pdf_file) or pdf_file
+
+
+def list_corpus(corpora, limit=None):
+    """(corpus, pdf_file) pairs in a stable order."""
+    pdfs = []
+    for corpus in corpora:
+        files = sorted(f for f in os.listdir(corpus) if f.lower().endswith('.pdf'))
+        pdfs.extend((corpus, f) for f in files[:limit])
+    return pdfs
+
+
+def score_counts(rows):
+    """Count accuracy of a variant over the PDFs that have a reference count."""
+    scored = [r for r in rows if r["reference"] is not None and r["error"] is None]
+    if not scored:
+        return {"pdfs_scored": 0}
+    found = sum(r["images"] for r in scored)
+    expected = sum(r["reference"] for r in scored)
+    matched = sum(min(r["images"], r["reference"]) for r in scored)
+    return {
+        "pdfs_scored": len(scored),
+        "exact_matches": sum(r["images"] == r["reference"] for r in scored),
+        "exact_match_rate": round(sum(r["images"] == r["reference"] for r in scored) / len(scored), 4),
+        "mean_abs_error": round(sum(abs(r["images"] - r["reference"]) for r in scored) / len(scored), 4),
+        "images_found": found,
+        "images_expected": expected,
+        # Count-based: charts beyond the reference count as false positives, missing ones as misses
+        "recall": round(matched / expected, 4) if expected else None,
+        "precision": round(matched / found, 4) if found else None,
+    }
+
+
+def run_variant(name, pdfs, reference, verbose=True, raster_cache_dir=None):
+    """Benchmark one variant over the corpus; returns its JSON section."""
+    run = VARIANTS[name]
+    rows = []
+    started = time.perf_counter()
+    for corpus, pdf_file in pdfs:
+        reset_peak_rss()
+        pdf_started = time.perf_counter()
+        error = None
+        try:
+            with tracing.span("variant", variant=name, pdf=pdf_file):
+                images, page_seconds = run(os.path.join(corpus, pdf_file), raster_cache_dir)
+        except Exception as e:
+            images, page_seconds, error = 0, [], str(e)
+        seconds = time.perf_counter() - pdf_started
+
+        row = {
+            "corpus": corpus,
+            "pdf": pdf_file,
+            "seconds": round(seconds, 4),
+            "pages": len(page_seconds),
+            "page_seconds": [round(s, 4) for s in page_seconds],
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "images": images,
+            "images_per_sec": round(images / seconds, 3) if seconds else None,
+            "reference": reference.get(reference_name(pdf_file)),
+            "error": error,
+        }
+        rows.append(row)
+        if verbose:
+            print(f"[{name}] {corpus}/{pdf_file}: {images} images in {seconds:.2f}s "
+                  f"(reference {row['reference']}, peak {row['peak_rss_mb']} MB)"
+                  + (f" ERROR {error}" if error else ""))
+
+    total_seconds = time.perf_counter() - started
+    all_pages = [s for r in rows for s in r["page_seconds"]]
+    images = sum(r["images"] for r in rows)
+    return {
+        "totals": {
+            "pdfs": len(rows),
+            "errors": sum(r["error"] is not None for r in rows),
+            "seconds": round(total_seconds, 3),
+            "mean_pdf_seconds": round(total_seconds / len(rows), 4) if rows else None,
+            "pages": len(all_pages),
+            "mean_page_seconds": round(sum(all_pages) / len(all_pages), 4) if all_pages else None,
+            "max_page_seconds": round(max(all_pages), 4) if all_pages else None,
+            "images": images,
+            "images_per_sec": round(images / total_seconds, 3) if total_seconds else None,
+            "peak_rss_mb": max((r["peak_rss_mb"] for r in rows), default=None),
+        },
+        "accuracy": score_counts(rows),
+        "pdfs": rows,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(variants, corpora=DEFAULT_CORPORA, reference_path="Reference.csv", limit=None, verbose=True,
+                  raster_cache_dir=None):
+    """Benchmark `variants` over `corpora`; returns the full results dict."""
+    import cv2
+
+    pdfs = list_corpus(corpora, limit)
+    reference = load_reference(reference_path)
+    return {
+        "meta": {
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pymupdf": fitz.VersionBind,
+            "opencv": cv2.__version__,
+            "cpus": os.cpu_count(),
+            "corpora": corpora,
+            "reference": reference_path,
+            "limit": limit,
+            "raster_cache_dir": raster_cache_dir,
+        },
+        "variants": {name: run_variant(name, pdfs, reference, verbose, raster_cache_dir) for name in variants},
+    }
+
+
+def compare(results, baseline):
+    """Print time, throughput and accuracy changes against an earlier results file."""
+    for name, section in results["variants"].items():
+        old = baseline.get("variants", {}).get(name)
+        if old is None:
+            print(f"{name}: not in baseline")
+            continue
+        new_t, old_t = section["totals"], old["totals"]
+        new_a, old_a = section["accuracy"], old["accuracy"]
+        speedup = old_t["seconds"] / new_t["seconds"] if new_t["seconds"] else float("nan")
+        print(f"{name}: {old_t['seconds']:.1f}s -> {new_t['seconds']:.1f}s ({speedup:.2f}x), "
+              f"peak RSS {old_t['peak_rss_mb']} -> {new_t['peak_rss_mb']} MB, "
+              f"exact matches {old_a.get('exact_matches')} -> {new_a.get('exact_matches')}, "
+              f"recall {old_a.get('recall')} -> {new_a.get('recall')}")
+
+        # PDFs whose image count changed are worth a look even if the totals agree
+        old_counts = {(r["corpus"], r["pdf"]): r["images"] for r in old["pdfs"]}
+        for r in section["pdfs"]:
+            before = old_counts.get((r["corpus"], r["pdf"]))
+            if before is not None and before != r["images"]:
+                print(f"    {r['corpus']}/{r['pdf']}: {before} -> {r['images']} images (reference {r['reference']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chart extraction variants on the PDF corpus.")
+    parser.add_argument("--variants", nargs="+", choices=sorted(VARIANTS), default=sorted(VARIANTS))
+    parser.add_argument("--corpus", nargs="+", default=DEFAULT_CORPORA, help="Directories of PDFs to run over")
+    parser.add_argument("--reference", default="Reference.csv",
+                        help="CSV with pdf_filename and accepted_images_count (Reference.csv or df_8.csv)")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N PDFs of each corpus")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    parser.add_argument("--quiet", action="store_true")
+    parser.add_argument("--raster-cache-dir", default=None,
+                        help="Share whole-page renders between the variants through this cache")
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tracing.run_from_args(args, "benchmark"):
+        results = run_benchmark(args.variants, args.corpus, args.reference, args.limit, verbose=not args.quiet,
+                                raster_cache_dir=args.raster_cache_dir)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1)
+
+    for name, section in results["variants"].items():
+        totals, accuracy = section["totals"], section["accuracy"]
+        print(f"{name}: {totals['pdfs']} PDFs in {totals['seconds']:.1f}s, {totals['images']} images "
+              f"({totals['images_per_sec']}/s), peak RSS {totals['peak_rss_mb']} MB, "
+              f"exact {accuracy.get('exact_matches')}/{accuracy.get('pdfs_scored')}, "
+              f"recall {accuracy.get('recall')}, precision {accuracy.get('precision')}")
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
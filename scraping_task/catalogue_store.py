@@ -0,0 +1,270 @@
+"""
+SQLite store for the per-PDF bookkeeping kept in the CSV cascade
+pdf_image_data.csv -> df_6.csv -> df_7.csv -> df_updated.csv -> df_8.csv.
+
+Each of those steps read a whole CSV and wrote a whole new one, and 4.py
+rewrote all of df_7.csv after every keep/delete decision. Here there is one
+row per PDF in an indexed table. Recording an extraction, appending to a
+note or changing a count is a single-row upsert in its own transaction, so
+a decision costs the same however many PDFs the archive holds, and an
+interrupted review loses nothing already recorded.
+
+The CSVs remain the interchange format: import_csv() loads any of them and
+export_csv() writes the store back out in any of their schemas.
+
+Usage:
+    python -m scraping_task.catalogue_store --import df_7.csv
+    python -m scraping_task.catalogue_store --export df_8.csv --schema df_8
+    python -m scraping_task.catalogue_store status
+"""
+import argparse
+import csv
+import math
+import os
+import sqlite3
+from datetime import datetime
+
+from scraping_task.dates import filename_date
+
+DEFAULT_STORE_PATH = "catalogue.sqlite"
+
+_COLUMNS = ("date_extracted", "pdf_filename", "accepted_images_count", "month", "year", "date", "note",
+            "image_count")
+
+# Column lists of the CSVs the notebooks wrote; "difference" is derived on export
+SCHEMAS = {
+    "pdf_image_data": ["date_extracted", "pdf_filename", "accepted_images_count"],
+    "df_6": ["date_extracted", "pdf_filename", "accepted_images_count", "month", "year", "date", "note"],
+    "df_7": ["date_extracted", "pdf_filename", "accepted_images_count", "month", "year", "date", "note"],
+    "df_updated": ["date_extracted", "pdf_filename", "accepted_images_count", "month", "year", "date", "note",
+                   "image_count", "difference"],
+    "df_8": ["pdf_filename", "accepted_images_count", "date", "note"],
+}
+SCHEMAS["reference"] = SCHEMAS["df_updated"]
+
+# pdf_image_data.csv follows the extractors' file-name order, the later CSVs are sorted by date
+_BY_DATE = "date IS NULL, date, rowid"
+_SCHEMA_ORDER = {"pdf_image_data": "pdf_filename"}
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS pdfs (
+    pdf_filename TEXT PRIMARY KEY,
+    date_extracted TEXT,
+    accepted_images_count INTEGER,
+    month INTEGER,
+    year INTEGER,
+    date TEXT,
+    note TEXT,
+    image_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS pdfs_date ON pdfs (date);
+"""
+
+def pdf_date(pdf_filename):
+    """(month, year, "YYYY-MM-01") from an MM_YYYY.pdf name, or (None, None, None)."""
+    month, year = filename_date(pdf_filename)
+    if month is None:
+        return None, None, None
+    return month, year, f"{year:04d}-{month:02d}-01"
+
+
+def _sql_value(value):
+    """CSV/pandas value -> SQLite value (NaN and "" become NULL, 7.0 becomes 7)."""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        return int(value) if value.is_integer() else value
+    if isinstance(value, str):
+        return value if value != "" else None
+    if hasattr(value, "item"):  # NumPy scalars
+        return _sql_value(value.item())
+    return value
+
+
+class CatalogueStore:
+    """One row per PDF, keyed by pdf_filename and indexed by date."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA_SQL)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM pdfs").fetchone()[0]
+
+    def __contains__(self, pdf_filename):
+        return self.conn.execute("SELECT 1 FROM pdfs WHERE pdf_filename = ?", (pdf_filename,)).fetchone() is not None
+
+    # Single-row writes, one transaction each
+
+    def upsert(self, pdf_filename, **values):
+        """
+        Insert the PDF's row or update the given columns of it; columns not
+        passed keep their stored values. month/year/date are filled in from
+        the file name for new rows.
+        """
+        unknown = set(values) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown catalogue columns: {sorted(unknown)}")
+        values = {column: _sql_value(value) for column, value in values.items()}
+
+        month, year, date = pdf_date(pdf_filename)
+        insert = {"month": month, "year": year, "date": date, **values, "pdf_filename": pdf_filename}
+        columns = list(insert)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in values) or "pdf_filename = pdf_filename"
+        with self.conn:
+            self.conn.execute(
+                f"INSERT INTO pdfs ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT (pdf_filename) DO UPDATE SET {updates}",
+                [insert[column] for column in columns])
+
+    def record_extraction(self, pdf_filename, accepted_images_count, date_extracted=None):
+        """What pdf_image_data.csv recorded for a PDF: when it was extracted and how many charts it kept."""
+        date_extracted = date_extracted or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.upsert(pdf_filename, date_extracted=date_extracted, accepted_images_count=accepted_images_count)
+
+    def append_note(self, pdf_filename, message):
+        """Add `message` to the PDF's note ("; "-separated, as 4.py did); returns the new note."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO pdfs (pdf_filename, note) VALUES (?, ?) ON CONFLICT (pdf_filename) DO UPDATE SET "
+                "note = CASE WHEN note IS NULL OR note = '' THEN excluded.note ELSE note || '; ' || excluded.note END",
+                (pdf_filename, message))
+        return self.get(pdf_filename)["note"]
+
+    def set_accepted(self, pdf_filename, count):
+        self.upsert(pdf_filename, accepted_images_count=count)
+
+    def add_accepted(self, pdf_filename, delta):
+        """Change the accepted count by `delta` (e.g. -1 for a deleted image); returns the new count."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO pdfs (pdf_filename, accepted_images_count) VALUES (?, ?) ON CONFLICT (pdf_filename) "
+                "DO UPDATE SET accepted_images_count = COALESCE(accepted_images_count, 0) + ?",
+                (pdf_filename, max(delta, 0), delta))
+        return self.get(pdf_filename)["accepted_images_count"]
+
+    def set_image_count(self, pdf_filename, count):
+        self.upsert(pdf_filename, image_count=count)
+
+    def delete(self, pdf_filename):
+        """Drop a PDF from the catalogue (8.ipynb removed 01_2018 and 10_2018 this way)."""
+        with self.conn:
+            self.conn.execute("DELETE FROM pdfs WHERE pdf_filename = ?", (pdf_filename,))
+
+    # Reads
+
+    def get(self, pdf_filename):
+        """The PDF's row as a dict, or None."""
+        row = self.conn.execute("SELECT * FROM pdfs WHERE pdf_filename = ?", (pdf_filename,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def summary(self):
+        """PDF count, date range, accepted images, noted PDFs and the latest extraction time."""
+        row = self.conn.execute(
+            "SELECT COUNT(*) AS pdfs, MIN(date) AS first_date, MAX(date) AS last_date, "
+            "COALESCE(SUM(accepted_images_count), 0) AS accepted_images, "
+            "COALESCE(SUM(note IS NOT NULL AND note != ''), 0) AS with_notes, "
+            "MAX(date_extracted) AS last_extracted FROM pdfs").fetchone()
+        return dict(row)
+
+    def rows(self, since=None, until=None, order_by=_BY_DATE):
+        """Rows ordered by date (undated last), optionally limited to a date range."""
+        query = "SELECT *, image_count - accepted_images_count AS difference FROM pdfs"
+        conditions, args = [], []
+        if since is not None:
+            conditions.append("date >= ?")
+            args.append(since)
+        if until is not None:
+            conditions.append("date <= ?")
+            args.append(until)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {order_by}"
+        return [dict(row) for row in self.conn.execute(query, args)]
+
+    # CSV interchange
+
+    def import_csv(self, csv_path):
+        """Upsert every row of one of the cascade's CSVs (only the columns it has); returns the row count."""
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            columns = [c for c in reader.fieldnames or () if c in _COLUMNS and c != "pdf_filename"]
+            rows = [row for row in reader if row.get("pdf_filename")]
+
+        for row in rows:
+            month, year, date = pdf_date(row["pdf_filename"])
+            row.setdefault("month", month)
+            row.setdefault("year", year)
+            row.setdefault("date", date)
+
+        insert_columns = ["pdf_filename"] + list(dict.fromkeys(columns + ["month", "year", "date"]))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns) or "pdf_filename = pdf_filename"
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO pdfs ({', '.join(insert_columns)}) VALUES ({', '.join('?' for _ in insert_columns)}) "
+                f"ON CONFLICT (pdf_filename) DO UPDATE SET {updates}",
+                [[_sql_value(_parse_number(column, row[column])) for column in insert_columns] for row in rows])
+        return len(rows)
+
+    def export_csv(self, csv_path, schema="df_7"):
+        """Write the catalogue in one of SCHEMAS' column layouts; returns the row count."""
+        columns = SCHEMAS[schema]
+        rows = self.rows(order_by=_SCHEMA_ORDER.get(schema, _BY_DATE))
+        tmp_path = csv_path + ".tmp"
+        with open(tmp_path, "w", newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(columns)
+            writer.writerows([["" if row[c] is None else row[c] for c in columns] for row in rows])
+        os.replace(tmp_path, csv_path)
+        return len(rows)
+
+
+def _parse_number(column, value):
+    """Integers for the integer columns (CSV values are strings, sometimes "7.0")."""
+    if column not in ("accepted_images_count", "month", "year", "image_count") or not isinstance(value, str):
+        return value
+    try:
+        return float(value) if value.strip() else None
+    except ValueError:
+        return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import, export or summarise the PDF catalogue.")
+    parser.add_argument("action", nargs="?", choices=["status"], default="status",
+                        help="status: summarise the store after any --import/--export (the default)")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH)
+    parser.add_argument("--import", dest="import_paths", action="append", default=[],
+                        help="CSV to upsert into the store (repeatable, applied in order)")
+    parser.add_argument("--export", default=None, help="CSV to write from the store")
+    parser.add_argument("--schema", choices=sorted(SCHEMAS), default="df_7", help="Column layout for --export")
+    args = parser.parse_args()
+
+    with CatalogueStore(args.store) as store:
+        for path in args.import_paths:
+            print(f"Imported {store.import_csv(path)} rows from {path}")
+        if args.export:
+            print(f"Exported {store.export_csv(args.export, args.schema)} rows to {args.export} ({args.schema})")
+        summary = store.summary()
+        print(f"{summary['pdfs']} PDFs in {args.store} ({summary['first_date']} to {summary['last_date']}), "
+              f"{summary['accepted_images']} accepted images, {summary['with_notes']} with notes, "
+              f"last extraction {summary['last_extracted']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+Price series read straight from the vector drawings of the near-text charts.
+
+The pipeline's end product is a PNG of each "Average Retail Selling Price"
+chart; getting numbers back out of it would take raster analysis of every
+image. In some of the 2018 reports these charts are vector graphics:
+each series is a stroked path with one vertex per month, bars are filled
+rectangles, and the axis labels are text. Here the region that
+near_text.find_chart_region captures is read from page.get_drawings() and
+the text layer only, without rendering anything:
+
+  - the chart's frame is the smallest drawn rectangle around its heading;
+  - the value axis is the column of numeric labels ("$90,000", "-5%"),
+    fitted with a least-squares line from label centre to value;
+  - the date axis is the row of month labels ("Jan-16", "Feb", ...,
+    "Dec (est.)"), with month-only labels taking their year from the last
+    labelled one;
+  - line series are the coloured stroked paths (light gray gridlines and
+    axis-aligned rules are skipped), bars the coloured filled rectangles;
+    each vertex or bar centre is matched to the nearest date label;
+  - legend swatches (short strokes and small squares just left of a label)
+    name the series of their colour; other series are named by colour.
+
+A chart takes a few milliseconds. When a region has no usable vector data
+the chart is captured as an image with extract_chart_near_text instead and
+listed as such. That is most of them: of the 78 PDFs in pdfs/pdfs, only the
+6 "Retail Selling Price" charts of 02_2018, 03_2018, 09_2018, 11_2018,
+12_2018 and 01_2019 are digitised. 62 have no vector series (the chart is
+an embedded image), 4 draw their date labels and 2 their value labels as
+glyph outlines rather than text, and 4 have no such heading.
+
+Output is one tidy CSV row per point: pdf_filename, page, chart, series,
+kind, date (YYYY-MM, or YYYY for yearly axes), value and estimated.
+
+Usage:
+    python -m scraping_task.chart_digitiser --pdf-dir pdfs/pdfs --csv chart_series.csv
+    python -m scraping_task.chart_digitiser --search-text "Retail Price History" --image-dir pdfs/Images
+"""
+import argparse
+import csv
+import os
+import re
+from collections import defaultdict
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from scraping_task import tracing
+from scraping_task.dates import month_number
+from scraping_task.near_text import extract_chart_near_text, find_chart_region, near_text_filename
+from scraping_task.text_index import PdfTextIndex
+
+DEFAULT_SEARCH_TEXTS = ["Retail Selling Price"]
+
+CSV_FIELDNAMES = ["pdf_filename", "page", "chart", "series", "kind", "date", "value", "estimated"]
+
+# Series need at least this many dated points
+MIN_POINTS = 3
+# A vertex belongs to the nearest date label within this fraction of the label spacing
+TICK_TOLERANCE = 0.4
+# Largest calibration residual, as a fraction of the value axis range
+MAX_RESIDUAL = 0.01
+# How far past the extreme labels a point may lie, as a fraction of the value axis range
+AXIS_MARGIN = 0.1
+
+# get_text("dict") without TEXT_PRESERVE_IMAGES: image blocks would carry every embedded image's bytes.
+# Only for the spans read here; it also changes how MuPDF groups text into blocks, so the heading lookup
+# (the shared text index) keeps the default flags.
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+_NUMBER = re.compile(r"^\(?(?P<sign>[-−])?\$?(?P<number>\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)(?P<suffix>[kKmM%]?)\)?$")
+_EST = re.compile(r"\s*\(est\.?\)\s*$", re.IGNORECASE)
+_MONTH_YEAR = re.compile(r"^(?P<month>[A-Za-z]{3,9})\.?(?:[-' ]+(?P<year>\d{2}|\d{4}))?$")
+_YEAR_MONTH = re.compile(r"^(?P<year>\d{2}|\d{4})-(?P<month>[A-Za-z]{3,9})\.?$")
+_YEAR = re.compile(r"^(?P<year>(?:19|20)\d{2})$")
+
+
+def parse_value(text):
+    """Number on a value axis label ("$90,000", "-5%", "1.5K"), or None."""
+    match = _NUMBER.match(text.strip().replace(" ", ""))
+    if match is None:
+        return None
+    value = float(match["number"].replace(",", ""))
+    value *= {"k": 1e3, "m": 1e6}.get(match["suffix"].lower(), 1)
+    return -value if match["sign"] else value
+
+
+def parse_date_label(text):
+    """
+    (month or None, year or None, estimated) for a date axis label such as
+    "Jan-16", "18-Jan", "Feb", "Dec (est.)" or "2019"; None otherwise.
+    """
+    text = text.strip()
+    estimated = _EST.search(text) is not None
+    text = _EST.sub("", text)
+    match = _YEAR.match(text)
+    if match:
+        return None, int(match["year"]), estimated
+    match = _MONTH_YEAR.match(text) or _YEAR_MONTH.match(text)
+    if match is None:
+        return None
+    month = month_number(match["month"])
+    if month is None:
+        return None
+    year = match["year"]
+    if year is not None:
+        year = int(year) + (2000 if len(year) == 2 else 0)
+    return month, year, estimated
+
+
+def _spans(page, clip):
+    """(rect, text) of every non-blank text span inside `clip`."""
+    spans = []
+    for block in page.get_text("dict", clip=clip, flags=TEXT_FLAGS)["blocks"]:
+        for line in block.get("lines", ()):
+            for span in line["spans"]:
+                if span["text"].strip():
+                    spans.append((fitz.Rect(span["bbox"]), span["text"].strip()))
+    return spans
+
+
+def _colour(rgb):
+    return "#" + "".join(f"{round(c * 255):02x}" for c in rgb[:3])
+
+
+def _is_light_gray(rgb):
+    return rgb is None or (max(rgb) - min(rgb) < 0.05 and min(rgb) > 0.6)
+
+
+def chart_frame(drawings, heading, region):
+    """The smallest drawn rectangle in `region` around the heading, else the region itself."""
+    frames = []
+    for drawing in drawings:
+        items = drawing["items"]
+        if len(items) != 1 or items[0][0] != "re":
+            continue
+        rect = fitz.Rect(items[0][1])
+        if rect.contains(heading) and rect.intersects(region):
+            frames.append(rect)
+    return min(frames, key=lambda rect: rect.get_area()) if frames else fitz.Rect(region)
+
+
+def value_axis(spans):
+    """
+    (slope, intercept, low, high) mapping a y coordinate to a value, from
+    the largest column of numeric labels (low and high are its extreme
+    labels), or None if there is no consistent one.
+    """
+    columns = defaultdict(list)
+    for rect, text in spans:
+        value = parse_value(text)
+        if value is not None:
+            columns[round(rect.x1 / 3)].append(((rect.y0 + rect.y1) / 2, value))
+    best = None
+    for labels in columns.values():
+        ys = np.array([y for y, _ in labels])
+        values = np.array([v for _, v in labels])
+        if len(labels) < MIN_POINTS or np.ptp(ys) == 0 or np.ptp(values) == 0:
+            continue
+        slope, intercept = np.polyfit(ys, values, 1)
+        # Values grow up the page and every label sits on the fitted line
+        if slope >= 0 or np.abs(slope * ys + intercept - values).max() > MAX_RESIDUAL * np.ptp(values):
+            continue
+        if best is None or len(labels) > best[0]:
+            best = (len(labels), slope, intercept, values.min(), values.max())
+    return None if best is None else best[1:]
+
+
+def date_axis(spans):
+    """
+    [(x, date, estimated)] from the largest row of date labels, in x order,
+    or None. Month-only labels take their year from the labels before them
+    (or after them, for the ones before the first year).
+    """
+    rows = defaultdict(list)
+    for rect, text in spans:
+        parsed = parse_date_label(text)
+        if parsed is not None:
+            rows[round(rect.y0 / 3)].append(((rect.x0 + rect.x1) / 2, *parsed))
+    labels = max(rows.values(), key=len, default=[])
+    if len(labels) < MIN_POINTS:
+        return None
+    labels.sort()
+
+    if all(month is None for _, month, _, _ in labels):
+        return [(x, f"{year:04d}", estimated) for x, _, year, estimated in labels]
+    if any(month is None for _, month, _, _ in labels):
+        return None
+    first_year = next((i for i, (_, _, year, _) in enumerate(labels) if year is not None), None)
+    if first_year is None:
+        return None
+
+    years = [None] * len(labels)
+    years[first_year] = labels[first_year][2]
+    for i in range(first_year + 1, len(labels)):
+        month, year = labels[i][1], labels[i][2]
+        years[i] = year if year is not None else years[i - 1] + (month <= labels[i - 1][1])
+    for i in range(first_year - 1, -1, -1):
+        years[i] = years[i + 1] - (labels[i][1] >= labels[i + 1][1])
+    return [(x, f"{year:04d}-{month:02d}", estimated) for (x, month, _, estimated), year in zip(labels, years)]
+
+
+def _vertices(drawing):
+    points = []
+    for item in drawing["items"]:
+        if item[0] == "l":
+            points += [item[1], item[2]]
+        elif item[0] == "c":
+            points += [item[1], item[4]]
+    return points
+
+
+def _axis_aligned(drawing):
+    return all(item[0] == "l" and (abs(item[1].x - item[2].x) < 0.5 or abs(item[1].y - item[2].y) < 0.5)
+               for item in drawing["items"])
+
+
+def _shapes(drawings, frame):
+    """Line paths, bar rectangles and legend swatches inside the frame, keyed by colour."""
+    lines, bars, swatches = defaultdict(list), defaultdict(list), []
+    for drawing in drawings:
+        if not frame.contains(drawing["rect"]):
+            continue
+        if "s" in drawing["type"] and not _is_light_gray(drawing.get("color")) and not _axis_aligned(drawing):
+            colour = _colour(drawing["color"])
+            points = _vertices(drawing)
+            if len({(round(p.x), round(p.y)) for p in points}) >= MIN_POINTS:
+                lines[colour].extend(points)
+            elif drawing["rect"].height < 3 and drawing["rect"].width < 25:
+                swatches.append((fitz.Rect(drawing["rect"]), colour))
+        if "f" in drawing["type"] and not _is_light_gray(drawing.get("fill")):
+            colour = _colour(drawing["fill"])
+            for item in drawing["items"]:
+                if item[0] != "re":
+                    continue
+                rect = fitz.Rect(item[1])
+                if rect.width <= 10 and rect.height <= 10 and abs(rect.width - rect.height) < 2:
+                    swatches.append((rect, colour))
+                elif rect.width < frame.width / 4:
+                    bars[colour].append(rect)
+        elif drawing["type"] == "s" and not _is_light_gray(drawing.get("color")) and _axis_aligned(drawing):
+            # A legend's short rule drawn as a single horizontal line
+            rect = fitz.Rect(drawing["rect"])
+            if len(drawing["items"]) == 1 and rect.height < 1 and rect.width < 25:
+                swatches.append((rect, _colour(drawing["color"])))
+    return lines, bars, swatches
+
+
+def legend_names(swatches, spans):
+    """{colour: label} for swatches drawn just left of a text label."""
+    names = {}
+    for rect, colour in swatches:
+        cy = (rect.y0 + rect.y1) / 2
+        for span_rect, text in spans:
+            if 0 <= span_rect.x0 - rect.x1 <= 10 and abs((span_rect.y0 + span_rect.y1) / 2 - cy) <= 4:
+                names.setdefault(colour, text)
+                break
+    return names
+
+
+def _nearest_tick(ticks, x, tolerance):
+    xs = [tick[0] for tick in ticks]
+    i = int(np.argmin(np.abs(np.array(xs) - x)))
+    return ticks[i] if abs(xs[i] - x) <= tolerance else None
+
+
+def digitise_region(page, heading, region):
+    """
+    Series of the chart around `heading` within `region`, read from the
+    page's drawings and text. Returns (series, reason): a list of
+    {"name", "colour", "kind", "points": [(date, value, estimated)]}, and
+    why the region could not be digitised when the list is empty.
+    """
+    drawings = page.get_drawings()
+    frame = chart_frame(drawings, heading, region)
+    spans = _spans(page, frame)
+
+    lines, bars, swatches = _shapes(drawings, frame)
+    if not lines and not bars:
+        return [], "no vector series"
+    calibration = value_axis(spans)
+    if calibration is None:
+        return [], "no value axis in the text layer"
+    ticks = date_axis(spans)
+    if ticks is None:
+        return [], "no date axis in the text layer"
+    slope, intercept, low, high = calibration
+    # Points beyond the labelled range mean the labels belong to another chart
+    margin = AXIS_MARGIN * (high - low)
+    tolerance = TICK_TOLERANCE * float(np.median(np.diff([tick[0] for tick in ticks]))) if len(ticks) > 1 else 5
+    names = legend_names(swatches, spans)
+
+    series = []
+    for kind, shapes in (("line", lines), ("bar", bars)):
+        for colour, items in shapes.items():
+            by_date = {}
+            if kind == "line":
+                for point in items:
+                    tick = _nearest_tick(ticks, point.x, tolerance)
+                    if tick is not None:
+                        by_date.setdefault(tick[1], (tick, []))[1].append(point.y)
+            else:
+                zero_y = -intercept / slope
+                for rect in items:
+                    tick = _nearest_tick(ticks, (rect.x0 + rect.x1) / 2, tolerance)
+                    if tick is not None:
+                        # The bar's value is at its edge away from the zero line
+                        edge = rect.y0 if abs(rect.y0 - zero_y) > abs(rect.y1 - zero_y) else rect.y1
+                        by_date.setdefault(tick[1], (tick, []))[1].append(edge)
+            if len(by_date) < MIN_POINTS:
+                continue
+            points = [(date, round(float(slope * np.mean(ys) + intercept), 2), estimated)
+                      for date, ((_, _, estimated), ys) in sorted(by_date.items())]
+            if any(not low - margin <= value <= high + margin for _, value, _ in points):
+                continue
+            series.append({"name": names.get(colour, f"series {colour}"), "colour": colour, "kind": kind,
+                           "points": points})
+    if not series:
+        return [], "no series on the date axis"
+    return series, None
+
+
+def digitise_pdf(pdf_path, search_texts=DEFAULT_SEARCH_TEXTS, pixels_above=20, pixels_below=300):
+    """
+    The chart near the first of `search_texts` in a PDF, as
+    {"page", "chart", "series", "reason"}, or None if no page has the text.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        region = find_chart_region(doc, PdfTextIndex(doc), search_texts, pixels_above, pixels_below)
+        if region is None:
+            return None
+        page_num, _, block, rect = region
+        with tracing.span("digitise", page=page_num + 1):
+            series, reason = digitise_region(doc[page_num], block.rect, rect)
+        return {"page": page_num + 1, "chart": block.text.split("\n")[0].strip(), "series": series,
+                "reason": reason}
+    finally:
+        doc.close()
+
+
+def chart_rows(pdf_file, chart):
+    """Tidy CSV rows (one per point) for a digitised chart."""
+    return [{"pdf_filename": pdf_file, "page": chart["page"], "chart": chart["chart"], "series": series["name"],
+             "kind": series["kind"], "date": date, "value": value, "estimated": int(estimated)}
+            for series in chart["series"] for date, value, estimated in series["points"]]
+
+
+def digitise_all(pdf_dir, csv_path, image_dir=None, search_texts=DEFAULT_SEARCH_TEXTS, pixels_above=20,
+                 pixels_below=300):
+    """Digitise every PDF's chart into one CSV; charts without vector data are saved as images in `image_dir`."""
+    pdf_files = sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith('.pdf'))
+    counts = {"vector": 0, "image": 0, "missing": 0}
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDNAMES)
+        writer.writeheader()
+        for pdf_file in pdf_files:
+            pdf_path = os.path.join(pdf_dir, pdf_file)
+            with tracing.span("pdf", pdf=pdf_file):
+                chart = digitise_pdf(pdf_path, search_texts, pixels_above, pixels_below)
+            if chart is None:
+                counts["missing"] += 1
+                print(f"- {pdf_file}: none of {search_texts} found")
+                continue
+            if chart["series"]:
+                counts["vector"] += 1
+                tracing.count("vector_charts")
+                writer.writerows(chart_rows(pdf_file, chart))
+                summary = ", ".join(f"{s['name']} ({len(s['points'])})" for s in chart["series"])
+                print(f"- {pdf_file} page {chart['page']}: {summary}")
+                continue
+
+            counts["image"] += 1
+            tracing.count("image_fallbacks")
+            if image_dir is None:
+                print(f"- {pdf_file} page {chart['page']}: {chart['reason']}")
+                continue
+            result = extract_chart_near_text(pdf_path, search_texts, pixels_above, pixels_below)
+            filename, data = result if result else (near_text_filename(pdf_file, search_texts[0]), None)
+            if data is not None:
+                os.makedirs(image_dir, exist_ok=True)
+                with open(os.path.join(image_dir, filename), "wb") as image:
+                    image.write(data)
+            print(f"- {pdf_file} page {chart['page']}: {chart['reason']}, saved image {filename}")
+
+    print(f"Digitised {counts['vector']} charts from vector data into {csv_path}; "
+          f"{counts['image']} without vector data, {counts['missing']} PDFs without the chart")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read chart series from the PDFs' vector drawings.")
+    parser.add_argument("--pdf-dir", default=os.path.join("pdfs", "pdfs"))
+    parser.add_argument("--csv", default="chart_series.csv", help="Tidy output: one row per series point")
+    parser.add_argument("--image-dir", default=None,
+                        help="Save the charts that have no vector data here as images (3.ipynb's capture)")
+    parser.add_argument("--search-text", action="append", dest="search_texts",
+                        help=f"Heading of the chart (repeatable, default: {DEFAULT_SEARCH_TEXTS[0]!r})")
+    parser.add_argument("--pixels-above", type=int, default=20)
+    parser.add_argument("--pixels-below", type=int, default=300)
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+    with tracing.run_from_args(args, "digitise"):
+        digitise_all(args.pdf_dir, args.csv, args.image_dir, args.search_texts or DEFAULT_SEARCH_TEXTS,
+                     args.pixels_above, args.pixels_below)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,803 @@
+"""
+Rendered-page chart detection, packaged from the last cell of 5_5.ipynb.
+
+Each page is rendered at high zoom, thresholded and split into contours; the
+largest contours are filtered by shape, background and axis lines, then
+extended upward to include the nearest title.
+
+Rendering a whole page at zoom 8 is expensive, so the page's embedded
+images (get_image_info) and vector drawing clusters (cluster_drawings) are
+used first to find where charts can be. Only those regions, plus room above
+them for the title, are rasterised. The whole page is rendered only when
+there are no such regions or a detection runs off the edge of its region.
+Pages whose charts are neither images nor drawings are first laid out from
+a low-zoom render.
+
+With a memory ceiling (max_render_mb) nothing is rendered in one piece:
+regions, or the whole page as a last resort, are thresholded in bands into
+a binary mask, and the colour pixels of each candidate are rendered on
+their own when they are needed. Band and crop clips avoid cutting through
+embedded images, which MuPDF resamples differently when clipped; where a
+page-sized background makes that impossible, crops can differ from a
+whole-page render by a grey level or so.
+
+The functions here do not write chart images to disk: they return the
+encoded bytes (PNG unless image_format says otherwise) so the caller (a
+notebook, batch_extract.py or a worker process) decides where they go.
+With encode_threads set, extract_charts_from_pdf encodes on an ImageWriter's
+threads while the next candidates are being detected (worth it when cores
+are spare; a batch run's process pool already keeps them all busy). The
+detection overlays and candidate metrics 5_5.ipynb always wrote are only
+produced when debug_dir is set.
+"""
+import json
+import math
+import os
+import re
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from scraping_task import features, layout, raster_cache, tracing
+from scraping_task.image_writer import EXTENSIONS, ImageWriter, encode_image, format_from_params
+from scraping_task.text_index import PageTextIndex
+
+# Detection settings used by 5_5.ipynb when it produced pdf_image_data.csv
+DEFAULT_PARAMS = {
+    "zoom": 8,
+    "binary_threshold": 240,
+    "max_contours": 15,
+    "min_area_ratio": 0.02,
+    "max_area_ratio": 0.95,
+    "min_aspect_ratio": 0.6,
+    "max_aspect_ratio": 2.0,
+    "min_density": 0.05,
+    "max_density": 0.4,
+    "known_non_charts": [(4896, 663), (1590, 1300), (1103, 938), (1440, 1202)],
+    "skip_first_page": True,
+    # has_chart_elements / is_chart_background thresholds
+    "min_axis_lines": 3,          # horizontal and vertical lines each
+    "dark_border_fraction": 0.6,  # border pixels with V < 100 above this is a dark background
+    # Analyse candidates at full size: downscaled zoom-8 crops change the
+    # axis-line counts the thresholds above were tuned on
+    "feature_max_side": None,
+    # "regions": rasterise embedded image / drawing regions first; "page": always whole pages
+    "render_mode": "regions",
+    "region_margin": 12,        # points added around each image/drawing region
+    "title_headroom": 160,      # points rendered above a region for the title extension
+    # Pages without image/drawing regions are laid out at this zoom first (None: render them whole)
+    "layout_zoom": 1,
+    # Ceiling (MB) for the pixels held while rendering; None renders each clip in one piece
+    "max_render_mb": None,
+    # Chart image encoding (see image_writer): "png", "webp" or "jpeg"
+    "image_format": "png",
+    "png_compression": None,    # 0-9; None keeps OpenCV's default, as cv2.imwrite in the notebook
+    "image_quality": 90,        # WebP/JPEG quality
+    "image_max_side": None,     # downscale saved crops to this longer side (detection is unaffected)
+    "encode_threads": 0,        # encode crops on this many background threads; 0 encodes inline
+    # Directory for per-page detection overlays and candidate metrics; None writes nothing
+    "debug_dir": None,
+    # Shared cache of whole-page renders (see raster_cache); None renders every time
+    "raster_cache_dir": None,
+    "raster_cache_mb": raster_cache.DEFAULT_MAX_BYTES // 1024 ** 2,
+}
+
+
+# RGB pixmap, BGR copy, grey and binary images held at once while thresholding
+_BYTES_PER_PIXEL = 8
+
+# Pixels rendered beyond each side of a bounded clip and then discarded
+_CLIP_PADDING = 4
+
+
+class RegionIncomplete(Exception):
+    """A detection touched the edge of its clip, so the clip cannot be trusted."""
+
+
+def is_chart_background(img):
+    """
+    Analyze background color to determine if it's likely a chart.
+    Charts typically have white/very light backgrounds.
+    """
+    feats = features.extract_features([img], max_side=None)
+    flags = features.background_flags(feats)
+    return {
+        "is_light_bg": bool(flags["is_light_bg"][0]),
+        "is_dark_bg": bool(flags["is_dark_bg"][0]),
+        "has_colored_bg": bool(flags["has_colored_bg"][0]),
+        "brightness": float(features.column(feats, "border_v")[0]),
+        "saturation": float(features.column(feats, "border_s")[0]),
+    }
+
+
+def has_chart_elements(img):
+    """Detect if image has common chart elements like axes, grid lines, etc."""
+    feats = features.extract_features([img], max_side=None)
+    return (bool(features.has_axis_lines(feats)[0]),
+            int(features.column(feats, "horiz_lines")[0]),
+            int(features.column(feats, "vert_lines")[0]))
+
+
+def find_chart_title(text_index, orig_rect):
+    """
+    Find the most likely title above a chart.
+
+    `text_index` is the page's PageTextIndex (a raw get_text("dict") block
+    list is also accepted). Returns the cleaned title text and the y
+    position (in PDF points) of the title block, or None when no text was
+    found near the chart.
+    """
+    title = "Unknown_Title"
+    closest_title_y = None
+
+    # Look for text blocks that could be titles (above the image)
+    search_area = fitz.Rect(
+        orig_rect.x0 - 20,      # Left edge, expanded by 20 points
+        orig_rect.y0 - 150,     # Top edge, look up to 150 points above
+        orig_rect.x1 + 20,      # Right edge, expanded by 20 points
+        orig_rect.y0 + 10       # Include a bit below the top of the image
+    )
+
+    if not isinstance(text_index, PageTextIndex):
+        text_index = PageTextIndex(text_index)
+
+    potential_titles = []
+    for block in text_index.intersecting(search_area):
+        potential_titles.append({
+            "text": block.text,
+            "distance": abs(orig_rect.y0 - block.rect.y1),  # Distance to chart
+            "y_pos": block.rect.y0,  # Y position (for sorting from top to bottom)
+        })
+
+    # Find the best title - short titles close to the chart
+    short_titles = [t for t in potential_titles if
+                    len(t["text"].split('\n')) <= 3 and
+                    len(t["text"]) <= 200 and
+                    t["distance"] <= 100]
+
+    if short_titles:
+        # Sort by distance (closest first)
+        short_titles.sort(key=lambda x: x["distance"])
+        title = short_titles[0]["text"]
+        closest_title_y = short_titles[0]["y_pos"]
+    elif potential_titles:
+        # If no good short titles, try all text sorted from top to bottom
+        potential_titles.sort(key=lambda x: x["y_pos"])
+        title = potential_titles[0]["text"]
+        closest_title_y = potential_titles[0]["y_pos"]
+
+        # If title is too long, truncate it
+        if len(title) > 200:
+            title = title[:197] + "..."
+
+    # Clean up the title
+    title = re.sub(r'^(Figure|Fig\.)\s+\d+[.:]\s*', '', title)
+    title = re.sub(r'\s+', ' ', title).strip()
+
+    return title, closest_title_y
+
+
+def clean_title_for_filename(title):
+    """Turn a chart title into the fragment used in image filenames."""
+    clean_title = re.sub(r'[^\w\s-]', '', title)
+    clean_title = re.sub(r'\s+', '_', clean_title)
+    return clean_title[:50]  # Limit length for filename
+
+
+def chart_filename(pdf_file, chart_number, clean_title, ext="png"):
+    """Build the MM_YYYY_plot_N_<title>.png name used in pdfs/Images."""
+    if clean_title == "Unknown_Title" or not clean_title:
+        return f"{pdf_file.split('.')[0]}_plot_{chart_number}.{ext}"
+    return f"{pdf_file.split('.')[0]}_plot_{chart_number}_{clean_title}.{ext}"
+
+
+def encode_png(img):
+    """Encode a BGR image the same way cv2.imwrite would write a .png."""
+    return encode_image(img, "png")
+
+
+def _merge_regions(rects, params, page_rect):
+    """Grow rects by the region margin and merge them until none overlap."""
+    margin = params["region_margin"]
+    regions = [fitz.Rect(r.x0 - margin, r.y0 - margin, r.x1 + margin, r.y1 + margin) & page_rect for r in rects]
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                if regions[i].intersects(regions[j]):
+                    regions[i] = regions[i] | regions.pop(j)
+                    merged = True
+                    break
+            if merged:
+                break
+
+    return sorted(regions, key=lambda r: (r.y0, r.x0))
+
+
+def find_chart_regions(page, params=None):
+    """
+    Page areas (in PDF points) that may hold a chart: embedded images and
+    vector drawing clusters big enough to pass the area filter, grown by a
+    margin and merged where they overlap. Page-sized backgrounds are ignored.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    page_rect = page.rect
+    page_area = page_rect.width * page_rect.height
+
+    rects = [fitz.Rect(info["bbox"]) for info in page.get_image_info()]
+    if hasattr(page, "cluster_drawings"):
+        rects.extend(page.cluster_drawings())
+    else:
+        rects.extend(drawing["rect"] for drawing in page.get_drawings())
+
+    regions = []
+    for rect in rects:
+        rect = rect & page_rect
+        if rect.is_empty:
+            continue
+        area_ratio = rect.width * rect.height / page_area
+        if area_ratio < params["min_area_ratio"] or area_ratio > params["max_area_ratio"]:
+            continue
+        regions.append(rect)
+
+    return _merge_regions(regions, params, page_rect)
+
+
+def find_layout_regions(page, params=None):
+    """
+    Page areas (in PDF points) holding large connected content in a
+    low-zoom render, for pages whose charts are neither embedded images nor
+    drawing clusters. The threshold is the same as at full zoom; the area
+    filter is halved because small renders merge less.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    zoom = params["layout_zoom"]
+    img_cv, _, _ = _render_page(page, zoom, params)
+    binary = _threshold(img_cv, params)
+    with tracing.span("layout"):
+        boxes = layout.segment(binary, min_box_area=binary.size * params["min_area_ratio"] / 2)
+    return _merge_regions(layout.to_rects(boxes, zoom), params, page.rect)
+
+
+def _chart_image_rects(page, params):
+    """Placements of embedded images smaller than the page-sized backgrounds."""
+    page_area = page.rect.width * page.rect.height
+    image_rects = [fitz.Rect(info["bbox"]) & page.rect for info in page.get_image_info()]
+    return [r for r in image_rects
+            if not r.is_empty and r.width * r.height / page_area <= params["max_area_ratio"]]
+
+
+def _grow_over_images(clip, image_rects, page_rect):
+    """
+    Grow a clip over every image it partly covers. MuPDF resamples a partly
+    clipped image differently, so this keeps the clip's pixels identical to
+    a whole-page render.
+    """
+    grown = True
+    while grown:
+        grown = False
+        for image_rect in image_rects:
+            if clip.intersects(image_rect) and not clip.contains(image_rect):
+                clip = (clip | image_rect) & page_rect
+                grown = True
+    return clip
+
+
+def _render(page, zoom, clip=None):
+    """
+    Render a page (or a clip of it) to BGR. Returns the image and the
+    position of its top-left pixel in whole-page pixel coordinates.
+
+    Clips are snapped outward to the zoomed pixel grid so their pixels line
+    up with the same pixels of a whole-page render.
+    """
+    if clip is not None:
+        clip = fitz.Rect(math.floor(clip.x0 * zoom) / zoom, math.floor(clip.y0 * zoom) / zoom,
+                         math.ceil(clip.x1 * zoom) / zoom, math.ceil(clip.y1 * zoom) / zoom) & page.rect
+    with tracing.span("render", zoom=zoom, clip=clip is not None):
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+        # A view of the pixmap's samples; the BGR conversion is the only copy
+        img_array = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+        return cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR), pix.x, pix.y
+
+
+def _rasters(params):
+    """The raster cache params name, or None."""
+    if not params["raster_cache_dir"]:
+        return None
+    return raster_cache.open_cache(params["raster_cache_dir"], params["raster_cache_mb"] * 1024 ** 2)
+
+
+def _render_page(page, zoom, params):
+    """Whole-page render, read from (and added to) the raster cache when params name one."""
+    rasters = _rasters(params)
+    if rasters is None:
+        return _render(page, zoom)
+    with tracing.span("render", zoom=zoom, clip=False, cache=True):
+        return rasters.page(page, zoom), 0, 0
+
+
+def _render_clip(page, zoom, clip, params):
+    """
+    Render of a clip, sliced out of a cached whole-page render when one
+    exists (e.g. from a page-mode run). Clips alone are not cached.
+    """
+    rasters = _rasters(params)
+    img = rasters.cached_page(page, zoom) if rasters is not None else None
+    if img is None:
+        return _render(page, zoom, clip=clip)
+    box = (clip * fitz.Matrix(zoom, zoom)).irect & fitz.IRect(0, 0, img.shape[1], img.shape[0])
+    return img[box.y0:box.y1, box.x0:box.x1], box.x0, box.y0
+
+
+def _render_padded(page, zoom, x0, y0, x1, y1, pad=_CLIP_PADDING):
+    """
+    Render whole-page pixels [x0, x1) x [y0, y1). Anti-aliasing is cut off
+    at a clip's edges, so a few extra pixels are rendered on every side and
+    sliced away.
+    """
+    clip = fitz.Rect((x0 - pad) / zoom, (y0 - pad) / zoom, (x1 + pad) / zoom, (y1 + pad) / zoom)
+    img_cv, ox, oy = _render(page, zoom, clip=clip)
+    return img_cv[y0 - oy:y1 - oy, x0 - ox:x1 - ox]
+
+
+def _render_crop(page, zoom, x, y, w, h, image_rects, max_bytes=None):
+    """
+    Render one rectangle given in whole-page pixels. The clip is grown over
+    images it cuts (unless that would break the memory ceiling) and the
+    rectangle is sliced back out.
+    """
+    rect = fitz.Rect(x / zoom, y / zoom, (x + w) / zoom, (y + h) / zoom)
+    clip = _grow_over_images(rect, image_rects, page.rect)
+    if max_bytes is not None and clip.width * clip.height * zoom * zoom * _BYTES_PER_PIXEL > max_bytes:
+        clip = rect
+    grown = (clip * fitz.Matrix(zoom, zoom)).irect
+    img_cv = _render_padded(page, zoom, min(grown.x0, x), min(grown.y0, y),
+                            max(grown.x1, x + w), max(grown.y1, y + h))
+    ox, oy = min(grown.x0, x), min(grown.y0, y)
+    return img_cv[y - oy:y - oy + h, x - ox:x - ox + w]
+
+
+def _render_mask(page, params, clip, image_rects, max_bytes):
+    """
+    Thresholded render of a clip (or the whole page) built band by band, so
+    no more than `max_bytes` are held at once. Band boundaries are moved so
+    they do not cut through chart-sized images where possible.
+
+    Returns the binary mask and the whole-page pixel position of its corner.
+    """
+    zoom = params["zoom"]
+    mat = fitz.Matrix(zoom, zoom)
+    irect = ((page.rect if clip is None else clip) * mat).irect & (page.rect * mat).irect
+    mask = np.empty((irect.height, irect.width), dtype=np.uint8)
+
+    rows = max(16, (max_bytes - mask.nbytes) // (_BYTES_PER_PIXEL * irect.width))
+    spans = [(math.floor(r.y0 * zoom), math.ceil(r.y1 * zoom)) for r in image_rects]
+
+    y = irect.y0
+    while y < irect.y1:
+        cut = min(y + rows, irect.y1)
+        moved = True
+        while moved:
+            moved = False
+            for top, bottom in spans:
+                if y < top < cut < bottom:
+                    cut = top
+                    moved = True
+
+        band = _render_padded(page, zoom, irect.x0, y, irect.x1, cut)
+        mask[y - irect.y0:cut - irect.y0] = _threshold(band, params)
+        del band
+        y = cut
+
+    return mask, irect.x0, irect.y0
+
+
+def _threshold(img_cv, params):
+    """Separate foreground from background, as 5_5.ipynb did."""
+    with tracing.span("threshold"):
+        gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
+        _, binary = cv2.threshold(gray, params["binary_threshold"], 255, cv2.THRESH_BINARY_INV)
+        return binary
+
+
+def _contour_candidates(binary, params, total_area, verbose=False):
+    """
+    Split a thresholded image into contours and return those that pass the
+    cheap shape and density checks, as (area, x, y, w, h) in the image's own
+    pixels, plus the bounding boxes of all the largest contours looked at.
+    """
+    # Find contours; only the largest few are ordered
+    with tracing.span("contours"):
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        areas = np.array([cv2.contourArea(contour) for contour in contours])
+    tracing.count("contours", len(contours))
+    candidates = []
+    boxes = []
+    for i in layout.largest(areas, params["max_contours"]):
+        contour, area = contours[i], areas[i]
+        boxes.append(tuple(int(v) for v in cv2.boundingRect(contour)))
+
+        # Skip if the area is too small or too large
+        if area < (total_area * params["min_area_ratio"]) or area > (total_area * params["max_area_ratio"]):
+            continue
+
+        x, y, w, h = cv2.boundingRect(contour)
+        x, y, w, h = int(x), int(y), int(w), int(h)
+
+        # Plot charts are typically not extremely wide/tall
+        aspect_ratio = float(w) / h
+        if aspect_ratio < params["min_aspect_ratio"] or aspect_ratio > params["max_aspect_ratio"]:
+            if verbose:
+                print(f"REJECTED: Region with dimensions {w}x{h} - Extreme aspect ratio {aspect_ratio:.2f}")
+            continue
+
+        # Check for wide banners (like 4896x663)
+        if w > 3000 and h < 800:
+            if verbose:
+                print(f"REJECTED: Region with dimensions {w}x{h} - Looks like a banner/header")
+            continue
+
+        # Dimensions close to known non-chart examples are only reported, as in
+        # 5_5.ipynb, so the accepted counts stay comparable with Reference.csv
+        for known_w, known_h in params["known_non_charts"]:
+            w_sim = abs(w - known_w) / max(w, known_w)
+            h_sim = abs(h - known_h) / max(h, known_h)
+            if w_sim < 0.1 and h_sim < 0.1 and verbose:
+                print(f"NOTE: Region with dimensions {w}x{h} - Similar to known non-chart")
+
+        # Skip if region appears to be full of text (not a chart)
+        roi = binary[y:y + h, x:x + w]
+        density = np.count_nonzero(roi) / (w * h)
+        if density < params["min_density"] or density > params["max_density"]:
+            if verbose:
+                print(f"REJECTED: Region with dimensions {w}x{h} - Content density ({density:.3f}) not characteristic of charts")
+            continue
+
+        candidates.append((area, x, y, w, h))
+
+    return candidates, boxes
+
+
+def candidate_mask(candidates, feats, params):
+    """
+    The shape, density, background and axis checks of _contour_candidates
+    and extract_page_charts for whole-page candidates, as one boolean array.
+
+    `candidates` holds per-candidate arrays (page, rank by contour area,
+    area, total_area, width, height, density) and `feats` their feature
+    matrix. Params may be (G, 1) arrays to decide G settings at once
+    (see tuning).
+    """
+    area, total_area = candidates["area"], candidates["total_area"]
+    w, h = candidates["width"], candidates["height"]
+    aspect_ratio = w / h
+    bg_flags = features.background_flags(feats, params["dark_border_fraction"])
+    return ((candidates["rank"] < params["max_contours"]) &
+            ~(np.asarray(params["skip_first_page"]) & (candidates["page"] == 0)) &
+            (area >= total_area * params["min_area_ratio"]) & (area <= total_area * params["max_area_ratio"]) &
+            (aspect_ratio >= params["min_aspect_ratio"]) & (aspect_ratio <= params["max_aspect_ratio"]) &
+            ~((w > 3000) & (h < 800)) &
+            (candidates["density"] >= params["min_density"]) & (candidates["density"] <= params["max_density"]) &
+            ~bg_flags["is_dark_bg"] & ~bg_flags["has_colored_bg"] &
+            features.has_axis_lines(feats, params["min_axis_lines"]))
+
+
+def _page_candidates(page, params, total_area, verbose=False):
+    """Candidates from a whole-page render: (area, x, y, w, h, image, ox, oy)."""
+    img_cv, ox, oy = _render_page(page, params["zoom"], params)
+    candidates, _ = _contour_candidates(_threshold(img_cv, params), params, total_area, verbose)
+    return [(area, x, y, w, h, img_cv, ox, oy) for area, x, y, w, h in candidates]
+
+
+def _clip_detections(found, boxes, ox, oy, clip_w, clip_h, page_w, page_h, region):
+    """
+    Detections of a clip in whole-page pixels, as (area, x, y, w, h).
+
+    Raises RegionIncomplete when the clip may have changed what a
+    whole-page render would find: a detection touches a clip edge that is
+    not a page edge, or a contour cut by such an edge encloses a detection
+    (on the whole page the detection would be inside that contour).
+    """
+    def touches(x, y, w, h):
+        return ((x <= 0 and ox > 0) or (y <= 0 and oy > 0) or
+                (x + w >= clip_w and ox + clip_w < page_w) or
+                (y + h >= clip_h and oy + clip_h < page_h))
+
+    cut = [box for box in boxes if touches(*box)]
+    detections = []
+    for area, x, y, w, h in found:
+        if touches(x, y, w, h):
+            raise RegionIncomplete(f"detection {w}x{h} touches the edge of region {region}")
+        for cx, cy, cw, ch in cut:
+            if cx <= x and cy <= y and x + w <= cx + cw and y + h <= cy + ch:
+                raise RegionIncomplete(f"detection {w}x{h} lies inside a contour cut by region {region}")
+        detections.append((area, ox + x, oy + y, w, h))
+    return detections
+
+
+def _region_candidates(page, regions, params, total_area, image_rects, verbose=False):
+    """
+    Candidates from rendering only the chart regions.
+
+    Each region is rendered with some headroom above it for the title
+    extension, but contours are only searched in the region itself.
+    Coordinates are converted to whole-page pixels so everything downstream
+    (title lookup, extension, filenames) is unchanged. Raises
+    RegionIncomplete if the clip may have changed the detections.
+    """
+    zoom = params["zoom"]
+    page_pixels = (page.rect * fitz.Matrix(zoom, zoom)).irect
+
+    candidates = []
+    seen = set()
+    for region in regions:
+        clip = fitz.Rect(region.x0, region.y0 - params["title_headroom"], region.x1, region.y1) & page.rect
+        clip = _grow_over_images(clip, image_rects, page.rect)
+        img_cv, ox, oy = _render_clip(page, zoom, clip, params)
+
+        # The headroom (and anything the clip grew over) is only for the title extension
+        top = max(0, math.floor(region.y0 * zoom) - oy)
+        search = img_cv[top:]
+        found, boxes = _contour_candidates(_threshold(search, params), params, total_area, verbose)
+
+        for area, x, y, w, h in _clip_detections(found, boxes, ox, oy + top, search.shape[1], search.shape[0],
+                                                  page_pixels.x1, page_pixels.y1, region):
+            # Clips can overlap, so the same contour may turn up twice
+            if (x, y, w, h) in seen:
+                continue
+            seen.add((x, y, w, h))
+            candidates.append((area, x, y, w, h, img_cv, ox, oy))
+
+    # Same order as a whole-page render: largest contour first
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    return candidates
+
+
+def _bounded_candidates(page, regions, params, total_area, image_rects, max_bytes, verbose=False):
+    """
+    Candidates found under a memory ceiling: each region (or the whole page
+    when `regions` is None) is thresholded band by band, and no colour
+    pixels are kept; crops are rendered on demand later.
+
+    Raises RegionIncomplete like _region_candidates.
+    """
+    zoom = params["zoom"]
+    page_pixels = (page.rect * fitz.Matrix(zoom, zoom)).irect
+
+    candidates = []
+    seen = set()
+    for region in (regions or [None]):
+        clip = None if region is None else _grow_over_images(region, image_rects, page.rect)
+        mask, ox, oy = _render_mask(page, params, clip, image_rects, max_bytes)
+        found, boxes = _contour_candidates(mask, params, total_area, verbose)
+        mask_h, mask_w = mask.shape
+        del mask
+
+        for area, x, y, w, h in _clip_detections(found, boxes, ox, oy, mask_w, mask_h,
+                                                  page_pixels.x1, page_pixels.y1, region):
+            if (x, y, w, h) in seen:
+                continue
+            seen.add((x, y, w, h))
+            candidates.append((area, x, y, w, h, None, x, y))
+
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    return candidates
+
+
+def _write_debug(page, params, candidates, decisions):
+    """Detection overlay (accepted green, rejected red) at zoom 1 and the candidates' metrics."""
+    zoom = params["zoom"]
+    stem = os.path.splitext(os.path.basename(page.parent.name or "document"))[0]
+    prefix = os.path.join(params["debug_dir"], f"{stem}_page{page.number + 1}")
+    os.makedirs(params["debug_dir"], exist_ok=True)
+
+    overview, _, _ = _render_page(page, 1, params)
+    overview = overview.copy()
+    for (_, x, y, w, h, *_), decision in zip(candidates, decisions):
+        colour = (0, 200, 0) if decision["accepted"] else (0, 0, 255)
+        cv2.rectangle(overview, (int(x / zoom), int(y / zoom)), (int((x + w) / zoom), int((y + h) / zoom)), colour, 2)
+    with open(prefix + "_detection.png", "wb") as f:
+        f.write(encode_image(overview))
+    with open(prefix + "_candidates.json", "w", encoding="utf-8") as f:
+        json.dump(decisions, f, indent=1)
+
+
+def extract_page_charts(page, params=None, verbose=False, writer=None):
+    """
+    Detect charts on a single page.
+
+    Returns a list of dicts (one per accepted chart, in detection order) with
+    the cleaned title, the encoded bytes of the title-extended crop, their
+    file extension and the original region size. With an ImageWriter the
+    image is a Future of the bytes, encoded on the writer's threads.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    with tracing.span("page", pdf=os.path.basename(page.parent.name or "document"), page=page.number + 1):
+        return _page_charts(page, params, verbose, writer)
+
+
+def _page_charts(page, params, verbose, writer):
+    zoom = params["zoom"]
+    page_pixels = (page.rect * fitz.Matrix(zoom, zoom)).irect
+    total_area = page_pixels.width * page_pixels.height
+
+    max_bytes = params["max_render_mb"] * 1024 ** 2 if params["max_render_mb"] else None
+    image_rects = _chart_image_rects(page, params)
+
+    candidates = None
+    if params["render_mode"] == "regions":
+        with tracing.span("regions"):
+            regions = find_chart_regions(page, params)
+            if not regions and params["layout_zoom"]:
+                regions = find_layout_regions(page, params)
+        if regions:
+            try:
+                if max_bytes is None:
+                    candidates = _region_candidates(page, regions, params, total_area, image_rects, verbose)
+                else:
+                    candidates = _bounded_candidates(page, regions, params, total_area, image_rects, max_bytes,
+                                                     verbose)
+            except RegionIncomplete as e:
+                tracing.count("region_fallbacks")
+                if verbose:
+                    print(f"  Falling back to a whole-page render: {e}")
+
+    if candidates is None:
+        if max_bytes is None:
+            candidates = _page_candidates(page, params, total_area, verbose)
+        else:
+            candidates = _bounded_candidates(page, None, params, total_area, image_rects, max_bytes, verbose)
+
+    # The whole-page version only ever looked at the largest contours
+    candidates = candidates[:params["max_contours"]]
+    tracing.count("pages")
+    tracing.count("candidates", len(candidates))
+    if not candidates:
+        if params["debug_dir"]:
+            _write_debug(page, params, [], [])
+        return []
+
+    def crop(x, y, w, h, img_cv, ox, oy):
+        if img_cv is None or y < oy or x < ox or y + h > oy + img_cv.shape[0] or x + w > ox + img_cv.shape[1]:
+            return _render_crop(page, zoom, x, y, w, h, image_rects, max_bytes)
+        return img_cv[y - oy:y - oy + h, x - ox:x - ox + w]
+
+    # Background and axis checks for all candidates in one batch; crops are
+    # made one at a time so a bounded render never holds them all
+    rows = []
+    for i, (_, x, y, w, h, img_cv, ox, oy) in enumerate(candidates):
+        with tracing.span("classify", candidate=i):
+            rows.append(features.image_features(crop(x, y, w, h, img_cv, ox, oy), max_side=params["feature_max_side"]))
+    feats = np.vstack(rows)
+    bg_flags = features.background_flags(feats, params["dark_border_fraction"])
+    has_axes = features.has_axis_lines(feats, params["min_axis_lines"])
+
+    with tracing.span("text_index"):
+        text_index = PageTextIndex.from_page(page)
+    image_format = format_from_params(params)
+    decisions = []
+
+    charts = []
+    for i, (area, x, y, w, h, img_cv, ox, oy) in enumerate(candidates):
+        if params["debug_dir"]:
+            decisions.append({"x": x, "y": y, "width": w, "height": h, "area_ratio": round(area / total_area, 4),
+                              "horiz_lines": int(features.column(feats, "horiz_lines")[i]),
+                              "vert_lines": int(features.column(feats, "vert_lines")[i]), "accepted": False})
+        if bg_flags["is_dark_bg"][i]:
+            tracing.count("rejected_dark_background")
+            if verbose:
+                print(f"REJECTED: Region with dimensions {w}x{h} - Dark background (not typical for plot charts)")
+            continue
+        if bg_flags["has_colored_bg"][i]:
+            tracing.count("rejected_colored_background")
+            if verbose:
+                print(f"REJECTED: Region with dimensions {w}x{h} - Colored background (unusual for plot charts)")
+            continue
+        if not has_axes[i]:
+            tracing.count("rejected_no_axes")
+            if verbose:
+                print(f"REJECTED: Region with dimensions {w}x{h} - No clear chart elements found")
+                print(f"  (Found {int(features.column(feats, 'horiz_lines')[i])} horizontal lines, "
+                      f"{int(features.column(feats, 'vert_lines')[i])} vertical lines)")
+            continue
+        if params["debug_dir"]:
+            decisions[-1]["accepted"] = True
+
+        # Chart position in original PDF coordinates
+        orig_rect = fitz.Rect(x / zoom, y / zoom, (x + w) / zoom, (y + h) / zoom)
+        with tracing.span("title", candidate=i):
+            title, closest_title_y = find_chart_title(text_index, orig_rect)
+
+        # Extend upward by 100 pixels or 10% of height, or far enough to include the title
+        extend_upward = max(100, int(h * 0.1))
+        if closest_title_y is not None:
+            title_offset = y - int(closest_title_y * zoom)
+            if title_offset > 0:  # Title is above the detected region
+                extend_upward = max(extend_upward, title_offset + 20)  # Add 20px margin
+
+        new_y = int(max(0, y - extend_upward))
+        new_h = int(h + (y - new_y))
+
+        # Rendered separately if the clip did not include enough headroom for this title
+        extended_chart_region = crop(x, new_y, w, new_h, img_cv, ox, oy)
+
+        if writer is not None:
+            image = writer.encode(extended_chart_region)
+        else:
+            with tracing.span("encode", candidate=i):
+                image = encode_image(extended_chart_region, **image_format)
+        tracing.count("charts")
+        charts.append({
+            "title": title,
+            "clean_title": clean_title_for_filename(title),
+            "image": image,
+            "ext": EXTENSIONS[image_format["image_format"]],
+            "width": w,
+            "height": h,
+        })
+
+        if verbose:
+            print(f"ACCEPTED: {w}x{h} region, Title: {title}")
+
+    if params["debug_dir"]:
+        with tracing.span("debug"):
+            _write_debug(page, params, candidates, decisions)
+    return charts
+
+
+def extract_page_charts_from_file(pdf_path, page_num, params=None, verbose=False):
+    """Open a PDF, detect charts on one page and close it again."""
+    doc = fitz.open(pdf_path)
+    try:
+        return extract_page_charts(doc[page_num], params=params, verbose=verbose)
+    finally:
+        doc.close()
+
+
+def pages_to_process(page_count, params=None):
+    """Page indices the extractor looks at (the cover page is skipped by default)."""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    first = 1 if params["skip_first_page"] else 0
+    return list(range(first, page_count))
+
+
+def name_page_charts(pdf_file, page_results):
+    """
+    Assign the per-PDF plot numbers to page results.
+
+    `page_results` must be in page order. Returns a list of
+    (image_filename, image_bytes) tuples.
+    """
+    named = []
+    for charts in page_results:
+        for chart in charts:
+            filename = chart_filename(pdf_file, len(named) + 1, chart["clean_title"], chart.get("ext", "png"))
+            named.append((filename, chart["image"]))
+    return named
+
+
+def extract_charts_from_pdf(pdf_path, params=None, verbose=False):
+    """
+    Detect charts on every page of a PDF.
+
+    Returns a list of (image_filename, image_bytes) tuples in the order the
+    notebook would have saved them. With params["encode_threads"] the crops
+    are encoded in the background while later pages are detected.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    writer = ImageWriter.from_params(params, workers=params["encode_threads"]) if params["encode_threads"] else None
+    doc = fitz.open(pdf_path)
+    try:
+        with tracing.span("pdf", pdf=os.path.basename(pdf_path), pages=len(doc)):
+            page_results = [extract_page_charts(doc[page_num], params=params, verbose=verbose, writer=writer)
+                            for page_num in pages_to_process(len(doc), params)]
+    finally:
+        doc.close()
+        if writer is not None:
+            writer.close()
+    named = name_page_charts(os.path.basename(pdf_path), page_results)
+    return [(filename, image if writer is None else image.result()) for filename, image in named]
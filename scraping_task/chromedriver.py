@@ -0,0 +1,119 @@
+"""
+Cached chromedriver resolution for the Selenium scrapers (1.py, 2.py).
+
+ChromeDriverManager().install() asks the network for the current driver
+version on every start, and may download one. Here the resolved driver path
+is remembered in a small JSON file and reused without any network access
+until it is max_age_days old. A cached driver that still exists is also used
+when a refresh fails, so the scrapers keep working offline. When Chrome has
+updated past the cached driver, make_chrome() resolves a fresh one and
+retries once.
+
+Resolution order:
+    1. the CHROMEDRIVER environment variable (a path, never checked online)
+    2. the cached path, if it exists and is fresh (or SCRAPING_TASK_OFFLINE is set)
+    3. chromedriver on PATH
+    4. webdriver_manager, whose result is cached
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "scraping_task", "chromedriver.json")
+DEFAULT_MAX_AGE_DAYS = 7
+
+
+def _is_executable(path):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache_path, path, source):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"path": path, "source": source, "resolved_at": time.time()}, f)
+    os.replace(tmp_path, cache_path)
+
+
+def resolve_chromedriver(cache_path=DEFAULT_CACHE_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS, refresh=False):
+    """
+    Path to a chromedriver executable, touching the network only when no
+    usable cached or installed driver is known. Raises RuntimeError if none
+    can be found.
+    """
+    pinned = os.environ.get("CHROMEDRIVER")
+    if pinned:
+        if not _is_executable(pinned):
+            raise RuntimeError(f"CHROMEDRIVER={pinned} is not an executable file")
+        return pinned
+
+    cached = _read_cache(cache_path)
+    cached_path = cached.get("path") if _is_executable(cached.get("path")) else None
+    offline = bool(os.environ.get("SCRAPING_TASK_OFFLINE"))
+    if cached_path and not refresh:
+        age_days = (time.time() - cached.get("resolved_at", 0)) / 86400
+        if offline or age_days < max_age_days:
+            return cached_path
+
+    on_path = shutil.which("chromedriver")
+    if on_path and not refresh:
+        _write_cache(cache_path, on_path, "PATH")
+        return on_path
+
+    if not offline:
+        try:
+            # Imported here so a cache hit never loads webdriver_manager
+            from webdriver_manager.chrome import ChromeDriverManager
+            installed = ChromeDriverManager().install()
+        except Exception as e:
+            print(f"Could not refresh chromedriver ({e})" + ("; using the cached driver" if cached_path else ""))
+        else:
+            _write_cache(cache_path, installed, "webdriver_manager")
+            return installed
+
+    if cached_path:
+        return cached_path
+    if on_path:
+        return on_path
+    raise RuntimeError("No chromedriver found: set CHROMEDRIVER, put chromedriver on PATH or go online once")
+
+
+def make_chrome(options, cache_path=DEFAULT_CACHE_PATH):
+    """webdriver.Chrome with a cached driver, re-resolved once if Chrome has moved past it."""
+    from selenium import webdriver
+    from selenium.common.exceptions import SessionNotCreatedException
+    from selenium.webdriver.chrome.service import Service
+
+    try:
+        return webdriver.Chrome(service=Service(resolve_chromedriver(cache_path)), options=options)
+    except SessionNotCreatedException:
+        if os.environ.get("CHROMEDRIVER"):
+            raise
+        return webdriver.Chrome(service=Service(resolve_chromedriver(cache_path, refresh=True)), options=options)
+
+
+def main():
+    """Print the resolved driver (resolving and caching one if needed)."""
+    parser = argparse.ArgumentParser(description="Resolve and cache the chromedriver used by the scrapers.")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the cache and resolve again")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH)
+    args = parser.parse_args()
+    try:
+        print(resolve_chromedriver(args.cache_path, refresh=args.refresh))
+    except RuntimeError as e:
+        print(e)
+        return 1
+
+
+if __name__ == "__main__":
+    main()
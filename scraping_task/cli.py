@@ -0,0 +1,79 @@
+"""
+Single entry point for the package's tools and the numbered scrapers.
+
+Each subcommand imports only its own module when it runs, so asking for
+help, checking the catalogue or downloading PDFs never loads OpenCV,
+PyMuPDF, pandas or Selenium unless that command needs them. Arguments
+after the subcommand go to the module's own parser.
+
+Usage:
+    python -m scraping_task catalogue status
+    python -m scraping_task download --csv combined_data.csv --workers 8
+    python -m scraping_task extract --help
+    python -m scraping_task guidelines
+"""
+import importlib
+import os
+import runpy
+import sys
+
+PROG = "python -m scraping_task"
+
+# Subcommand -> (module with a main(), summary)
+COMMANDS = {
+    "articles": ("1.py", "crawl jdpowervalues articles for Month/Year (1.py)"),
+    "search": ("2.py", "web search for guideline PDFs (2.py)"),
+    "guidelines": ("3.py", "scrape the industry-guidelines page (3.py)"),
+    "download": ("scraping_task.downloader", "download the PDFs linked from a CSV"),
+    "rates": ("scraping_task.rate_scheduler", "show or reset the per-host request rates the crawlers learned"),
+    "store": ("scraping_task.pdf_store", "import PDFs into, or summarise, the content-addressed PDF store"),
+    "extract": ("scraping_task.batch_extract", "extract charts from every PDF"),
+    "queue": ("scraping_task.work_queue", "submit, work on, inspect or collect a shared extraction run"),
+    "review": ("scraping_task.review", "keep/delete review of extracted charts in the browser (4.py)"),
+    "digitise": ("scraping_task.chart_digitiser", "read chart series from the PDFs' vector drawings into a tidy CSV"),
+    "pipeline": ("scraping_task.pipeline", "discover, download, extract and catalogue in one run"),
+    "near-text": ("scraping_task.near_text", "capture the chart below a heading (3.ipynb)"),
+    "images": ("scraping_task.image_catalogue", "count and reconcile the images of each PDF"),
+    "catalogue": ("scraping_task.catalogue_store", "import, export or summarise the catalogue store"),
+    "dates": ("scraping_task.dates", "benchmark the date parsing"),
+    "benchmark": ("scraping_task.benchmark", "benchmark the extraction variants"),
+    "rasters": ("scraping_task.raster_cache", "pre-render, summarise or clear the page-raster cache"),
+    "tune": ("scraping_task.tuning", "collect candidate features and score threshold grids"),
+    "trace": ("scraping_task.tracing", "summarise a timing report written with --trace-report"),
+    "chromedriver": ("scraping_task.chromedriver", "resolve and cache the chromedriver"),
+}
+
+# The numbered scripts live in the repository root, next to the package
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def usage():
+    width = max(len(name) for name in COMMANDS)
+    lines = [f"usage: {PROG} <command> [args...]", "", "commands:"]
+    lines += [f"  {name:<{width}}  {summary}" for name, (_, summary) in COMMANDS.items()]
+    lines += ["", f"Run '{PROG} <command> --help' for a command's options."]
+    return "\n".join(lines)
+
+
+def run(command, argv):
+    """Run one subcommand with `argv` as its arguments."""
+    target, _ = COMMANDS[command]
+    sys.argv = [f"{PROG} {command}"] + list(argv)
+    if target.endswith(".py"):
+        if REPO_ROOT not in sys.path:
+            sys.path.insert(0, REPO_ROOT)
+        runpy.run_path(os.path.join(REPO_ROOT, target), run_name="__main__")
+        return 0
+    return importlib.import_module(target).main()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"Unknown command: {command}\n\n{usage()}", file=sys.stderr)
+        return 2
+    return run(command, rest)
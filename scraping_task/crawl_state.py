@@ -0,0 +1,53 @@
+"""
+Persistent crawl state for the jdpowervalues article scraper (1.py).
+
+The state file remembers every article URL that has been processed, with
+the Month/Year found on it (or none), so a rerun never fetches an article
+twice and can stop paginating at the first listing page with nothing new.
+Lookups are dict-based, so checking a URL is O(1) however large the
+archive gets.
+"""
+import json
+import os
+from datetime import datetime
+
+
+class CrawlState:
+    """Seen-URL index plus the extracted rows, stored as one JSON file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.articles = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.articles = json.load(f).get("articles", {})
+
+    def __contains__(self, url):
+        return url in self.articles
+
+    def __len__(self):
+        return len(self.articles)
+
+    def all_known(self, urls):
+        """True if every URL has already been processed (vacuously true for none)."""
+        return all(url in self.articles for url in urls)
+
+    def record(self, url, month=None, year=None):
+        """Mark an article as processed, with the date found on it if any."""
+        self.articles[url] = {
+            "Month": month,
+            "Year": year,
+            "processed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def rows(self):
+        """Link/Month/Year rows for every article where a date was found."""
+        return [{"Link": url, "Month": entry["Month"], "Year": entry["Year"]}
+                for url, entry in self.articles.items() if entry["Month"]]
+
+    def save(self):
+        """Write the state atomically so an interrupted run never corrupts it."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"articles": self.articles}, f, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,276 @@
+"""
+Month/year extraction shared by the scrapers, the downloader and the
+catalogue.
+
+The same parsing used to be written out in several places, row by row:
+1.ipynb's convert_to_datetime (applied with axis=1 to every source CSV),
+6.ipynb's extract_date_components (called twice per row), 2.py's
+extract_date_from_link (compiling its patterns for every link), 3.py's
+regex cascade and 2_5.ipynb's month_to_number. Here the patterns are
+compiled once, and the Series functions run them over a whole column with
+the pandas .str methods instead of a Python call per row. pandas is only
+imported by the Series functions, so the scalar ones cost nothing to load.
+
+Forms covered:
+    12.2021_Commercial%20Truck%20Guidelines.pdf   numeric month, then year
+    6.2024_CommercialVehicleGuidelines_Final.pdf  (".", "/", "-" or "_")
+    August_2022_Guidelines.pdf, September 2022    month name, then year
+    /article/september-2022-commercial-truck-...  (full or abbreviated)
+    /article/...-through-end-2022                 year only
+    Month="Sept.", Year=2022                      separate columns
+
+Usage:
+    python -m scraping_task.dates --benchmark
+"""
+import argparse
+import glob
+import os
+import re
+import time
+from datetime import datetime
+
+MONTH_NAMES = ("January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December")
+
+# Lower-case full names, three-letter abbreviations and "sept" -> month number
+MONTH_NUMBERS = {name.lower(): i for i, name in enumerate(MONTH_NAMES, start=1)}
+MONTH_NUMBERS.update({name[:3].lower(): i for i, name in enumerate(MONTH_NAMES, start=1)})
+MONTH_NUMBERS["sept"] = 9
+
+_MONTH_ALTERNATION = "|".join(sorted(MONTH_NUMBERS, key=len, reverse=True))
+
+# M.YYYY / M/YYYY / M-YYYY / M_YYYY, not inside a longer number
+_NUMERIC_DATE = re.compile(r"(?<!\d)(?P<month>\d{1,2})[./_-](?P<year>\d{4})(?!\d)")
+# A month name followed (eventually) by a year, as 2.py searched the lower-cased link
+_NAMED_DATE = re.compile(rf"(?<![a-z])(?P<month>{_MONTH_ALTERNATION})(?![a-z]).*?(?P<year>\d{{4}})",
+                         re.IGNORECASE)
+# A bare year between separators, e.g. "-2022-" in an article slug
+_YEAR_ONLY = re.compile(r"(?<![0-9a-z])(?P<year>(?:19|20)\d{2})(?![0-9a-z])", re.IGNORECASE)
+# Names that start with the date, as the downloaded PDFs and the extracted images do
+_LEADING_NUMERIC = re.compile(r"^(?P<month>\d{1,2})[._-](?P<year>\d{4})(?!\d)")
+_LEADING_NAMED = re.compile(rf"^(?P<month>{_MONTH_ALTERNATION})[ _-](?P<year>\d{{4}})(?!\d)", re.IGNORECASE)
+# 2_5.ipynb's rename rules
+_PDF_NUMERIC = re.compile(r"(\d+)\.(\d{4})_.*\.pdf")
+_PDF_NAMED = re.compile(r"([A-Za-z]+)_(\d{4})_.*\.pdf")
+
+
+def month_number(month):
+    """1-12 for a month name, abbreviation ("Sept.") or number, else None."""
+    if month is None:
+        return None
+    if isinstance(month, (int, float)):
+        return int(month) if month == month and 1 <= month <= 12 else None
+    text = str(month).strip().rstrip(".").lower()
+    if text.isdigit():
+        return int(text) if 1 <= int(text) <= 12 else None
+    return MONTH_NUMBERS.get(text)
+
+
+def month_name(month, abbreviated=False):
+    """ "December" (or "Dec") for 12, "Dec" or "december"; None if unknown."""
+    number = month_number(month)
+    if number is None:
+        return None
+    name = MONTH_NAMES[number - 1]
+    return name[:3] if abbreviated else name
+
+
+def month_to_number(month):
+    """2_5.ipynb's two-digit month string, "00" if the name is unknown."""
+    number = month_number(month)
+    return f"{number:02d}" if number else "00"
+
+
+def _valid(month, year):
+    month = month_number(month)
+    return (month, int(year)) if month is not None else (None, None)
+
+
+def date_from_text(text):
+    """
+    (month, year) as integers from a URL, file name or link text, or
+    (None, None). Numeric dates win over month names, which win over a
+    bare year (month None).
+    """
+    if not text:
+        return None, None
+    for pattern in (_NUMERIC_DATE, _NAMED_DATE):
+        for match in pattern.finditer(text):
+            month, year = _valid(match["month"], match["year"])
+            if month is not None:
+                return month, year
+    match = _YEAR_ONLY.search(text)
+    return (None, int(match["year"])) if match else (None, None)
+
+
+def filename_date(filename):
+    """(month, year) from a name that starts with its date ("04_2019.pdf", "August_2022_..."), or (None, None)."""
+    name = os.path.basename(filename)
+    match = _LEADING_NUMERIC.match(name) or _LEADING_NAMED.match(name)
+    if match is None:
+        return None, None
+    month = month_number(match["month"])
+    return month, int(match["year"]) if month is not None else None
+
+
+def canonical_pdf_name(filename):
+    """
+    The MM_YYYY.pdf name 2_5.ipynb gives a downloaded guideline, or None.
+
+    "04.2019_Commercial Truck Guidelines_1.pdf" -> "04_2019.pdf",
+    "August_2022_Guidelines.pdf" -> "08_2022.pdf".
+    """
+    match = _PDF_NUMERIC.match(filename)
+    if match:
+        month, year = match.groups()
+        return f"{month}_{year}.pdf"
+
+    match = _PDF_NAMED.match(filename)
+    if match:
+        month, year = match.groups()
+        return f"{month_to_number(month)}_{year}.pdf"
+
+    return None
+
+
+# Whole-column versions
+
+def parse_months(months):
+    """Month numbers (nullable Int64) for a Series of names, abbreviations or numbers."""
+    import pandas as pd
+
+    text = months.astype("string").str.strip().str.rstrip(".").str.lower()
+    numeric = pd.to_numeric(text.where(text.str.fullmatch(r"\d{1,2}", na=False)), errors="coerce")
+    named = text.map(MONTH_NUMBERS, na_action="ignore")
+    result = numeric.where(numeric.between(1, 12)).fillna(pd.to_numeric(named, errors="coerce"))
+    return result.astype("Int64")
+
+
+def month_start(months, years):
+    """
+    First-of-month datetimes from month and year Series (1.ipynb's
+    convert_to_datetime); NaT where either is missing or invalid.
+    """
+    import pandas as pd
+
+    month = parse_months(months)
+    year = pd.to_numeric(pd.Series(years, index=month.index), errors="coerce")
+    parts = pd.DataFrame({"year": year, "month": month.astype("float64"), "day": 1})
+    return pd.to_datetime(parts, errors="coerce")
+
+
+def extract_dates(texts):
+    """
+    DataFrame of nullable "month" and "year" columns for a Series of URLs,
+    file names or link texts, as date_from_text reads them.
+
+    The scraped CSVs repeat the same links many times over, so each distinct
+    text is parsed once and the results are scattered back by code.
+    """
+    import pandas as pd
+
+    codes, uniques = pd.factorize(pd.Series(texts).astype("string"))
+    parsed = [date_from_text(text) for text in uniques]
+    months = pd.array([m for m, _ in parsed] + [None], dtype="Int64")
+    years = pd.array([y for _, y in parsed] + [None], dtype="Int64")
+    # factorize codes missing values as -1, which picks the trailing None
+    return pd.DataFrame({"month": months[codes], "year": years[codes]}, index=texts.index)
+
+
+def canonical_pdf_names(filenames):
+    """canonical_pdf_name for a whole Series (None where no rule applies)."""
+    return filenames.map(canonical_pdf_name, na_action="ignore")
+
+
+# Benchmark: the row-by-row originals against the Series versions
+
+_LEGACY_MONTH_MAPPING = {'Jan': 'January', 'Feb': 'February', 'Mar': 'March', 'Apr': 'April', 'May': 'May',
+                         'Jun': 'June', 'Jul': 'July', 'Aug': 'August', 'Sep': 'September', 'Sept.': 'September',
+                         'Sept': 'September', 'Oct': 'October', 'Nov': 'November', 'Dec': 'December'}
+
+
+def _legacy_convert_to_datetime(row):
+    """1.ipynb's convert_to_datetime, as the benchmark baseline."""
+    import pandas as pd
+
+    try:
+        month_str = _LEGACY_MONTH_MAPPING.get(row['Month'], row['Month'])
+        return pd.to_datetime(f"{month_str} 1, {row['Year']}", format="%B %d, %Y")
+    except Exception:
+        return pd.NaT
+
+
+def _legacy_extract_date_from_link(link):
+    """2.py's extract_date_from_link (numeric part), compiling its patterns per call."""
+    for pattern in [r'(\d{1,2})\.(\d{4})', r'(\d{1,2})/(\d{4})', r'(\d{1,2})-(\d{4})', r'(\d{1,2})_(\d{4})']:
+        matches = re.search(pattern, link)
+        if matches and 1 <= int(matches.group(1)) <= 12:
+            return datetime(2000, int(matches.group(1)), 1).strftime('%b'), matches.group(2)
+    for pattern in [r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[^a-z].*?(\d{4})',
+                    r'(january|february|march|april|may|june|july|august|september|october|november|december)'
+                    r'[^a-z].*?(\d{4})']:
+        matches = re.search(pattern, link.lower())
+        if matches:
+            return matches.group(1)[:3].capitalize(), matches.group(2)
+    return None, None
+
+
+def _time(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - started) / repeat
+
+
+def benchmark(csv_paths, repeat=20, scale=100):
+    """
+    Time the per-row originals against the Series versions on the month/
+    year columns and the links of `csv_paths`, each stacked `scale` times.
+    Returns {name: (legacy_seconds, vectorised_seconds, disagreements)}.
+    """
+    import pandas as pd
+
+    frames = []
+    for path in csv_paths:
+        df = pd.read_csv(path)
+        df = df.rename(columns={'month': 'Month', 'year': 'Year'})
+        frames.append(df[['Month', 'Year', 'link']])
+    data = pd.concat(frames * scale, ignore_index=True)
+
+    results = {}
+    legacy, legacy_s = _time(lambda: data.apply(_legacy_convert_to_datetime, axis=1), repeat)
+    new, new_s = _time(lambda: month_start(data['Month'], data['Year']), repeat)
+    results["month/year columns"] = (legacy_s, new_s, int((legacy.fillna(pd.Timestamp(0)) !=
+                                                           new.fillna(pd.Timestamp(0))).sum()))
+
+    legacy, legacy_s = _time(lambda: data['link'].map(_legacy_extract_date_from_link), repeat)
+    new, new_s = _time(lambda: extract_dates(data['link']), repeat)
+    legacy_months = parse_months(legacy.str[0])
+    legacy_years = pd.to_numeric(legacy.str[1]).astype("Int64")
+    agree = ((legacy_months.fillna(0) == new['month'].fillna(0)) &
+             (legacy_years.fillna(0) == new['year'].where(new['month'].notna()).fillna(0)))
+    results["dates from links"] = (legacy_s, new_s, int((~agree).sum()))
+    return results, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorised date parsing on the scraped CSVs.")
+    parser.add_argument("--benchmark", action="store_true", help="Run the benchmark (the only action)")
+    parser.add_argument("--csv", nargs="+", default=None, help="Inputs (default: 2_*.csv and 3_1.csv)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=100, help="Stack the inputs this many times")
+    args = parser.parse_args()
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    csv_paths = args.csv or sorted(glob.glob("2_*.csv")) + ["3_1.csv"]
+    results, rows = benchmark(csv_paths, repeat=args.repeat, scale=args.scale)
+    print(f"{rows} rows from {', '.join(csv_paths)} (x{args.scale})")
+    for name, (legacy_s, new_s, disagreements) in results.items():
+        print(f"{name}: per-row {legacy_s * 1000:.1f} ms, vectorised {new_s * 1000:.1f} ms "
+              f"({legacy_s / new_s:.1f}x), {disagreements} rows disagree")
+
+
+if __name__ == "__main__":
+    main()
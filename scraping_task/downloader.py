@@ -0,0 +1,331 @@
+"""
+Concurrent PDF downloader, replacing the download loop in 2.ipynb.
+
+All requests go through one pooled ScheduledSession, paced per host by the
+shared rate scheduler, and a bounded thread pool. Partial downloads are kept as <name>.part and resumed with a Range
+request; completed downloads remember their ETag/Last-Modified so a rerun
+sends a conditional GET and skips PDFs the CDN reports as unchanged.
+
+The same log files as the notebook are written to the logs directory:
+non_pdf_links_*.csv, duplicate_links_*.csv, error_links_*.csv and
+download_summary_*.csv.
+
+With a PdfStore (--pdf-store) every distinct PDF is kept once: URLs fetched
+before are skipped without a request, a HEAD probe skips likely mirrors of
+stored PDFs, and the files in the output directory are links to the store.
+
+Usage:
+    python -m scraping_task.downloader --csv combined_data.csv --workers 8
+    python -m scraping_task.downloader --csv combined_data.csv --pdf-store .pdf_store
+"""
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scraping_task import tracing
+from scraping_task.pdf_store import PdfStore
+from scraping_task.rate_scheduler import ScheduledSession
+
+STATE_FILENAME = "download_state.json"
+CHUNK_SIZE = 256 * 1024
+
+
+def make_session(pool_size=8, retries=2, scheduler=None):
+    """Rate-scheduled session with a connection pool large enough for `pool_size` threads."""
+    session = ScheduledSession(scheduler)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def load_state(output_dir):
+    """Per-URL download state (filename, ETag, Last-Modified) from a previous run."""
+    try:
+        with open(os.path.join(output_dir, STATE_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILENAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def is_pdf_response(url, response):
+    """Same acceptance rule as 2.ipynb: PDF content type or a .pdf URL."""
+    content_type = response.headers.get('Content-Type', '')
+    return 'application/pdf' in content_type or url.lower().endswith('.pdf')
+
+
+def download_pdf(session, url, output_path, known=None, timeout=30, chunk_size=CHUNK_SIZE):
+    """
+    Download one PDF to `output_path`.
+
+    `known` is the state entry from a previous run (or None). Returns a dict
+    with a "status" of "downloaded", "not_modified", "non_pdf" or "error",
+    plus the validators to remember and any error/content-type detail.
+    """
+    with tracing.span("download", pdf=os.path.basename(output_path), url=url) as span:
+        result = _download_pdf(session, url, output_path, known, timeout, chunk_size)
+        span.set(status=result["status"])
+        tracing.count(f"download_{result['status']}")
+    return result
+
+
+def _download_pdf(session, url, output_path, known, timeout, chunk_size):
+    known = known or {}
+    part_path = output_path + ".part"
+    headers = {}
+
+    # Conditional GET for a file we already have
+    if os.path.exists(output_path):
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+
+    # Resume a partial file; If-Range makes the server send the full body if it changed
+    resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if resume_from:
+        headers["Range"] = f"bytes={resume_from}-"
+        validator = known.get("partial_etag") or known.get("partial_last_modified")
+        if validator:
+            headers["If-Range"] = validator
+
+    try:
+        with session.get(url, headers=headers, stream=True, timeout=timeout, allow_redirects=True) as response:
+            if response.status_code == 304:
+                return {"status": "not_modified"}
+            if response.status_code == 416 and resume_from:
+                # The partial file is already complete (or stale); start over next time
+                os.remove(part_path)
+                return {"status": "error", "error": "Range not satisfiable, partial file discarded"}
+            response.raise_for_status()
+
+            content_type = response.headers.get('Content-Type', '')
+            if not is_pdf_response(url, response):
+                return {"status": "non_pdf", "content_type": content_type}
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            mode = "ab" if response.status_code == 206 else "wb"
+
+            try:
+                with tracing.span("body"), open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            tracing.count("bytes_downloaded", len(chunk))
+            except (requests.RequestException, OSError) as e:
+                # Keep what we have so the next run can resume it
+                return {"status": "error", "error": str(e),
+                        "partial_etag": etag, "partial_last_modified": last_modified}
+
+        os.replace(part_path, output_path)
+        return {"status": "downloaded", "etag": etag, "last_modified": last_modified,
+                "resumed": mode == "ab"}
+    except requests.Timeout:
+        return {"status": "error", "error": f"Timeout: Request took longer than {timeout} seconds"}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+
+def _unique_filename(output_dir, filename, taken):
+    """Add a _1, _2, ... suffix until the name is free on disk and in this run."""
+    base_name, extension = os.path.splitext(filename)
+    counter = 1
+    while filename in taken or os.path.exists(os.path.join(output_dir, filename)):
+        filename = f"{base_name}_{counter}{extension}"
+        counter += 1
+    taken.add(filename)
+    return filename
+
+
+def _filename_for(url, index):
+    """Filename from the URL path, or document_<index>.pdf like the notebook."""
+    filename = os.path.basename(urlparse(url).path)
+    if not filename or not filename.lower().endswith('.pdf'):
+        filename = f"document_{index}.pdf"
+    return filename
+
+
+class _CsvLog:
+    """Append-only CSV log shared between threads."""
+
+    def __init__(self, path, header):
+        self.path = path
+        self._lock = threading.Lock()
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerow(header)
+
+    def write(self, row):
+        with self._lock:
+            with open(self.path, 'a', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerow(row)
+
+
+def read_links(csv_path, column="link"):
+    """Links from a CSV such as combined_data.csv, in file order (blank cells skipped)."""
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return [row[column] for row in csv.DictReader(f) if row.get(column)]
+
+
+def download_all(links, output_dir, logs_dir, workers=4, timeout=30, max_runtime=3600, session=None, store=None):
+    """
+    Download every link with at most `workers` concurrent requests.
+
+    With a PdfStore `store`, PDFs are fetched through it (see pdf_store) and
+    named in `output_dir` as links to the store; the state file is not used.
+
+    Returns a dict of counters (the same metrics as the notebook summary,
+    plus "known", "probe_duplicates" and "deduplicated" with a store).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(logs_dir, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    non_pdf_log = _CsvLog(os.path.join(logs_dir, f"non_pdf_links_{timestamp}.csv"), ['URL', 'Content-Type'])
+    duplicate_log = _CsvLog(os.path.join(logs_dir, f"duplicate_links_{timestamp}.csv"), ['URL'])
+    error_log = _CsvLog(os.path.join(logs_dir, f"error_links_{timestamp}.csv"), ['URL', 'Error'])
+
+    state = load_state(output_dir)
+    session = session or make_session(pool_size=workers)
+    counts = {"downloaded": 0, "not_modified": 0, "duplicates": 0, "non_pdf": 0, "errors": 0}
+    if store is not None:
+        counts.update(known=0, probe_duplicates=0, deduplicated=0)
+
+    # Dedupe and assign filenames up front so workers never race on names
+    jobs = []
+    seen = set()
+    taken = {entry["filename"] for entry in state.values() if entry.get("filename")}
+    for index, url in enumerate(links):
+        if url in seen:
+            counts["duplicates"] += 1
+            duplicate_log.write([url])
+            continue
+        seen.add(url)
+
+        if store is not None:
+            # The store picks the final name: mirrors of one PDF share it
+            jobs.append((url, _filename_for(url, index), None))
+            continue
+        known = state.get(url, {})
+        filename = known.get("filename") or _unique_filename(output_dir, _filename_for(url, index), taken)
+        jobs.append((url, filename, known))
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for url, filename, known in jobs:
+            if store is not None:
+                future = executor.submit(store.fetch, session, url, output_dir, filename, timeout)
+            else:
+                future = executor.submit(download_pdf, session, url, os.path.join(output_dir, filename),
+                                         known, timeout)
+            futures[future] = (url, filename)
+
+        for future in as_completed(futures):
+            url, filename = futures[future]
+            result = future.result()
+            status = result["status"]
+            output_path = os.path.join(output_dir, filename)
+
+            if status == "downloaded":
+                counts["downloaded"] += 1
+                if store is None:
+                    state[url] = {"filename": filename, "etag": result["etag"],
+                                  "last_modified": result["last_modified"]}
+            elif status == "known":
+                counts["known"] += 1
+            elif status == "duplicate":
+                counts["probe_duplicates"] += 1
+                duplicate_log.write([url])
+            elif status == "deduplicated":
+                counts["deduplicated"] += 1
+                duplicate_log.write([url])
+            elif status == "not_modified":
+                counts["not_modified"] += 1
+            elif status == "non_pdf":
+                counts["non_pdf"] += 1
+                print(f"Link is not a PDF: {url} (Content-Type: {result['content_type']})")
+                non_pdf_log.write([url, result["content_type"]])
+                if os.path.exists(output_path + ".part"):
+                    os.remove(output_path + ".part")
+            else:
+                counts["errors"] += 1
+                print(f"Error downloading {url}: {result['error']}")
+                error_log.write([url, result["error"]])
+                if result.get("partial_etag") or result.get("partial_last_modified"):
+                    entry = state.setdefault(url, {"filename": filename})
+                    entry["partial_etag"] = result.get("partial_etag")
+                    entry["partial_last_modified"] = result.get("partial_last_modified")
+
+            # Same stop condition as the notebook, applied to work not yet started
+            if time.time() - start_time > max_runtime:
+                print(f"Maximum runtime of {max_runtime / 60:.1f} minutes reached. Stopping.")
+                for pending in futures:
+                    pending.cancel()
+                max_runtime = float("inf")
+
+    if store is None:
+        save_state(output_dir, state)
+
+    runtime_minutes = (time.time() - start_time) / 60
+    summary_log = os.path.join(logs_dir, f"download_summary_{timestamp}.csv")
+    with open(summary_log, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Metric', 'Count'])
+        writer.writerow(['Successful Downloads', counts["downloaded"]])
+        writer.writerow(['Not Modified', counts["not_modified"]])
+        writer.writerow(['Skipped Duplicates', counts["duplicates"]])
+        writer.writerow(['Non-PDF Links', counts["non_pdf"]])
+        writer.writerow(['Errors', counts["errors"]])
+        if store is not None:
+            writer.writerow(['Known URLs', counts["known"]])
+            writer.writerow(['Mirrors Skipped by Probe', counts["probe_duplicates"]])
+            writer.writerow(['Downloaded Duplicates', counts["deduplicated"]])
+        writer.writerow(['Runtime (minutes)', f"{runtime_minutes:.1f}"])
+
+    print(f"Downloaded {counts['downloaded']} PDFs ({counts['not_modified']} unchanged).")
+    print(f"Skipped {counts['duplicates']} duplicate links.")
+    if store is not None:
+        print(f"Store: {counts['known']} known URLs skipped, {counts['probe_duplicates']} mirrors skipped by probe, "
+              f"{counts['deduplicated']} downloaded duplicates discarded.")
+    print(f"Disregarded {counts['non_pdf']} non-PDF links, {counts['errors']} errors.")
+    print(f"Total runtime: {runtime_minutes:.1f} minutes")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the guideline PDFs listed in a CSV.")
+    parser.add_argument("--csv", default="combined_data.csv", help="CSV with a 'link' column")
+    parser.add_argument("--output-dir", default="pdfs")
+    parser.add_argument("--logs-dir", default="logs")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument("--pdf-store", default=None,
+                        help="Keep each distinct PDF once in this content-addressed store, linked into --output-dir")
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+
+    store = PdfStore(args.pdf_store) if args.pdf_store else None
+    with tracing.run_from_args(args, "download"):
+        download_all(read_links(args.csv), args.output_dir, args.logs_dir,
+                     workers=args.workers, timeout=args.timeout, store=store)
+
+
+if __name__ == "__main__":
+    main()
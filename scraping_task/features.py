@@ -0,0 +1,165 @@
+"""
+Shared feature extraction for the chart classifiers.
+
+5.ipynb (is_likely_plot, has_light_background) and 5_5.ipynb
+(is_chart_background, has_chart_elements) each converted the candidate to
+cv2/grayscale/HSV and ran their own Canny and Hough passes. Here every
+candidate is (optionally) downscaled once, converted to grayscale once, its
+border strips converted to HSV once, and a single Canny + Hough pass feeds
+all of the features. The per-image work
+produces one row of a feature matrix; the decisions are then made for the
+whole batch at once with NumPy.
+
+Line lengths, border widths and Hough thresholds are scaled with the image
+so the features mean roughly the same thing whatever the downscale factor.
+The thresholds were tuned on full-size images, though: downscaled zoom-8
+crops report more axis lines on some bar charts (05_2023.pdf), so callers
+that need counts comparable with Reference.csv pass max_side=None.
+"""
+import cv2
+import numpy as np
+
+FEATURE_NAMES = (
+    "edge_ratio",        # fraction of Canny edge pixels
+    "unique_colors",     # distinct colours after 3-bit quantisation of a 100x100 thumbnail
+    "num_lines",         # Hough segments of any orientation (is_likely_plot)
+    "horiz_lines",       # long horizontal segments (has_chart_elements)
+    "vert_lines",        # long vertical segments (has_chart_elements)
+    "border_v",          # mean HSV brightness of a 10 px border
+    "border_s",          # mean HSV saturation of the border
+    "border_hue_std",    # hue spread of the border
+    "border_dark",       # fraction of border pixels with V < 100
+    "edge_light",        # fraction of 1 px edge pixels with mean RGB > 200
+    "scale",             # downscale factor applied before analysis
+)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+# Largest side analysed; embedded 535x369 plots are never downscaled
+DEFAULT_MAX_SIDE = 1024
+
+# is_likely_plot's score bins: 3, 2 or 1 point above each threshold
+EDGE_RATIO_BINS = (0.1, 0.05, 0.02)
+COLOR_BINS = (100, 300, 700)    # fewer unique colours score higher
+LINE_BINS = (20, 10, 5)
+
+
+def _to_bgr(image):
+    """Accept a BGR ndarray or a PIL image (converted like 5.ipynb does)."""
+    if isinstance(image, np.ndarray):
+        return image
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def image_features(image, max_side=DEFAULT_MAX_SIDE):
+    """
+    Feature vector (ordered as FEATURE_NAMES) for one BGR or PIL image.
+
+    Images larger than `max_side` are analysed on a downscaled copy; pass
+    None to always use full resolution.
+    """
+    img = _to_bgr(image)
+    height, width = img.shape[:2]
+
+    # One downscaled copy for everything
+    scale = 1.0 if max_side is None else min(1.0, max_side / max(height, width))
+    if scale < 1.0:
+        img = cv2.resize(img, (max(1, int(width * scale)), max(1, int(height * scale))),
+                         interpolation=cv2.INTER_AREA)
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    edges = cv2.Canny(gray, 50, 150)
+    edge_ratio = np.count_nonzero(edges) / edges.size
+
+    thumb = cv2.resize(img, (100, 100))
+    quantised = (thumb.reshape(-1, 3) // 32).astype(np.int32)
+    unique_colors = np.unique(quantised[:, 0] * 64 + quantised[:, 1] * 8 + quantised[:, 2]).size
+
+    # A single Hough pass with the looser is_likely_plot settings; the long
+    # segments among its output stand in for has_chart_elements' stricter pass
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=max(10, int(80 * scale)),
+                            minLineLength=max(5, int(50 * scale)), maxLineGap=max(2, int(10 * scale)))
+    if lines is None:
+        num_lines = horiz_lines = vert_lines = 0
+    else:
+        segs = lines.reshape(-1, 4).astype(np.float64)
+        dx = segs[:, 2] - segs[:, 0]
+        dy = segs[:, 3] - segs[:, 1]
+        angle = np.abs(np.degrees(np.arctan2(dy, dx)))
+        long_enough = np.hypot(dx, dy) >= 100 * scale
+        num_lines = len(segs)
+        horiz_lines = np.count_nonzero(long_enough & ((angle < 10) | (angle > 170)))
+        vert_lines = np.count_nonzero(long_enough & (angle > 80) & (angle < 100))
+
+    # 10 px border (in original pixels); only these strips are converted to HSV
+    b = max(1, int(round(10 * scale)))
+    border_bgr = np.concatenate([img[:b].reshape(-1, 3), img[-b:].reshape(-1, 3),
+                                 img[:, :b].reshape(-1, 3), img[:, -b:].reshape(-1, 3)])
+    border = cv2.cvtColor(border_bgr.reshape(-1, 1, 3), cv2.COLOR_BGR2HSV).reshape(-1, 3)
+    border_v = border[:, 2].mean()
+    border_s = border[:, 1].mean()
+    border_hue_std = border[:, 0].std()
+    border_dark = np.mean(border[:, 2] < 100)
+
+    # 1 px outer edge brightness, as has_light_background measured it
+    outer = np.concatenate([img[0], img[-1], img[:, 0], img[:, -1]])
+    edge_light = np.mean(outer.mean(axis=1) > 200)
+
+    return np.array([edge_ratio, unique_colors, num_lines, horiz_lines, vert_lines,
+                     border_v, border_s, border_hue_std, border_dark, edge_light, scale])
+
+
+def extract_features(images, max_side=DEFAULT_MAX_SIDE):
+    """Feature matrix of shape (len(images), len(FEATURE_NAMES))."""
+    if not images:
+        return np.empty((0, len(FEATURE_NAMES)))
+    return np.vstack([image_features(image, max_side=max_side) for image in images])
+
+
+def column(features, name):
+    """One feature for every row of a feature matrix."""
+    return features[:, FEATURE_INDEX[name]]
+
+
+def plot_scores(features, edge_ratio_bins=EDGE_RATIO_BINS, color_bins=COLOR_BINS, line_bins=LINE_BINS):
+    """
+    is_likely_plot's 0-9 score for every row. The bins may hold (G, 1)
+    arrays to score G settings at once, giving a (G, rows) result.
+    """
+    edge_ratio = column(features, "edge_ratio")
+    unique_colors = column(features, "unique_colors")
+    num_lines = column(features, "num_lines")
+
+    edge_score = np.select([edge_ratio > b for b in edge_ratio_bins], [3, 2, 1], 0)
+    color_score = np.select([unique_colors < b for b in color_bins], [3, 2, 1], 0)
+    line_score = np.select([num_lines > b for b in line_bins], [3, 2, 1], 0)
+    return edge_score + color_score + line_score
+
+
+def is_likely_plot(features, min_score=5, **bins):
+    """At least `min_score` of 9 points, for every row."""
+    return plot_scores(features, **bins) >= min_score
+
+
+def has_light_background(features):
+    """At least 50% of the outer edge pixels are light-coloured."""
+    return column(features, "edge_light") > 0.5
+
+
+def background_flags(features, dark_fraction=0.6):
+    """
+    is_chart_background's decisions for every row, as a dict of boolean
+    arrays: is_light_bg, is_dark_bg and has_colored_bg.
+    """
+    border_v = column(features, "border_v")
+    border_s = column(features, "border_s")
+    return {
+        "is_light_bg": (border_v > 220) & (border_s < 30),
+        "is_dark_bg": column(features, "border_dark") > dark_fraction,
+        "has_colored_bg": (border_s > 50) & (column(features, "border_hue_std") < 20),
+    }
+
+
+def has_axis_lines(features, min_lines=3):
+    """has_chart_elements' decision: at least `min_lines` horizontal and vertical lines."""
+    return (column(features, "horiz_lines") >= min_lines) & (column(features, "vert_lines") >= min_lines)
@@ -0,0 +1,246 @@
+"""
+Index of the chart images in pdfs/Images, keyed by the PDF they came from.
+
+8.ipynb walked the whole Images directory once per row of df_7.csv to count
+a PDF's images, and matched every PDF basename against every file again to
+find PDFs without images; 4.py and 7.ipynb tried three glob patterns per
+PDF, the last of which listed the entire directory. Here the directory is
+scanned once, every file name is parsed into (PDF, plot number, title), and
+counts and lookups are dict operations.
+
+Names follow the extractors' <MM_YYYY>_plot_<N>_<title>.png scheme; the
+hand-saved "<MM_YYYY>_<anything>.png" and "<MM_YYYY>.png" files (and the
+"MM-YYYY" spelling 4.py's second glob looked for) are indexed under their
+PDF too, with no plot number. Matching is on the parsed prefix rather than
+a substring, so 1_2024.pdf no longer also counts the images of 11_2024.pdf.
+
+refresh() rescans only the directories whose mtime changed since the last
+scan, and add()/remove() keep the index current for callers that write or
+delete images themselves.
+
+Usage:
+    python -m scraping_task.image_catalogue --csv df_7.csv --output df_updated.csv
+"""
+import argparse
+import os
+import re
+
+import pandas as pd
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
+
+# <M>_<YYYY> or <M>-<YYYY>, then the extension, "_plot_<N>[_<title>]" or any other suffix
+_IMAGE_NAME = re.compile(
+    r"^(?P<month>\d{1,2})[_-](?P<year>\d{4})"
+    r"(?:_plot_(?P<plot>\d+)(?:_(?P<title>.*))?|(?P<rest>[_\-. ].*))?$"
+)
+_MANUALLY_DELETED = r"Manually deleted (\d+) images"
+
+
+def parse_image_name(filename):
+    """
+    (pdf_filename, plot_number, title) for an image file name, or None if
+    the name does not start with a PDF's MM_YYYY. plot_number and title are
+    None for names outside the _plot_<N> scheme.
+    """
+    stem, ext = os.path.splitext(os.path.basename(filename))
+    if ext.lower() not in IMAGE_EXTENSIONS:
+        return None
+    match = _IMAGE_NAME.match(stem)
+    if match is None:
+        return None
+    pdf_filename = f"{match['month']}_{match['year']}.pdf"
+    plot = int(match['plot']) if match['plot'] is not None else None
+    return pdf_filename, plot, match['title']
+
+
+class CatalogueImage:
+    """One indexed image file."""
+
+    __slots__ = ("path", "pdf_filename", "plot_number", "title")
+
+    def __init__(self, path, pdf_filename, plot_number=None, title=None):
+        self.path = path
+        self.pdf_filename = pdf_filename
+        self.plot_number = plot_number
+        self.title = title
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    def __repr__(self):
+        return f"CatalogueImage({self.name!r}, {self.pdf_filename!r})"
+
+
+class ImageCatalogue:
+    """Images under one directory (and its subdirectories), grouped by PDF."""
+
+    def __init__(self, image_dir, scan=True):
+        self.image_dir = image_dir
+        self._by_pdf = {}        # pdf_filename -> {path: CatalogueImage}
+        self._by_path = {}       # path -> CatalogueImage
+        self._dir_mtimes = {}    # directory -> mtime at its last scan
+        self.unmatched = set()   # image paths whose names carry no MM_YYYY
+        if scan:
+            self.scan()
+
+    def __len__(self):
+        return len(self._by_path)
+
+    def __contains__(self, pdf_filename):
+        return bool(self._by_pdf.get(pdf_filename))
+
+    def scan(self):
+        """Rebuild the index with one walk over the directory tree."""
+        self._by_pdf.clear()
+        self._by_path.clear()
+        self._dir_mtimes.clear()
+        self.unmatched.clear()
+        if os.path.isdir(self.image_dir):
+            self._scan_dir(self.image_dir)
+        return self
+
+    def _scan_dir(self, directory):
+        """Index the files of one directory and recurse into its subdirectories."""
+        try:
+            self._dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir():
+                self._scan_dir(entry.path)
+            elif entry.is_file():
+                self.add(entry.path)
+
+    def refresh(self):
+        """
+        Pick up images added or deleted by other processes. Only directories
+        whose mtime changed are listed again; returns the number of them.
+        """
+        changed = []
+        for directory, mtime in list(self._dir_mtimes.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime:
+                changed.append(directory)
+
+        for directory in changed:
+            # Drop the directory's own files (not its subdirectories'), then list it again
+            for path in [p for p in self._by_path if os.path.dirname(p) == directory]:
+                self.remove(path)
+            self.unmatched = {p for p in self.unmatched if os.path.dirname(p) != directory}
+            del self._dir_mtimes[directory]
+            if os.path.isdir(directory):
+                self._scan_dir(directory)
+        return len(changed)
+
+    def add(self, path):
+        """Index one image file; returns its CatalogueImage, or None if it is not a PDF's image."""
+        if os.path.splitext(path)[1].lower() not in IMAGE_EXTENSIONS:
+            return None
+        parsed = parse_image_name(path)
+        if parsed is None:
+            self.unmatched.add(path)
+            return None
+        image = CatalogueImage(path, *parsed)
+        self._by_path[path] = image
+        self._by_pdf.setdefault(image.pdf_filename, {})[path] = image
+        return image
+
+    def remove(self, path):
+        """Forget one image file (e.g. after deleting it)."""
+        self.unmatched.discard(path)
+        image = self._by_path.pop(path, None)
+        if image is not None:
+            images = self._by_pdf[image.pdf_filename]
+            del images[path]
+            if not images:
+                del self._by_pdf[image.pdf_filename]
+        return image
+
+    def images_for(self, pdf_filename):
+        """Images of one PDF, ordered by plot number and then name."""
+        images = self._by_pdf.get(os.path.basename(pdf_filename), {}).values()
+        return sorted(images, key=lambda image: (image.plot_number is None, image.plot_number or 0, image.name))
+
+    def count(self, pdf_filename):
+        return len(self._by_pdf.get(os.path.basename(pdf_filename), ()))
+
+    def counts(self):
+        """{pdf_filename: number of images} for every PDF with at least one image."""
+        return {pdf_filename: len(images) for pdf_filename, images in self._by_pdf.items()}
+
+    def pdfs(self):
+        return sorted(self._by_pdf)
+
+    def pdfs_without_images(self, pdf_filenames):
+        """The PDFs (from a df column or any iterable) that have no indexed image."""
+        return [f for f in pdf_filenames if isinstance(f, str) and not self.count(f)]
+
+
+def manually_deleted(notes):
+    """The "Manually deleted N images" counts in a note column (0 where absent)."""
+    return notes.astype("string").str.extract(_MANUALLY_DELETED, expand=False).fillna("0").astype(int)
+
+
+def reconcile(df, catalogue, add_notes=True):
+    """
+    8.ipynb's reconciliation on a copy of `df` (df_7.csv's schema):
+    image_count is the images on disk plus the ones the notes say were
+    deleted by hand, difference is image_count - accepted_images_count, and
+    a positive difference is recorded as "manually added N images".
+    """
+    df = df.copy()
+    if 'note' not in df.columns:
+        df['note'] = pd.NA
+    if 'accepted_images_count' not in df.columns:
+        df['accepted_images_count'] = 0
+
+    counts = catalogue.counts()
+    on_disk = df['pdf_filename'].map(lambda f: counts.get(os.path.basename(f), 0) if isinstance(f, str) else 0)
+    df['image_count'] = on_disk + manually_deleted(df['note'])
+    df['difference'] = df['image_count'] - df['accepted_images_count']
+
+    if add_notes:
+        added = df['difference'] > 0
+        message = "manually added " + df.loc[added, 'difference'].astype(int).astype(str) + " images"
+        existing = df.loc[added, 'note']
+        has_note = existing.notna() & (existing.astype("string") != "")
+        df.loc[added, 'note'] = message.where(~has_note, existing.astype(str) + "; " + message)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count each PDF's images and reconcile them with a catalogue CSV.")
+    parser.add_argument("--image-dir", default=os.path.join("pdfs", "Images"))
+    parser.add_argument("--csv", default="df_7.csv", help="CSV with pdf_filename, accepted_images_count and note")
+    parser.add_argument("--output", default=None, help="Write the reconciled CSV here (8.ipynb wrote df_updated.csv)")
+    parser.add_argument("--no-notes", action="store_true", help="Do not append 'manually added N images' notes")
+    args = parser.parse_args()
+
+    catalogue = ImageCatalogue(args.image_dir)
+    print(f"Indexed {len(catalogue)} images for {len(catalogue.pdfs())} PDFs in {args.image_dir}")
+    for path in sorted(catalogue.unmatched):
+        print(f"Not attributable to a PDF: {path}")
+
+    df = pd.read_csv(args.csv)
+    missing = catalogue.pdfs_without_images(df['pdf_filename'])
+    print(f"{len(missing)} PDFs with no matching images" + (": " + ", ".join(missing) if missing else ""))
+
+    df = reconcile(df, catalogue, add_notes=not args.no_notes)
+    mismatched = df[df['difference'] != 0]
+    print(f"{len(mismatched)} PDFs whose image count differs from accepted_images_count")
+    for _, row in mismatched.iterrows():
+        print(f"  {row['pdf_filename']}: {row['image_count']} images, {row['accepted_images_count']} accepted")
+
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"Reconciled CSV saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
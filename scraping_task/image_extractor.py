@@ -0,0 +1,281 @@
+"""
+Embedded-image chart extraction, packaged from 5.ipynb.
+
+Instead of rendering pages, this variant pulls the raster images embedded in
+the PDF with doc.extract_image(xref), filters them by size and content, and
+names them after the nearest title above their placement on the page. Like
+chart_extractor.py it returns (filename, bytes) pairs instead of writing.
+"""
+import io
+import os
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from scraping_task import features, tracing
+from scraping_task.chart_extractor import clean_title_for_filename, find_chart_title
+from scraping_task.text_index import PageTextIndex
+
+# Filter settings used by 5.ipynb when it produced pdf_image_data.csv
+DEFAULT_PARAMS = {
+    "target_width": 535,
+    "target_height": 369,
+    "min_size": 200,
+    "min_aspect_ratio": 0.5,
+    "max_aspect_ratio": 2.5,
+    "size_tolerance": 0.3,
+    "aspect_tolerance": 0.25,
+    "min_plot_score": 5,
+    # Score images at full size, as 5.ipynb did: the thresholds were tuned on
+    # full-size images and downscaled ones can score differently
+    "feature_max_side": None,
+    # is_likely_plot's score bins (3, 2, 1 points)
+    "edge_ratio_bins": features.EDGE_RATIO_BINS,
+    "color_bins": features.COLOR_BINS,
+    "line_bins": features.LINE_BINS,
+    "skip_first_page": True,
+    # 4.ipynb used the shape filter alone, kept every page and named images without titles
+    "analyse_content": True,
+    "find_titles": True,
+}
+
+# Settings reproducing 4.ipynb's shape-only extraction
+SHAPE_ONLY_PARAMS = {"analyse_content": False, "find_titles": False, "skip_first_page": False}
+
+
+def _score_bins(params):
+    return {name: params[name] for name in ("edge_ratio_bins", "color_bins", "line_bins")}
+
+
+def is_likely_plot(image, params=None, verbose=False):
+    """Analyze image content to determine if it's likely a plot/chart rather than a photograph."""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    feats = features.extract_features([image], max_side=params["feature_max_side"])
+    if verbose:
+        print(f"Edge ratio: {features.column(feats, 'edge_ratio')[0]:.3f}, "
+              f"Unique colors: {int(features.column(feats, 'unique_colors')[0])}, "
+              f"Straight lines: {int(features.column(feats, 'num_lines')[0])}")
+        print(f"Plot score: {features.plot_scores(feats, **_score_bins(params))[0]}/9")
+    return bool(features.is_likely_plot(feats, params["min_plot_score"], **_score_bins(params))[0])
+
+
+def has_light_background(image, params=None):
+    """Check if image has a light background (not necessarily pure white)."""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    feats = features.extract_features([image], max_side=params["feature_max_side"])
+    return bool(features.has_light_background(feats)[0])
+
+
+def passes_shape_filter(width, height, params=None):
+    """
+    Size and aspect ratio checks from 5.ipynb.
+
+    Returns (accepted, reason) where reason explains a rejection.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    target_width = params["target_width"]
+    target_height = params["target_height"]
+    target_aspect_ratio = target_width / target_height  # ≈ 1.45
+    aspect_ratio = width / height
+
+    if width < params["min_size"] or height < params["min_size"]:
+        return False, f"Dimensions {width}x{height} too small"
+
+    if aspect_ratio < params["min_aspect_ratio"] or aspect_ratio > params["max_aspect_ratio"]:
+        return False, f"Extreme aspect ratio {aspect_ratio:.2f}"
+
+    size_tol = params["size_tolerance"]
+    aspect_tol = params["aspect_tolerance"]
+    width_in_range = (1 - size_tol) * target_width <= width <= (1 + size_tol) * target_width
+    height_in_range = (1 - size_tol) * target_height <= height <= (1 + size_tol) * target_height
+    aspect_ratio_in_range = (1 - aspect_tol) * target_aspect_ratio <= aspect_ratio <= (1 + aspect_tol) * target_aspect_ratio
+    reasonable_size = 300 <= width <= 800 and 200 <= height <= 600
+
+    is_plot = (
+        (width_in_range and height_in_range) or
+        (aspect_ratio_in_range and reasonable_size) or
+        (0.8 <= aspect_ratio <= 2.0 and min(width, height) >= 250)
+    )
+    if not is_plot:
+        return False, f"Not a plot chart (dimensions: {width}x{height}, ratio: {aspect_ratio:.2f})"
+
+    return True, None
+
+
+def candidate_mask(candidates, feats, params):
+    """
+    passes_shape_filter and the content check for arrays of embedded
+    images (page, width, height) and their feature matrix, as one boolean
+    array. Params may be (G, 1) arrays, and each score bin a tuple of them,
+    to decide G settings at once (see tuning).
+    """
+    width, height = candidates["width"], candidates["height"]
+    target_width, target_height = params["target_width"], params["target_height"]
+    target_aspect_ratio = np.divide(target_width, target_height)
+    aspect_ratio = width / height
+    size_tol, aspect_tol = params["size_tolerance"], params["aspect_tolerance"]
+
+    width_in_range = ((1 - size_tol) * target_width <= width) & (width <= (1 + size_tol) * target_width)
+    height_in_range = ((1 - size_tol) * target_height <= height) & (height <= (1 + size_tol) * target_height)
+    aspect_ratio_in_range = (((1 - aspect_tol) * target_aspect_ratio <= aspect_ratio) &
+                             (aspect_ratio <= (1 + aspect_tol) * target_aspect_ratio))
+    reasonable_size = (300 <= width) & (width <= 800) & (200 <= height) & (height <= 600)
+    is_plot_shape = ((width_in_range & height_in_range) | (aspect_ratio_in_range & reasonable_size) |
+                     ((0.8 <= aspect_ratio) & (aspect_ratio <= 2.0) & (np.minimum(width, height) >= 250)))
+
+    passes_shape = ((width >= params["min_size"]) & (height >= params["min_size"]) &
+                    (aspect_ratio >= params["min_aspect_ratio"]) & (aspect_ratio <= params["max_aspect_ratio"]) &
+                    is_plot_shape)
+    is_plot = features.is_likely_plot(feats, params["min_plot_score"], **_score_bins(params))
+    return (passes_shape & ~(np.asarray(params["skip_first_page"]) & (candidates["page"] == 0)) &
+            (~np.asarray(params["analyse_content"]) | is_plot))
+
+
+def extract_page_images(page, params=None, verbose=False):
+    """
+    Pull the plot-like embedded images from a single page.
+
+    Returns a list of dicts (in the page's image order) with the cleaned title,
+    the original image bytes and extension, and whether it has a light
+    background.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    with tracing.span("page", pdf=os.path.basename(page.parent.name or "document"), page=page.number + 1):
+        return _page_images(page, params, verbose)
+
+
+def _page_images(page, params, verbose):
+    doc = page.parent
+
+    # Shape checks need only the header; decoded survivors are scored together
+    candidates = []
+    decoded = []
+    for img in page.get_images(full=True):
+        xref = img[0]
+        try:
+            with tracing.span("extract", xref=xref):
+                base_image = doc.extract_image(xref)
+                image = Image.open(io.BytesIO(base_image["image"]))
+                width, height = image.size
+            tracing.count("images")
+
+            ok, reason = passes_shape_filter(width, height, params)
+            if not ok:
+                tracing.count("rejected_shape")
+                if verbose:
+                    print(f"REJECTED: Image xref {xref} - {reason}")
+                continue
+
+            if params["analyse_content"]:
+                # Decoding happens here, on first access to the pixels
+                with tracing.span("classify", xref=xref):
+                    decoded.append(features.image_features(image, max_side=params["feature_max_side"]))
+            candidates.append({"xref": xref, "image": base_image["image"], "ext": base_image["ext"]})
+        except Exception as e:
+            print(f"Error processing image xref {xref} on page {page.number + 1}: {e}")
+
+    if not candidates:
+        return []
+
+    if not params["analyse_content"]:
+        for img_data in candidates:
+            img_data.update(has_light_bg=True, title="Unknown_Title", clean_title="Unknown_Title")
+        return candidates
+
+    feats = np.vstack(decoded)
+    is_plot = features.is_likely_plot(feats, params["min_plot_score"], **_score_bins(params))
+    # Light background is recorded in the filename but never rejects
+    light_bg = features.has_light_background(feats)
+
+    accepted = []
+    for i, img_data in enumerate(candidates):
+        if not is_plot[i]:
+            tracing.count("rejected_content")
+            if verbose:
+                print(f"REJECTED: Image xref {img_data['xref']} - Content analysis indicates this is not a plot chart")
+            continue
+        img_data["has_light_bg"] = bool(light_bg[i])
+        accepted.append(img_data)
+
+    if not accepted:
+        return []
+
+    tracing.count("charts", len(accepted))
+    with tracing.span("text_index"):
+        text_index = PageTextIndex.from_page(page) if params["find_titles"] else None
+    for img_data in accepted:
+        title = "Unknown Title"
+        with tracing.span("title", xref=img_data["xref"]):
+            img_rects = page.get_image_rects(img_data["xref"]) if text_index is not None else None
+            if img_rects:
+                # There might be multiple instances, use the first one
+                title, _ = find_chart_title(text_index, img_rects[0])
+        img_data["title"] = title
+        img_data["clean_title"] = clean_title_for_filename(title)
+        if verbose:
+            print(f"ACCEPTED: xref {img_data['xref']}, Title: {title}")
+
+    return accepted
+
+
+def extract_page_images_from_file(pdf_path, page_num, params=None, verbose=False):
+    """Open a PDF, extract the plot images of one page and close it again."""
+    doc = fitz.open(pdf_path)
+    try:
+        return extract_page_images(doc[page_num], params=params, verbose=verbose)
+    finally:
+        doc.close()
+
+
+def pages_to_process(page_count, params=None):
+    """Page indices the extractor looks at (the cover page is skipped by default)."""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    first = 1 if params["skip_first_page"] else 0
+    return list(range(first, page_count))
+
+
+def image_filename(pdf_file, image_number, clean_title, ext, has_light_bg=True):
+    """Build the MM_YYYY_plot_N_<title>.<ext> name, flagging dark backgrounds."""
+    if clean_title == "Unknown_Title" or not clean_title:
+        filename = f"{pdf_file.split('.')[0]}_plot_{image_number}.{ext}"
+    else:
+        filename = f"{pdf_file.split('.')[0]}_plot_{image_number}_{clean_title}.{ext}"
+
+    if not has_light_bg:
+        base, extension = os.path.splitext(filename)
+        filename = f"{base}_DARK_BG{extension}"
+    return filename
+
+
+def name_page_images(pdf_file, page_results):
+    """
+    Assign the per-PDF plot numbers to page results.
+
+    `page_results` must be in page order. Returns a list of
+    (image_filename, image_bytes) tuples.
+    """
+    named = []
+    for images in page_results:
+        for img_data in images:
+            filename = image_filename(pdf_file, len(named) + 1, img_data["clean_title"],
+                                      img_data["ext"], img_data["has_light_bg"])
+            named.append((filename, img_data["image"]))
+    return named
+
+
+def extract_images_from_pdf(pdf_path, params=None, verbose=False):
+    """
+    Extract the plot-like embedded images of every page of a PDF.
+
+    Returns a list of (image_filename, image_bytes) tuples in the order the
+    notebook would have saved them.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        with tracing.span("pdf", pdf=os.path.basename(pdf_path), pages=len(doc)):
+            page_results = [extract_page_images(doc[page_num], params=params, verbose=verbose)
+                            for page_num in pages_to_process(len(doc), params)]
+    finally:
+        doc.close()
+    return name_page_images(os.path.basename(pdf_path), page_results)
@@ -0,0 +1,158 @@
+"""
+Background encoding and writing of extracted chart images.
+
+The extractors used to PNG-encode every zoom-8 crop inline, and the batch
+runners then wrote the files from their main loop, so encoding and disk I/O
+queued up behind detection. An ImageWriter runs both on a small thread pool
+(cv2.imencode and file writes release the GIL) with a bounded number of
+jobs in flight, so a slow disk or a heavy encoder holds back the producer
+instead of piling crops up in memory.
+
+Output format is selectable:
+    png    lossless; png_compression 0-9 (None keeps OpenCV's default, which
+           is what the notebooks wrote)
+    webp   quality 1-100, or 101 for lossless
+    jpeg   quality 1-100
+and crops can be downscaled so their longer side is at most max_side.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from scraping_task import tracing
+
+EXTENSIONS = {"png": "png", "webp": "webp", "jpeg": "jpg"}
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 8
+
+
+def encode_image(img, image_format="png", png_compression=None, quality=90, max_side=None):
+    """Encode a BGR (or grey) image; returns the file bytes."""
+    if image_format not in EXTENSIONS:
+        raise ValueError(f"Unknown image format {image_format!r} (expected one of {sorted(EXTENSIONS)})")
+
+    height, width = img.shape[:2]
+    if max_side and max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        img = cv2.resize(img, (max(1, round(width * scale)), max(1, round(height * scale))),
+                         interpolation=cv2.INTER_AREA)
+
+    if image_format == "png":
+        flags = [] if png_compression is None else [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+    elif image_format == "webp":
+        flags = [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    else:
+        flags = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+
+    ok, buffer = cv2.imencode("." + EXTENSIONS[image_format], img, flags)
+    if not ok:
+        raise ValueError(f"Could not encode image as {image_format}")
+    return buffer.tobytes()
+
+
+def format_from_params(params):
+    """encode_image keyword arguments from an extractor's params dict."""
+    return {
+        "image_format": params.get("image_format", "png"),
+        "png_compression": params.get("png_compression"),
+        "quality": params.get("image_quality", 90),
+        "max_side": params.get("image_max_side"),
+    }
+
+
+class ImageWriter:
+    """
+    Thread pool that encodes images and writes files, at most `max_pending`
+    jobs at a time; submitting blocks while that many are in flight.
+    """
+
+    def __init__(self, output_dir=None, image_format="png", png_compression=None, quality=90, max_side=None,
+                 workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        self.output_dir = output_dir
+        self.encoding = {"image_format": image_format, "png_compression": png_compression, "quality": quality,
+                         "max_side": max_side}
+        self.extension = EXTENSIONS[image_format]
+        self.stats = {"encoded": 0, "written": 0, "bytes": 0, "encode_seconds": 0.0, "write_seconds": 0.0}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-writer")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._errors = []
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+    @classmethod
+    def from_params(cls, params, output_dir=None, **kwargs):
+        return cls(output_dir, **format_from_params(params), **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _submit(self, func, *args):
+        self._slots.acquire()
+        try:
+            # The job's spans belong to the span that queued it (e.g. the page)
+            future = self._executor.submit(func, tracing.current(), *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def _encode(self, parent, img):
+        started = time.perf_counter()
+        with tracing.span("encode", parent=parent):
+            data = encode_image(img, **self.encoding)
+        self._count(encoded=1, encode_seconds=time.perf_counter() - started)
+        return data
+
+    def _write(self, parent, filename, data):
+        started = time.perf_counter()
+        try:
+            if not isinstance(data, (bytes, bytearray)):
+                data = self._encode(parent, data)
+            with tracing.span("write", parent=parent, file=filename):
+                with open(os.path.join(self.output_dir, filename), "wb") as f:
+                    f.write(data)
+        except Exception as e:
+            with self._lock:
+                self._errors.append((filename, e))
+            raise
+        self._count(written=1, bytes=len(data), write_seconds=time.perf_counter() - started)
+        tracing.count("bytes_written", len(data))
+        return filename
+
+    def encode(self, img):
+        """Future of the encoded bytes of a BGR image."""
+        return self._submit(self._encode, img)
+
+    def write(self, filename, data):
+        """
+        Future of writing `data` (encoded bytes, or a BGR image to encode
+        first) to output_dir/filename.
+        """
+        if not self.output_dir:
+            raise ValueError("This ImageWriter has no output directory")
+        return self._submit(self._write, filename, data)
+
+    def write_all(self, outputs):
+        """Queue (filename, bytes) pairs as produced by the extractors."""
+        return [self.write(filename, data) for filename, data in outputs]
+
+    def close(self):
+        """Wait for every queued job; raises OSError if any write failed."""
+        self._executor.shutdown(wait=True)
+        if self._errors:
+            failed = ", ".join(f"{filename} ({e})" for filename, e in self._errors[:5])
+            raise OSError(f"{len(self._errors)} image(s) could not be written: {failed}")
@@ -0,0 +1,156 @@
+"""
+Fixed-size chart capture below a known heading, packaged from 3.ipynb.
+
+extract_chart_near_text finds the first page with a text block containing
+one of the search texts (e.g. "Retail Selling Price") and renders a
+full-width strip from just above that block to a fixed distance below it.
+The text lookups go through a PdfTextIndex, so every page's text layer is
+read once however many search texts are tried. find_chart_region is the
+lookup alone, shared with the vector digitiser.
+
+With --raster-cache-dir (off by default) the strip is sliced out of the
+cached whole-page render instead of being rendered again, on the clipped
+render's pixel grid and PNG-encoded by PyMuPDF as well. The pixels can
+still differ slightly from 3.ipynb's clipped render where the strip cuts
+through an embedded image (a page background, a photo): MuPDF decodes
+only the part of the image a clip needs, which resamples it differently
+than a whole-page render does. In pdfs/pdfs 31 of the 74 strips are
+identical and the rest differ in at most 1.2% of their pixels; without
+the cache the output is 3.ipynb's.
+
+Usage:
+    python -m scraping_task.near_text --pdf-dir pdfs/pdfs --output-dir pdfs/Images
+"""
+import argparse
+import os
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from scraping_task import raster_cache, tracing
+from scraping_task.text_index import PdfTextIndex
+
+DEFAULT_SEARCH_TEXTS = ["Average Retail Selling Price", "Avg. Retail Selling Price"]
+
+
+def near_text_filename(pdf_file, search_text):
+    """Build the <MM_YYYY>_<text>_chart.png name used by 3.ipynb."""
+    pdf_filename = os.path.basename(pdf_file).split('.')[0]
+    return f"{pdf_filename}_{search_text.replace(' ', '_').replace('.', '')}_chart.png"
+
+
+def find_chart_region(doc, text_index, search_texts=DEFAULT_SEARCH_TEXTS, pixels_above=20, pixels_below=400):
+    """
+    The first page with a block containing one of `search_texts` (every
+    search text is tried on a page before moving on) and the full-width
+    strip 3.ipynb captured around it.
+
+    Returns (page_num, search_text, block, rect), or None.
+    """
+    for page_num in range(len(doc)):
+        page = doc[page_num]
+        for search_text in search_texts:
+            with tracing.span("text_search", page=page_num + 1):
+                target_block = text_index.page(page_num).find(search_text)
+            if target_block is None:
+                continue
+
+            # Full page width, fixed distance around the block's top edge
+            capture_rect = fitz.Rect(
+                0,
+                target_block.rect.y0 - pixels_above,
+                page.rect.width,
+                target_block.rect.y0 + pixels_below
+            ).intersect(page.rect)
+            return page_num, search_text, target_block, capture_rect
+    return None
+
+
+def extract_chart_near_text(pdf_path, search_texts=DEFAULT_SEARCH_TEXTS, pixels_above=20, pixels_below=400,
+                            zoom=2, verbose=False, raster_cache_dir=None):
+    """
+    Capture the region around the first block containing one of
+    `search_texts`, trying every search text on a page before moving on.
+
+    Returns (filename, png_bytes), or None if no page has any of the texts.
+    With `raster_cache_dir` the strip comes from the cached page render
+    (see the module docstring for how it can differ).
+    """
+    rasters = raster_cache.open_cache(raster_cache_dir) if raster_cache_dir else None
+    doc = fitz.open(pdf_path)
+    try:
+        region = find_chart_region(doc, PdfTextIndex(doc), search_texts, pixels_above, pixels_below)
+        if region is not None:
+            page_num, search_text, _, capture_rect = region
+            page = doc[page_num]
+            if verbose:
+                print(f"Found '{search_text}' on page {page_num+1}")
+
+            if rasters is not None:
+                # The clipped render's pixel grid, so the strip lines up with get_pixmap(clip=...)
+                box = (capture_rect * fitz.Matrix(zoom, zoom)).irect
+                with tracing.span("render", page=page_num + 1, zoom=zoom, cache=True):
+                    strip = rasters.page(page, zoom)[box.y0:box.y1, box.x0:box.x1]
+                with tracing.span("encode", page=page_num + 1):
+                    # PyMuPDF's PNG writer, as pix.tobytes("png") below
+                    rgb = np.ascontiguousarray(strip[:, :, ::-1])
+                    pix = fitz.Pixmap(fitz.csRGB, rgb.shape[1], rgb.shape[0], rgb.tobytes(), False)
+                    return near_text_filename(pdf_path, search_text), pix.tobytes("png")
+
+            with tracing.span("render", page=page_num + 1, zoom=zoom, clip=True):
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=capture_rect)
+            with tracing.span("encode", page=page_num + 1):
+                return near_text_filename(pdf_path, search_text), pix.tobytes("png")
+    finally:
+        doc.close()
+
+    if verbose:
+        print(f"Could not find a suitable chart associated with any of these texts: {search_texts}")
+    return None
+
+
+def capture_all(args):
+    """Capture and write the chart of every PDF in args.pdf_dir."""
+    search_texts = args.search_texts or ["Retail Selling Price"]
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    pdf_files = sorted(f for f in os.listdir(args.pdf_dir) if f.lower().endswith('.pdf'))
+    failed = []
+    for pdf_file in pdf_files:
+        with tracing.span("pdf", pdf=pdf_file):
+            result = extract_chart_near_text(os.path.join(args.pdf_dir, pdf_file), search_texts,
+                                             args.pixels_above, args.pixels_below,
+                                             raster_cache_dir=args.raster_cache_dir)
+        if result is None:
+            failed.append(pdf_file)
+            continue
+        filename, data = result
+        with tracing.span("write", pdf=pdf_file, file=filename):
+            with open(os.path.join(args.output_dir, filename), "wb") as f:
+                f.write(data)
+        print(f"- {pdf_file} → {filename}")
+
+    print(f"Successfully extracted charts from {len(pdf_files) - len(failed)} out of {len(pdf_files)} PDF files")
+    for pdf_file in failed:
+        print(f"Failed: {pdf_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture the chart below a heading in every PDF.")
+    parser.add_argument("--pdf-dir", default=os.path.join("pdfs", "pdfs"))
+    parser.add_argument("--output-dir", default=os.path.join("pdfs", "Images"))
+    parser.add_argument("--search-text", action="append", dest="search_texts",
+                        help="Text to look for (repeatable); 3.ipynb used 'Retail Selling Price'")
+    parser.add_argument("--pixels-above", type=int, default=20)
+    parser.add_argument("--pixels-below", type=int, default=300)
+    parser.add_argument("--raster-cache-dir", default=None,
+                        help="Reuse whole-page renders from this cache (pixels may differ slightly where the "
+                             "strip cuts through an embedded image)")
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+    with tracing.run_from_args(args, "near_text"):
+        capture_all(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Content-addressed store for the guideline PDFs.
+
+The same PDF arrives under several URLs (cdn2.hubspot.net links repeated
+across 2.4.csv and 2_2.csv, the discover.jdpa.com mirrors), copies sit in
+both pdfs/pdfs and backup_pdfs, and 2_5.ipynb's rename step silently skips
+a file whose MM_YYYY.pdf target already exists. Here every distinct PDF is
+stored once, as blobs/<sha[:2]>/<sha256>.pdf, and the MM_YYYY.pdf names the
+extractors read are hard links to the blob (copies where the filesystem
+cannot link). index.json maps each URL to the hash of what it served, with
+the size and ETag seen, and each blob to its names.
+
+fetch() decides per URL, cheapest first:
+    known       the URL was fetched before: no request at all
+    duplicate   a HEAD probe reports an ETag and size already stored, or a
+                size that matches exactly one stored PDF of the same
+                MM_YYYY name: linked without downloading the body
+    downloaded  new content, streamed to incoming/ and moved to a blob
+    deduplicated the body was downloaded but its hash was already stored
+    non_pdf / error as from downloader.download_pdf
+
+so storage and bandwidth grow with the number of distinct PDFs, not with
+the number of mirrors.
+
+Usage:
+    python -m scraping_task.pdf_store import pdfs/pdfs backup_pdfs --names-dir pdfs/pdfs \
+        --state pdfs/pdfs/download_state.json
+    python -m scraping_task.pdf_store status
+    python -m scraping_task.downloader --csv combined_data.csv --pdf-store .pdf_store
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import defaultdict
+
+from scraping_task import tracing
+from scraping_task.dates import canonical_pdf_name
+from scraping_task.result_cache import file_sha256
+
+DEFAULT_STORE_DIR = ".pdf_store"
+INDEX_FILENAME = "index.json"
+
+
+def _normalise_etag(etag):
+    """ETag without the weak prefix and quotes, so mirrors' headers compare equal."""
+    if not etag:
+        return None
+    etag = etag.strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    return etag.strip('"') or None
+
+
+def _link_or_copy(source, target):
+    """Hard link `target` to `source`, or copy where links are not possible; replaces atomically."""
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+def _month_name(filename):
+    """MM_YYYY.pdf for any of the guideline filename forms, else the name itself."""
+    return canonical_pdf_name(filename) or filename
+
+
+def _same_file(path, other):
+    try:
+        return os.path.samefile(path, other)
+    except OSError:
+        return False
+
+
+class PdfStore:
+    """Blobs by SHA-256, their names, and the URL -> hash map, under one directory."""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_FILENAME)
+        self.urls = {}   # url -> {"sha256", "size", "etag", "last_modified"}
+        self.blobs = {}  # sha256 -> {"size", "names": [paths]}
+        self._lock = threading.RLock()
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(root, "incoming"), exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            self.urls = index.get("urls", {})
+            self.blobs = index.get("blobs", {})
+        self._by_etag = {}
+        self._by_size = defaultdict(set)
+        for sha, blob in self.blobs.items():
+            self._by_size[blob["size"]].add(sha)
+        for entry in self.urls.values():
+            if entry.get("etag") and entry.get("sha256") in self.blobs:
+                self._by_etag[(entry["etag"], entry.get("size"))] = entry["sha256"]
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"urls": self.urls, "blobs": self.blobs}, f, indent=1)
+            os.replace(tmp_path, self.index_path)
+
+    def blob_path(self, sha):
+        return os.path.join(self.root, "blobs", sha[:2], f"{sha}.pdf")
+
+    # Blobs and names
+
+    def add_file(self, path, move=False, sha=None):
+        """
+        Store the PDF at `path`; returns (sha256, new). With `move` the file
+        is moved into the store (or dropped when already stored); otherwise
+        it stays where it is as another link to the blob.
+        """
+        sha = sha or file_sha256(path)
+        blob = self.blob_path(sha)
+        with self._lock:
+            new = sha not in self.blobs or not os.path.exists(blob)
+            if new:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                if move:
+                    os.replace(path, blob)
+                else:
+                    _link_or_copy(path, blob)
+                size = os.path.getsize(blob)
+                self.blobs[sha] = {"size": size, "names": self.blobs.get(sha, {}).get("names", [])}
+                self._by_size[size].add(sha)
+            elif move:
+                os.remove(path)
+        return sha, new
+
+    def add_name(self, sha, path):
+        """Make `path` a name of blob `sha`, replacing whatever file is there by a link to the blob."""
+        path = os.path.normpath(path)
+        with self._lock:
+            if not _same_file(path, self.blob_path(sha)):
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                _link_or_copy(self.blob_path(sha), path)
+            names = self.blobs[sha]["names"]
+            if path not in names:
+                names.append(path)
+
+    def name_in(self, sha, names_dir):
+        """The blob's existing filename in `names_dir`, or None."""
+        names_dir = os.path.abspath(names_dir)
+        for name in self.blobs[sha]["names"]:
+            if os.path.dirname(os.path.abspath(name)) == names_dir and os.path.exists(name):
+                return os.path.basename(name)
+        return None
+
+    def link_name(self, sha, names_dir, filename):
+        """
+        Give blob `sha` a name in `names_dir`, preferring `filename`, unless it
+        already has one there. A name held by different content gets a _1,
+        _2, ... suffix rather than being skipped. Returns (filename, created).
+        """
+        with self._lock:
+            existing = self.name_in(sha, names_dir)
+            if existing is not None:
+                return existing, False
+            base, extension = os.path.splitext(filename)
+            counter = 1
+            path = os.path.join(names_dir, filename)
+            while os.path.exists(path):
+                if _same_file(path, self.blob_path(sha)) or file_sha256(path) == sha:
+                    break
+                filename = f"{base}_{counter}{extension}"
+                path = os.path.join(names_dir, filename)
+                counter += 1
+            created = not os.path.exists(path)
+            self.add_name(sha, path)
+            return filename, created
+
+    # URLs
+
+    def record_url(self, url, sha, size=None, etag=None, last_modified=None):
+        with self._lock:
+            etag = _normalise_etag(etag)
+            self.urls[url] = {"sha256": sha, "size": size or self.blobs[sha]["size"], "etag": etag,
+                              "last_modified": last_modified}
+            if etag:
+                self._by_etag[(etag, self.urls[url]["size"])] = sha
+
+    def known(self, url):
+        """Hash stored for a URL fetched before, or None."""
+        entry = self.urls.get(url)
+        if entry is None or entry["sha256"] not in self.blobs or not os.path.exists(self.blob_path(entry["sha256"])):
+            return None
+        return entry["sha256"]
+
+    def likely_duplicate(self, size, etag, filename=None):
+        """
+        Hash of a stored PDF that a HEAD probe's size and ETag point to, or
+        None. An ETag must come with the same size; a size alone must match
+        exactly one stored PDF, which must already carry the same MM_YYYY name.
+        """
+        if size is None:
+            return None
+        etag = _normalise_etag(etag)
+        with self._lock:
+            if etag and (etag, size) in self._by_etag:
+                return self._by_etag[(etag, size)]
+            matches = self._by_size.get(size, ())
+            if len(matches) != 1 or filename is None:
+                return None
+            sha = next(iter(matches))
+            names = {_month_name(os.path.basename(name)) for name in self.blobs[sha]["names"]}
+            return sha if _month_name(filename) in names else None
+
+    def probe(self, session, url, timeout=30):
+        """(size, etag, last_modified) from a HEAD request; Nones if the server will not say."""
+        try:
+            with tracing.span("probe", url=url):
+                response = session.head(url, allow_redirects=True, timeout=timeout)
+            if response.status_code >= 400:
+                return None, None, None
+            length = response.headers.get("Content-Length")
+            size = int(length) if length and length.isdigit() else None
+            return size, response.headers.get("ETag"), response.headers.get("Last-Modified")
+        except Exception:
+            return None, None, None
+
+    def fetch(self, session, url, names_dir, filename, timeout=30, probe=True):
+        """
+        Make sure the PDF behind `url` is stored and named in `names_dir`
+        (as `filename` unless its content already has a name there).
+
+        Returns a dict with the "status" (see the module docstring), and for
+        stored PDFs the "sha256", the "filename" it has in names_dir and
+        whether that name was "created" by this call.
+        """
+        # Imported here: the downloader imports this module for its --pdf-store option
+        from scraping_task.downloader import download_pdf
+
+        sha = self.known(url)
+        status = "known"
+        if sha is None and probe:
+            size, etag, last_modified = self.probe(session, url, timeout)
+            sha = self.likely_duplicate(size, etag, filename)
+            if sha is not None:
+                status = "duplicate"
+                self.record_url(url, sha, size, etag, last_modified)
+
+        if sha is None:
+            # Named after the URL, so an interrupted download resumes on the next run
+            staging = os.path.join(self.root, "incoming", hashlib.sha1(url.encode("utf-8")).hexdigest() + ".pdf")
+            result = download_pdf(session, url, staging, timeout=timeout)
+            if result["status"] != "downloaded":
+                return result
+            size = os.path.getsize(staging)
+            sha, new = self.add_file(staging, move=True)
+            status = "downloaded" if new else "deduplicated"
+            self.record_url(url, sha, size, result.get("etag"), result.get("last_modified"))
+
+        name, created = self.link_name(sha, names_dir, filename)
+        self.save()
+        tracing.count(f"store_{status}")
+        return {"status": status, "sha256": sha, "filename": name, "created": created}
+
+    # Maintenance
+
+    def import_files(self, paths, names_dir=None):
+        """
+        Store existing PDFs, replacing each file by a link to its blob so
+        duplicate copies stop taking space. With `names_dir`, PDFs whose
+        filename has a MM_YYYY.pdf form (2_5.ipynb's rename) are also given
+        that name there. Returns {path: sha256}.
+        """
+        imported = {}
+        for path in paths:
+            sha, _ = self.add_file(path)
+            self.add_name(sha, path)
+            imported[path] = sha
+            canonical = canonical_pdf_name(os.path.basename(path))
+            if names_dir and canonical:
+                self.link_name(sha, names_dir, canonical)
+        self.save()
+        return imported
+
+    def import_state(self, state_path):
+        """URL -> hash entries from a downloader state file, for URLs whose file is present."""
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        pdf_dir = os.path.dirname(state_path)
+        added = 0
+        for url, entry in state.items():
+            path = os.path.join(pdf_dir, entry.get("filename") or "")
+            if not entry.get("filename") or not os.path.isfile(path):
+                continue
+            sha, _ = self.add_file(path)
+            self.add_name(sha, path)
+            self.record_url(url, sha, os.path.getsize(path), entry.get("etag"), entry.get("last_modified"))
+            added += 1
+        self.save()
+        return added
+
+    def summary(self):
+        stored = sum(blob["size"] for blob in self.blobs.values())
+        named = sum(blob["size"] * max(1, len(blob["names"])) for blob in self.blobs.values())
+        return {"pdfs": len(self.blobs), "urls": len(self.urls),
+                "names": sum(len(blob["names"]) for blob in self.blobs.values()),
+                "stored_mb": stored / 1024 ** 2, "saved_mb": (named - stored) / 1024 ** 2}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import PDFs into, or summarise, the content-addressed PDF store.")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Store existing PDFs and link duplicates to one copy")
+    import_parser.add_argument("dirs", nargs="+", help="Directories of PDFs")
+    import_parser.add_argument("--names-dir", default=None,
+                               help="Also give each PDF its MM_YYYY.pdf name here (2_5.ipynb's rename)")
+    import_parser.add_argument("--state", action="append", default=[],
+                               help="Downloader state file whose URLs to map (repeatable)")
+    subparsers.add_parser("status", help="Summarise the store")
+    args = parser.parse_args()
+
+    store = PdfStore(args.store_dir)
+    if args.command == "import":
+        paths = [os.path.join(directory, f) for directory in args.dirs
+                 for f in sorted(os.listdir(directory)) if f.lower().endswith(".pdf")]
+        imported = store.import_files(paths, args.names_dir)
+        print(f"Imported {len(imported)} files as {len(set(imported.values()))} distinct PDFs")
+        for state_path in args.state:
+            print(f"Mapped {store.import_state(state_path)} URLs from {state_path}")
+
+    summary = store.summary()
+    print(f"{summary['pdfs']} PDFs ({summary['stored_mb']:.1f} MB) under {summary['names']} names, "
+          f"{summary['urls']} URLs; {summary['saved_mb']:.1f} MB not duplicated")
+
+
+if __name__ == "__main__":
+    main()
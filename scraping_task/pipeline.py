@@ -0,0 +1,425 @@
+"""
+Streaming discover → download → extract → catalogue pipeline.
+
+The notebooks run each stage to completion and hand over through CSVs
+(combined_data.csv, the pdfs folder, pdf_image_data.csv). Here the stages
+run side by side, connected by bounded queues: a PDF is extracted as soon as
+its download finishes, and its charts are catalogued as soon as they are
+extracted. A full queue blocks the stage feeding it, so a slow stage holds
+back the ones before it instead of letting work pile up in memory.
+
+Stages:
+    discover   links from a CSV (combined_data.csv) or from 3.py's scraper
+    download   download_pdf on a thread pool, saved directly as MM_YYYY.pdf
+               (the names 2_5.ipynb renamed the downloads to); with
+               --pdf-store through the content-addressed store, so known
+               URLs and mirrors of stored PDFs are not downloaded or
+               extracted again
+    extract    batch_extract's worker on a process pool, behind the result cache
+    catalogue  single writer for the chart images (saved on an ImageWriter's
+               threads) and pdf_image_data.csv
+
+Every few seconds each stage's throughput and the backlog of its input
+queue are printed; the final numbers are returned by Pipeline.run.
+
+Usage:
+    python -m scraping_task.pipeline --links-csv combined_data.csv
+    python -m scraping_task.pipeline --discover guidelines --extract-workers 4
+"""
+import argparse
+import csv
+import datetime
+import importlib.util
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+from scraping_task import batch_extract, downloader, tracing
+from scraping_task.catalogue_store import CatalogueStore
+from scraping_task.dates import canonical_pdf_name
+from scraping_task.image_writer import ImageWriter
+from scraping_task.pdf_store import PdfStore
+from scraping_task.result_cache import DEFAULT_MAX_BYTES, ResultCache
+
+# End-of-input marker passed down each queue
+_DONE = object()
+
+
+def pdf_name_for_url(url, index):
+    """Filename for a link: the canonical MM_YYYY.pdf if possible, else the downloader's name."""
+    filename = unquote(os.path.basename(urlparse(url).path))
+    return canonical_pdf_name(filename) or downloader._filename_for(url, index)
+
+
+def links_from_csv(csv_path, column="link"):
+    """Links from a CSV such as combined_data.csv."""
+    return downloader.read_links(csv_path, column=column)
+
+
+def links_from_guidelines_page():
+    """Links found by 3.py's scrape_jdpower_guidelines, loaded from the script."""
+    spec = importlib.util.spec_from_file_location("guidelines_scraper", "3.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return [row["link"] for row in module.scrape_jdpower_guidelines()]
+
+
+class StageStats:
+    """Counters for one stage, updated from its worker threads."""
+
+    def __init__(self, name, input_queue=None):
+        self.name = name
+        self.input_queue = input_queue
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_backlog = 0
+        self.first_started = None
+        self.last_finished = None
+        self._lock = threading.Lock()
+
+    def record(self, started, ok=True):
+        finished = time.time()
+        with self._lock:
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self.busy_seconds += finished - started
+            if self.first_started is None or started < self.first_started:
+                self.first_started = started
+            self.last_finished = finished
+
+    def backlog(self):
+        """Items waiting in this stage's input queue."""
+        if self.input_queue is None:
+            return 0
+        backlog = self.input_queue.qsize()
+        with self._lock:
+            self.max_backlog = max(self.max_backlog, backlog)
+        return backlog
+
+    def throughput(self):
+        """Items per second since the stage started working."""
+        if self.first_started is None:
+            return 0.0
+        elapsed = max((self.last_finished or time.time()) - self.first_started, 1e-9)
+        return self.processed / elapsed
+
+    def summary(self):
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "per_second": round(self.throughput(), 3),
+            "busy_seconds": round(self.busy_seconds, 1),
+            "backlog": self.backlog(),
+            "max_backlog": self.max_backlog,
+        }
+
+
+class Pipeline:
+    """Run discover → download → extract → catalogue over a set of links."""
+
+    def __init__(self, pdf_dir, output_dir, csv_path, download_workers=4, extract_workers=None,
+                 queue_size=8, extractor="charts", params=None, cache_dir=batch_extract.DEFAULT_CACHE_DIR,
+                 cache_max_bytes=DEFAULT_MAX_BYTES, timeout=30, report_every=10, store_path=None, pdf_store=None):
+        self.pdf_dir = pdf_dir
+        self.output_dir = output_dir
+        self.csv_path = csv_path
+        self.store_path = store_path
+        self.pdf_store = pdf_store
+        self.download_workers = download_workers
+        self.extract_workers = extract_workers or os.cpu_count() or 1
+        self.extractor = extractor
+        self.params = {**batch_extract.EXTRACTORS[extractor]["defaults"], **(params or {})}
+        self.cache = ResultCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir else None
+        self.timeout = timeout
+        self.report_every = report_every
+
+        self.download_queue = queue.Queue(maxsize=queue_size)
+        self.extract_queue = queue.Queue(maxsize=queue_size)
+        self.catalogue_queue = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            "discover": StageStats("discover"),
+            "download": StageStats("download", self.download_queue),
+            "extract": StageStats("extract", self.extract_queue),
+            "catalogue": StageStats("catalogue", self.catalogue_queue),
+        }
+
+        self._state = {}
+        self._state_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def _put(self, q, item, stage):
+        q.put(item)
+        self.stats[stage].backlog()
+
+    def _finish_stage(self, remaining, lock, q, sentinels):
+        """Called by each worker as it exits; the last one closes the next queue."""
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(sentinels):
+                q.put(_DONE)
+
+    # Stage 1: discover
+
+    def _discover(self, links):
+        seen = set()
+        taken = {entry["filename"] for entry in self._state.values() if entry.get("filename")}
+        try:
+            for index, url in enumerate(links):
+                started = time.time()
+                if url in seen:
+                    continue
+                seen.add(url)
+                known = self._state.get(url, {})
+                filename = known.get("filename")
+                if self.pdf_store is not None:
+                    # The store names the file; mirrors of one month share a name
+                    filename = pdf_name_for_url(url, index)
+                elif not filename:
+                    filename = pdf_name_for_url(url, index)
+                    # Two links for the same month keep the downloader's _1, _2 suffixes
+                    if filename in taken:
+                        filename = downloader._unique_filename(self.pdf_dir, filename, taken)
+                    taken.add(filename)
+                self._put(self.download_queue, (url, filename, known), "download")
+                self.stats["discover"].record(started)
+        finally:
+            for _ in range(self.download_workers):
+                self.download_queue.put(_DONE)
+
+    # Stage 2: download
+
+    def _download_worker(self, session, remaining, lock):
+        try:
+            while True:
+                item = self.download_queue.get()
+                if item is _DONE:
+                    return
+                url, filename, known = item
+                started = time.time()
+                output_path = os.path.join(self.pdf_dir, filename)
+
+                if self.pdf_store is not None:
+                    result = self.pdf_store.fetch(session, url, self.pdf_dir, filename, self.timeout)
+                    ok = result["status"] in ("known", "duplicate", "downloaded", "deduplicated")
+                    self.stats["download"].record(started, ok=ok)
+                    if not ok:
+                        print(f"Download {result['status']} for {url}: "
+                              f"{result.get('error') or result.get('content_type')}")
+                    elif result["created"]:
+                        # Content already named here was extracted under that name
+                        self._put(self.extract_queue, result["filename"], "extract")
+                    continue
+
+                if not known and os.path.exists(output_path):
+                    # Already in the archive from an earlier (notebook) download
+                    self.stats["download"].record(started)
+                    self._put(self.extract_queue, filename, "extract")
+                    continue
+
+                result = downloader.download_pdf(session, url, output_path, known, self.timeout)
+                status = result["status"]
+                if status == "downloaded":
+                    with self._state_lock:
+                        self._state[url] = {"filename": filename, "etag": result["etag"],
+                                            "last_modified": result["last_modified"]}
+                if status in ("downloaded", "not_modified"):
+                    self.stats["download"].record(started)
+                    self._put(self.extract_queue, filename, "extract")
+                else:
+                    self.stats["download"].record(started, ok=False)
+                    print(f"Download {status} for {url}: {result.get('error') or result.get('content_type')}")
+        finally:
+            self._finish_stage(remaining, lock, self.extract_queue, self.extract_workers)
+
+    # Stage 3: extract
+
+    def _extract_worker(self, pool, remaining, lock):
+        try:
+            while True:
+                pdf_file = self.extract_queue.get()
+                if pdf_file is _DONE:
+                    return
+                started = time.time()
+                pdf_path = os.path.join(self.pdf_dir, pdf_file)
+
+                key = cached = None
+                if self.cache is not None:
+                    with self._cache_lock, tracing.span("cache_lookup", pdf=pdf_file):
+                        key = self.cache.key_for(pdf_path, self.extractor, self.params)
+                        cached = self.cache.get(key, pdf_file)
+                if cached is not None:
+                    self.stats["extract"].record(started)
+                    self._put(self.catalogue_queue, (pdf_file, cached, "cached", None), "catalogue")
+                    continue
+
+                _, outputs, error = pool.apply(batch_extract._process_pdf,
+                                               ((self.extractor, self.pdf_dir, pdf_file, self.params),))
+                if error is not None:
+                    self.stats["extract"].record(started, ok=False)
+                    print(f"Error processing PDF {pdf_file}: {error}")
+                    continue
+                self.stats["extract"].record(started)
+                self._put(self.catalogue_queue, (pdf_file, outputs, "extracted", key), "catalogue")
+        finally:
+            self._finish_stage(remaining, lock, self.catalogue_queue, 1)
+
+    # Stage 4: catalogue
+
+    def _catalogue(self):
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        store = image_writer = None
+        try:
+            csv_exists = os.path.isfile(self.csv_path)
+            # SQLite connections belong to the thread that opened them
+            store = CatalogueStore(self.store_path) if self.store_path else None
+            image_writer = ImageWriter(self.output_dir)
+            with open(self.csv_path, 'a', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=batch_extract.CSV_FIELDNAMES)
+                if not csv_exists:
+                    writer.writeheader()
+
+                while True:
+                    item = self.catalogue_queue.get()
+                    if item is _DONE:
+                        return
+                    pdf_file, outputs, source, key = item
+                    started = time.time()
+                    try:
+                        with tracing.span("catalogue", pdf=pdf_file):
+                            # Record the PDF only once its charts are on disk
+                            for future in image_writer.write_all(outputs):
+                                future.result()
+                            writer.writerow({
+                                'date_extracted': timestamp,
+                                'pdf_filename': pdf_file,
+                                'accepted_images_count': len(outputs)
+                            })
+                            csvfile.flush()
+                            if store is not None:
+                                store.record_extraction(pdf_file, len(outputs), timestamp)
+                            if key is not None:
+                                with self._cache_lock:
+                                    self.cache.put(key, pdf_file, outputs)
+                                    self.cache.save()
+                        self.stats["catalogue"].record(started)
+                        print(f"{pdf_file}: {len(outputs)} charts saved ({source})")
+                    except Exception as e:
+                        # One bad PDF (a full disk, a locked store) must not stop the stage
+                        self.stats["catalogue"].record(started, ok=False)
+                        print(f"Error cataloguing {pdf_file}: {e}")
+        except Exception as e:
+            print(f"Catalogue stage failed: {e}")
+            # Keep draining, or the extract workers block on the full queue forever
+            self._drain_catalogue()
+        finally:
+            if image_writer is not None:
+                try:
+                    image_writer.close()
+                except OSError:
+                    pass  # every failed write was reported with its PDF, which was not recorded
+            if store is not None:
+                store.close()
+
+    def _drain_catalogue(self):
+        """Take the remaining items off the catalogue queue as failures, up to the end marker."""
+        while True:
+            item = self.catalogue_queue.get()
+            if item is _DONE:
+                return
+            self.stats["catalogue"].record(time.time(), ok=False)
+            print(f"Not catalogued: {item[0]}")
+
+    def _report(self):
+        while not self._finished.wait(self.report_every):
+            print(self.format_stats())
+
+    def format_stats(self):
+        return " | ".join(f"{name}: {s.processed} done ({s.throughput():.2f}/s), {s.backlog()} waiting"
+                          for name, s in self.stats.items())
+
+    def run(self, links):
+        """
+        Push `links` through every stage and wait until the last chart is
+        catalogued. Returns each stage's summary.
+        """
+        os.makedirs(self.pdf_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._state = downloader.load_state(self.pdf_dir)
+        session = downloader.make_session(pool_size=self.download_workers)
+        started = time.time()
+
+        lock = threading.Lock()
+        downloads_left = [self.download_workers]
+        extracts_left = [self.extract_workers]
+
+        with multiprocessing.Pool(processes=self.extract_workers) as pool:
+            threads = [threading.Thread(target=self._discover, args=(links,), name="discover")]
+            threads += [threading.Thread(target=self._download_worker, args=(session, downloads_left, lock),
+                                         name=f"download-{i}") for i in range(self.download_workers)]
+            threads += [threading.Thread(target=self._extract_worker, args=(pool, extracts_left, lock),
+                                         name=f"extract-{i}") for i in range(self.extract_workers)]
+            threads.append(threading.Thread(target=self._catalogue, name="catalogue"))
+            reporter = threading.Thread(target=self._report, name="report", daemon=True)
+
+            for thread in threads:
+                thread.start()
+            reporter.start()
+            for thread in threads:
+                thread.join()
+            self._finished.set()
+
+        downloader.save_state(self.pdf_dir, self._state)
+        if self.cache is not None:
+            self.cache.save()
+        session.close()
+
+        summary = {name: s.summary() for name, s in self.stats.items()}
+        summary["total_seconds"] = round(time.time() - started, 1)
+        print(self.format_stats())
+        print(f"Pipeline finished in {summary['total_seconds']}s")
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download and extract guideline PDFs as a streaming pipeline.")
+    parser.add_argument("--discover", choices=["csv", "guidelines"], default="csv",
+                        help="csv: links from --links-csv, guidelines: scrape the industry-guidelines page (3.py)")
+    parser.add_argument("--links-csv", default="combined_data.csv")
+    parser.add_argument("--pdf-dir", default=os.path.join("pdfs", "pdfs"))
+    parser.add_argument("--output-dir", default=os.path.join("pdfs", "Images"))
+    parser.add_argument("--csv-path", default="pdf_image_data.csv")
+    parser.add_argument("--extractor", choices=sorted(batch_extract.EXTRACTORS), default="charts")
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--extract-workers", type=int, default=None,
+                        help="Number of extraction processes (default: number of CPUs)")
+    parser.add_argument("--queue-size", type=int, default=8, help="Capacity of each queue between stages")
+    parser.add_argument("--report-every", type=float, default=10, help="Seconds between progress lines")
+    parser.add_argument("--cache-dir", default=batch_extract.DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="Re-extract every PDF")
+    batch_extract.add_chart_arguments(parser)
+    parser.add_argument("--store", default=None, help="Also record each PDF in this catalogue store (SQLite)")
+    parser.add_argument("--pdf-store", default=None,
+                        help="Keep each distinct PDF once in this content-addressed store, linked into --pdf-dir")
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tracing.run_from_args(args, "pipeline"):
+        links = links_from_guidelines_page() if args.discover == "guidelines" else links_from_csv(args.links_csv)
+        Pipeline(args.pdf_dir, args.output_dir, args.csv_path, download_workers=args.download_workers,
+                 extract_workers=args.extract_workers, queue_size=args.queue_size, extractor=args.extractor,
+                 params=batch_extract._cli_params(args),
+                 cache_dir=None if args.no_cache else args.cache_dir, report_every=args.report_every,
+                 store_path=args.store, pdf_store=PdfStore(args.pdf_store) if args.pdf_store else None).run(links)
+
+
+if __name__ == "__main__":
+    main()
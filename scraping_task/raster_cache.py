@@ -0,0 +1,195 @@
+"""
+On-disk cache of rendered pages, shared by the extractor variants.
+
+3.ipynb, 5_5.ipynb's two versions and the benchmark's variants each open the
+same PDFs and render the same pages again, so comparing variants costs four
+or five full renders per page. Here a whole-page render is stored once as a
+.npy file keyed by the PDF's content hash, the page number and the zoom, and
+read back with np.load(mmap_mode="r"): the returned array is a read-only
+view of the file, so a detector that only looks at part of a zoom-8 page
+only pages in that part. Files are written under a temporary name and
+renamed, so worker processes can share one cache directory.
+
+Least recently used pages are evicted once the directory exceeds its disk
+budget; a hit refreshes the file's mtime, which is the recency used.
+
+Usage:
+    python -m scraping_task.raster_cache --warm pdfs/pdfs --zoom 8 1
+    python -m scraping_task.raster_cache --clear
+"""
+import argparse
+import os
+import threading
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from scraping_task.result_cache import file_sha256
+
+DEFAULT_CACHE_DIR = ".raster_cache"
+DEFAULT_MAX_BYTES = 8 * 1024 ** 3  # 8 GB: about 85 letter-size pages at zoom 8
+
+_open_caches = {}
+_open_lock = threading.Lock()
+
+
+def open_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """The process's RasterCache for `cache_dir` (one per directory, so hashes are remembered)."""
+    with _open_lock:
+        cache = _open_caches.get(cache_dir)
+        if cache is None:
+            cache = _open_caches[cache_dir] = RasterCache(cache_dir, max_bytes)
+        cache.max_bytes = max_bytes
+        return cache
+
+
+def render_page(page, zoom):
+    """Whole-page BGR render, as the extractors make it."""
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    img_array = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+    return cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+
+
+class RasterCache:
+    """Whole-page BGR renders as memory-mapped .npy files, evicted LRU by total size."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+        self._hashes = {}  # (abs path, size, mtime_ns) -> sha256
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def pdf_hash(self, pdf_path):
+        """Content hash of a PDF, computed once per process while its size and mtime are unchanged."""
+        st = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), st.st_size, st.st_mtime_ns)
+        if key not in self._hashes:
+            self._hashes[key] = file_sha256(pdf_path)
+        return self._hashes[key]
+
+    def _path(self, pdf_hash, page_number, zoom):
+        return os.path.join(self.cache_dir, pdf_hash[:2], f"{pdf_hash}-p{page_number}-z{zoom:g}.npy")
+
+    def get(self, pdf_hash, page_number, zoom):
+        """The cached render as a read-only memory-mapped array, or None."""
+        path = self._path(pdf_hash, page_number, zoom)
+        try:
+            img = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except (OSError, ValueError):
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return img
+
+    def put(self, pdf_hash, page_number, zoom, img):
+        """Store a render and evict old ones if over budget; returns the memory-mapped copy."""
+        path = self._path(pdf_hash, page_number, zoom)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(img))
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return np.load(path, mmap_mode="r")
+
+    def _page_hash(self, page):
+        """Content hash of a fitz page's PDF, or None for documents not opened from a file."""
+        pdf_path = page.parent.name
+        if not pdf_path or not os.path.isfile(pdf_path):
+            return None
+        return self.pdf_hash(pdf_path)
+
+    def page(self, page, zoom):
+        """
+        Whole-page BGR render of a fitz page at `zoom`, from the cache when
+        possible. Pages of documents not opened from a file are rendered
+        without caching.
+        """
+        pdf_hash = self._page_hash(page)
+        if pdf_hash is None:
+            return render_page(page, zoom)
+        img = self.get(pdf_hash, page.number, zoom)
+        if img is None:
+            img = self.put(pdf_hash, page.number, zoom, render_page(page, zoom))
+        return img
+
+    def cached_page(self, page, zoom):
+        """The page's cached render if there is one; never renders."""
+        pdf_hash = self._page_hash(page)
+        return None if pdf_hash is None else self.get(pdf_hash, page.number, zoom)
+
+    def _entries(self):
+        """(mtime, size, path) of every cached render."""
+        entries = []
+        for directory in os.scandir(self.cache_dir):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith(".npy"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def total_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep=None):
+        """Remove least recently used renders until the cache fits in max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                # Readers holding a memory map keep their pages; the file just loses its name
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.stats["evicted"] += 1
+
+    def clear(self):
+        """Remove every cached render."""
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render, summarise or clear the page-raster cache.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2)
+    parser.add_argument("--warm", default=None, metavar="PDF_DIR", help="Render every page of these PDFs")
+    parser.add_argument("--zoom", type=float, nargs="+", default=[8], help="Zoom levels to render with --warm")
+    parser.add_argument("--clear", action="store_true", help="Remove every cached render")
+    args = parser.parse_args()
+
+    cache = RasterCache(args.cache_dir, args.cache_size_mb * 1024 ** 2)
+    if args.clear:
+        cache.clear()
+    if args.warm:
+        pdf_files = sorted(f for f in os.listdir(args.warm) if f.lower().endswith('.pdf'))
+        for pdf_file in pdf_files:
+            with fitz.open(os.path.join(args.warm, pdf_file)) as doc:
+                for page in doc:
+                    for zoom in args.zoom:
+                        cache.page(page, zoom)
+            print(f"{pdf_file}: {cache.stats['hits']} cached, {cache.stats['misses']} rendered so far")
+
+    entries = cache._entries()
+    print(f"{len(entries)} pages, {sum(size for _, size, _ in entries) / 1024 ** 2:.0f} MB in {args.cache_dir} "
+          f"(budget {args.cache_size_mb} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Per-host request pacing shared by every fetcher (1.py, 2.py, 3.py, the
+downloader and the pipeline).
+
+The crawlers paced themselves with fixed time.sleep calls between pages,
+which wastes the sleep on a host that answers at once and does nothing when
+a host starts throttling; 3.py and the downloader did not pace at all.
+Here each host gets a token bucket (a request rate with a small burst) and
+a concurrency limit, and the rate adapts to what the host reports: it grows
+by a fixed step after every fast success and is halved on a 429, a 5xx, a
+connection error or when the smoothed latency exceeds the host's slow
+threshold. A Retry-After header (seconds or an HTTP date) blocks the host
+for that long, and GET/HEAD requests answered with 429 or 503 are retried
+once the host is open again.
+
+ScheduledSession is a requests.Session whose requests all take a slot from
+the scheduler first; a streamed response holds its slot until it is closed.
+Redirects are followed one hop at a time, each paced by and recorded
+against its own host, so a mirror redirecting to a CDN neither skips the
+CDN's limits nor charges the CDN's latency to the mirror.
+Fetchers that do not go through requests (Selenium page loads) take a slot
+with scheduler.slot(url) and report throttling themselves.
+
+All sessions in a process share default_scheduler(), so the browser and the
+HTTP path of one crawler see the same limits. The learned rates are saved to
+rate_state.json when the process exits, so the next crawl starts at the
+rate the host allowed last time rather than at the default.
+
+Usage:
+    python -m scraping_task.rate_scheduler              (learned per-host rates)
+    python -m scraping_task.rate_scheduler --reset
+"""
+import argparse
+import atexit
+import email.utils
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+
+from scraping_task import tracing
+
+DEFAULT_STATE_PATH = "rate_state.json"
+
+# Requests per second, burst size, concurrent requests, adaptation bounds and
+# the smoothed time-to-headers above which a host counts as struggling
+DEFAULT_LIMITS = {
+    "rate": 2.0,
+    "burst": 4,
+    "concurrency": 4,
+    "min_rate": 0.05,
+    "max_rate": 20.0,
+    "increase": 0.25,
+    "decrease": 0.5,
+    "slow_seconds": 5.0,
+    "max_retry_after": 300.0,
+}
+
+# Google answers a fast crawl with a CAPTCHA, not a 429
+HOST_LIMITS = {
+    "www.google.com": {"rate": 0.5, "burst": 1, "concurrency": 1, "max_rate": 1.0},
+}
+
+THROTTLE_STATUSES = (429, 503)
+RETRY_METHODS = ("GET", "HEAD")
+_LATENCY_SMOOTHING = 0.3
+
+
+def host_of(url):
+    return urlsplit(url).hostname or url
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+class HostLimiter:
+    """Token bucket, concurrency limit and adaptive rate of one host."""
+
+    def __init__(self, host, limits):
+        self.host = host
+        self.limits = limits
+        self.rate = limits["rate"]
+        self.tokens = float(limits["burst"])
+        self.active = 0
+        self.blocked_until = 0.0
+        self.latency = None
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "slow": 0, "waited_seconds": 0.0}
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.limits["burst"], self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until the host has a free slot, a token and is not backing off; returns the seconds waited."""
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self.active >= self.limits["concurrency"]:
+                    timeout = None
+                elif now < self.blocked_until:
+                    timeout = self.blocked_until - now
+                elif self.tokens < 1:
+                    timeout = (1 - self.tokens) / self.rate
+                else:
+                    self.tokens -= 1
+                    self.active += 1
+                    self.stats["requests"] += 1
+                    waited = now - start
+                    self.stats["waited_seconds"] += waited
+                    return waited
+                self._cond.wait(timeout)
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def record(self, status=None, latency=None, retry_after=None, error=False):
+        """
+        Adapt the rate to one response: `status` is its HTTP status (None
+        for a page load without one), `latency` its time to headers.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if latency is not None:
+                self.latency = latency if self.latency is None else (
+                    _LATENCY_SMOOTHING * latency + (1 - _LATENCY_SMOOTHING) * self.latency)
+
+            throttled = status in THROTTLE_STATUSES or retry_after is not None
+            if throttled or error or (status is not None and status >= 500):
+                self.stats["throttled" if throttled else "errors"] += 1
+                self._slow_down(now)
+                if retry_after is not None:
+                    self.blocked_until = max(self.blocked_until,
+                                             now + min(retry_after, self.limits["max_retry_after"]))
+            elif self.latency is not None and self.latency > self.limits["slow_seconds"]:
+                self.stats["slow"] += 1
+                self._slow_down(now)
+            else:
+                self.rate = min(self.limits["max_rate"], self.rate + self.limits["increase"])
+            self._cond.notify_all()
+
+    def _slow_down(self, now):
+        self.rate = max(self.limits["min_rate"], self.rate * self.limits["decrease"])
+        # Spend the burst: the next request waits a full interval at the new rate
+        self.tokens = min(self.tokens, 0.0)
+        self.blocked_until = max(self.blocked_until, now + 1 / self.rate)
+
+    def summary(self):
+        with self._cond:
+            return {"rate": round(self.rate, 3), "latency": None if self.latency is None else round(self.latency, 3),
+                    **self.stats, "waited_seconds": round(self.stats["waited_seconds"], 1)}
+
+
+class RateScheduler:
+    """Per-host limiters, created on first use from DEFAULT_LIMITS and HOST_LIMITS."""
+
+    def __init__(self, limits=None, host_limits=None, state_path=None):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.host_limits = {**HOST_LIMITS, **(host_limits or {})}
+        self.state_path = state_path
+        self._learned = load_state(state_path) if state_path else {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def host(self, url):
+        """The limiter for a URL's host."""
+        name = host_of(url)
+        with self._lock:
+            limiter = self._hosts.get(name)
+            if limiter is None:
+                limits = {**self.limits, **self.host_limits.get(name, {})}
+                learned = self._learned.get(name, {}).get("rate")
+                if learned is not None:
+                    limits["rate"] = min(limits["max_rate"], max(limits["min_rate"], learned))
+                limiter = self._hosts[name] = HostLimiter(name, limits)
+            return limiter
+
+    @contextmanager
+    def slot(self, url):
+        """
+        Hold one of the host's slots for the duration of the block. The
+        yielded Slot records the outcome; without a record() call the block
+        counts as a success (or an error, if it raises) timed end to end.
+        """
+        limiter = self.host(url)
+        waited = limiter.acquire()
+        if waited > 0.01:
+            tracing.count("rate_waits")
+        slot = Slot(limiter)
+        try:
+            yield slot
+        except BaseException:
+            if not slot.recorded:
+                slot.record(error=True)
+            raise
+        finally:
+            if not slot.recorded:
+                slot.record()
+            limiter.release()
+
+    def summary(self):
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {name: limiter.summary() for name, limiter in sorted(hosts.items())}
+
+    def save(self):
+        """Merge the current per-host rates into the state file."""
+        if not self.state_path:
+            return
+        state = load_state(self.state_path)
+        for name, summary in self.summary().items():
+            state[name] = {"rate": summary["rate"], "updated": datetime.now().isoformat(timespec="seconds")}
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+
+class Slot:
+    """One acquired request slot; record() reports how the request went."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.start = time.monotonic()
+        self.recorded = False
+
+    def record(self, status=None, latency=None, retry_after=None, error=False):
+        if self.recorded:
+            return
+        self.recorded = True
+        if latency is None:
+            latency = time.monotonic() - self.start
+        self.limiter.record(status, latency, retry_after, error)
+
+    def throttled(self, retry_after=None):
+        """The host refused the request without a status (e.g. a CAPTCHA page)."""
+        self.record(status=429, retry_after=retry_after)
+
+
+def load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    """The process-wide scheduler, seeded from rate_state.json and saved back at exit."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = RateScheduler(state_path=DEFAULT_STATE_PATH)
+            atexit.register(_default.save)
+        return _default
+
+
+class ScheduledSession(requests.Session):
+    """requests.Session whose requests are paced per host by a RateScheduler."""
+
+    def __init__(self, scheduler=None, status_retries=2):
+        super().__init__()
+        self.scheduler = scheduler or default_scheduler()
+        self.status_retries = status_retries
+
+    def send(self, request, **kwargs):
+        """
+        Send a prepared request one hop at a time: every redirect hop takes
+        a slot from its own host and is recorded against it.
+        """
+        allow_redirects = kwargs.pop("allow_redirects", True)
+        response = self._send_hop(request, **kwargs)
+        if not allow_redirects:
+            return response
+        # resolve_redirects sends each hop through send(..., allow_redirects=False)
+        history = list(self.resolve_redirects(response, request, **kwargs))
+        if history:
+            history.insert(0, response)
+            response = history.pop()
+            response.history = history
+        return response
+
+    def _send_hop(self, request, **kwargs):
+        retries = self.status_retries if request.method.upper() in RETRY_METHODS else 0
+        while True:
+            limiter = self.scheduler.host(request.url)
+            limiter.acquire()
+            try:
+                response = super().send(request, allow_redirects=False, **kwargs)
+            except requests.RequestException:
+                limiter.record(error=True)
+                limiter.release()
+                raise
+            except BaseException:
+                limiter.release()
+                raise
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            limiter.record(response.status_code, response.elapsed.total_seconds(),
+                           retry_after if response.status_code in THROTTLE_STATUSES else None)
+            if response.status_code in THROTTLE_STATUSES and retries > 0:
+                retries -= 1
+                tracing.count("rate_retries")
+                response.close()
+                limiter.release()
+                continue
+
+            if kwargs.get("stream"):
+                _release_on_close(response, limiter)
+            else:
+                limiter.release()
+            return response
+
+
+def _release_on_close(response, limiter):
+    """Keep a streamed response's slot until its body has been read and it is closed."""
+    close = response.close
+    released = threading.Event()
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            if not released.is_set():
+                released.set()
+                limiter.release()
+
+    response.close = close_and_release
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or reset the per-host request rates learned by the crawlers.")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH)
+    parser.add_argument("--reset", action="store_true", help="Forget the learned rates")
+    args = parser.parse_args()
+
+    if args.reset:
+        if os.path.exists(args.state):
+            os.remove(args.state)
+        print(f"Removed {args.state}")
+        return
+    state = load_state(args.state)
+    if not state:
+        print(f"No learned rates in {args.state}")
+    for host, entry in sorted(state.items()):
+        print(f"{host}: {entry['rate']:.2f} requests/s (as of {entry['updated']})")
+
+
+if __name__ == "__main__":
+    main()
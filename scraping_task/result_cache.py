@@ -0,0 +1,159 @@
+"""
+Persistent on-disk cache of extractor results.
+
+Entries are keyed by the SHA-256 of the PDF contents plus a hash of the
+extractor name and its parameters, so renaming or moving a PDF keeps its
+entry while changing zoom, thresholds, known_non_charts or the target
+dimensions invalidates it. Each entry stores the extracted image files and
+the accepted count written to pdf_image_data.csv.
+
+To keep reruns cheap, the content hash of each PDF is remembered against
+its size and modification time; an unchanged file costs one os.stat().
+The total size of the cache is bounded and the least recently used entries
+are evicted first.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+# Bump when an extractor changes in a way its parameters do not capture
+CACHE_VERSION = 1
+
+# Parameters that change how an extractor runs but not what it outputs
+RUNTIME_PARAMS = ("encode_threads", "raster_cache_dir", "raster_cache_mb")
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_digest(extractor, params):
+    """Stable hash of an extractor name and its (JSON-serialisable) parameters."""
+    params = {name: value for name, value in params.items() if name not in RUNTIME_PARAMS}
+    payload = json.dumps({"version": CACHE_VERSION, "extractor": extractor, "params": params},
+                         sort_keys=True, default=list)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ResultCache:
+    """Content-hash keyed store of (filename, bytes) extractor outputs."""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.json")
+        os.makedirs(os.path.join(cache_dir, "entries"), exist_ok=True)
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+        index.setdefault("entries", {})
+        index.setdefault("hashes", {})
+        return index
+
+    def save(self):
+        """Write the index atomically."""
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def pdf_hash(self, pdf_path):
+        """Content hash of a PDF, reusing the stored one when size and mtime are unchanged."""
+        st = os.stat(pdf_path)
+        abs_path = os.path.abspath(pdf_path)
+        known = self._index["hashes"].get(abs_path)
+        if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+            return known["sha256"]
+
+        sha = file_sha256(pdf_path)
+        self._index["hashes"][abs_path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+        return sha
+
+    def key_for(self, pdf_path, extractor, params):
+        """Cache key for one PDF under one extractor configuration."""
+        return f"{self.pdf_hash(pdf_path)}-{params_digest(extractor, params)}"
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, "entries", key)
+
+    def get(self, key, pdf_file):
+        """
+        Return the cached (filename, bytes) outputs for `key`, renamed for
+        `pdf_file`, or None on a miss.
+        """
+        entry = self._index["entries"].get(key)
+        if entry is None:
+            return None
+
+        entry_dir = self._entry_dir(key)
+        stem = pdf_file.split('.')[0]
+        outputs = []
+        try:
+            for i, suffix in enumerate(entry["suffixes"]):
+                with open(os.path.join(entry_dir, f"{i}.bin"), "rb") as f:
+                    outputs.append((stem + suffix, f.read()))
+        except FileNotFoundError:
+            # Entry was removed from disk behind our back
+            self._drop(key)
+            return None
+
+        entry["last_used"] = time.time()
+        return outputs
+
+    def put(self, key, pdf_file, outputs):
+        """Store the outputs for `key` and evict old entries if over budget."""
+        entry_dir = self._entry_dir(key)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.makedirs(entry_dir)
+
+        # Filenames are stored without the PDF stem so renamed copies still hit
+        stem = pdf_file.split('.')[0]
+        suffixes = []
+        size = 0
+        for i, (filename, data) in enumerate(outputs):
+            suffixes.append(filename[len(stem):] if filename.startswith(stem) else "_" + filename)
+            with open(os.path.join(entry_dir, f"{i}.bin"), "wb") as f:
+                f.write(data)
+            size += len(data)
+
+        self._index["entries"][key] = {"suffixes": suffixes, "size": size, "last_used": time.time()}
+        self.evict()
+
+    def _drop(self, key):
+        self._index["entries"].pop(key, None)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self._index["entries"].values())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        by_age = sorted(self._index["entries"].items(), key=lambda item: item[1]["last_used"])
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            total -= entry["size"]
+            self._drop(key)
+
+    def clear(self):
+        """Remove every cached entry."""
+        for key in list(self._index["entries"]):
+            self._drop(key)
+        self.save()
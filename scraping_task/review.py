@@ -0,0 +1,572 @@
+"""
+Local web app for the keep/delete review of extracted charts (4.py, 7.ipynb).
+
+4.py opened every PDF and every image with os.startfile, slept 1.5 s for the
+viewer to come up and blocked on input() for each decision, so most of a
+review was spent waiting for windows. Here the review runs in a browser
+tab served from this process: a PDF's charts are shown together as a grid
+of downscaled previews next to a thumbnail of the page each chart came
+from, decisions are made with the keyboard and sent for the whole PDF at
+once, and the next PDFs' previews are already rendered by the time they
+are shown.
+
+Previews and page thumbnails are made on a small thread pool, kept in an
+in-memory LRU and prefetched for the next --prefetch PDFs whenever the
+browser asks for the queue. Decisions are applied on one background
+thread, which is the only writer of the image directory and the catalogue
+store: it deletes the files, appends 4.py's "Manually deleted N images"
+note and records the PDF as reviewed, so a stopped review resumes where it
+left off. Answering a request never waits for a delete or a note.
+
+A chart's page is found by matching its file-name title against each
+page's text; charts without a title start at the first page after the
+cover, and [ and ] step through the pages either way.
+
+Keys: arrows move between charts, d marks a chart for deletion, k keeps it,
+Enter applies the PDF's decisions and moves on, s skips the rest of the PDF
+(applying the deletions made so far, like 4.py's "s"), o opens the PDF.
+
+Usage:
+    python -m scraping_task.review --store catalogue.sqlite --export df_7.csv
+    python -m scraping_task.review --port 8765 --prefetch 5 --all
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import queue
+import re
+import threading
+import urllib.parse
+import webbrowser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from scraping_task.catalogue_store import DEFAULT_STORE_PATH, CatalogueStore
+from scraping_task.image_catalogue import ImageCatalogue
+
+DEFAULT_STATE_PATH = "review_state.json"
+DEFAULT_PREVIEW_SIDE = 640
+DEFAULT_THUMBNAIL_SIDE = 900
+DEFAULT_PREFETCH = 3
+DEFAULT_CACHE_ITEMS = 512
+
+
+def _normalise(text):
+    return re.sub(r"[^0-9a-z]+", "", text.lower())
+
+
+def _jpeg(img, quality=85):
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+def downscale(img, max_side):
+    """Shrink so the longer side is at most `max_side` (never enlarge)."""
+    h, w = img.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return img
+    return cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def image_preview(path, max_side=DEFAULT_PREVIEW_SIDE):
+    """A chart image as a downscaled JPEG."""
+    img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Cannot read image {path}")
+    return _jpeg(downscale(img, max_side))
+
+
+def page_thumbnail(pdf_path, page_number, max_side=DEFAULT_THUMBNAIL_SIDE):
+    """One PDF page rendered so its longer side is `max_side` pixels, as a JPEG."""
+    with fitz.open(pdf_path) as doc:
+        page = doc[page_number]
+        zoom = max_side / max(page.rect.width, page.rect.height)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        return _jpeg(cv2.cvtColor(img, cv2.COLOR_RGB2BGR))
+
+
+def chart_pages(pdf_path, titles):
+    """
+    (page_count, {title: page index}) for the file-name titles of a PDF's
+    charts; a title found on no page (or None) maps to None.
+    """
+    with fitz.open(pdf_path) as doc:
+        texts = [_normalise(page.get_text()) for page in doc]
+    pages = {}
+    for title in titles:
+        needle = _normalise(title or "")
+        pages[title] = next((i for i, text in enumerate(texts) if needle and needle in text), None)
+    return len(texts), pages
+
+
+class PreviewCache:
+    """Downscaled previews made on a thread pool and kept in an LRU; prefetch() warms it."""
+
+    def __init__(self, workers=4, max_items=DEFAULT_CACHE_ITEMS):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview")
+        self.max_items = max_items
+        self._futures = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _future(self, key, make):
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self.executor.submit(make)
+                self._futures[key] = future
+                while len(self._futures) > self.max_items:
+                    self._futures.popitem(last=False)
+            else:
+                self._futures.move_to_end(key)
+            return future
+
+    def get(self, key, make):
+        """The bytes for `key`, made by `make()` unless cached or already being made."""
+        future = self._future(key, make)
+        try:
+            return future.result()
+        except Exception:
+            with self._lock:
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+            raise
+
+    def prefetch(self, key, make):
+        self._future(key, make)
+
+    def discard(self, key):
+        with self._lock:
+            self._futures.pop(key, None)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class DecisionApplier(threading.Thread):
+    """
+    Applies submitted decisions in order on one thread: deletes files,
+    appends the note and records the PDF as reviewed in the state file.
+    """
+
+    def __init__(self, store_path, state_path, reviewed, on_delete=None):
+        super().__init__(name="review-applier", daemon=True)
+        self.store_path = store_path
+        self.state_path = state_path
+        self.reviewed = reviewed
+        self.on_delete = on_delete
+        self.queue = queue.Queue()
+        self.errors = []
+        self.applied = 0
+        self.deleted = 0
+
+    def submit(self, batch):
+        self.queue.put(batch)
+
+    def pending(self):
+        return self.queue.unfinished_tasks
+
+    def run(self):
+        # SQLite connections belong to the thread that made them
+        store = CatalogueStore(self.store_path) if self.store_path else None
+        try:
+            while True:
+                batch = self.queue.get()
+                try:
+                    if batch is None:
+                        return
+                    self._apply(store, batch)
+                except Exception as e:
+                    self.errors.append(f"{batch.get('pdf')}: {e}")
+                    print(f"Error applying decisions for {batch.get('pdf')}: {e}")
+                finally:
+                    self.queue.task_done()
+        finally:
+            if store is not None:
+                store.close()
+
+    def _apply(self, store, batch):
+        pdf_filename = batch["pdf"]
+        deleted = 0
+        for path in batch["delete"]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.errors.append(f"{os.path.basename(path)}: {e}")
+                print(f"Error deleting image: {e}")
+                continue
+            if self.on_delete is not None:
+                self.on_delete(path)
+            deleted += 1
+            print(f"Deleted: {os.path.basename(path)}")
+
+        if deleted and store is not None:
+            message = f"Manually deleted {deleted} images" + (" before skipping" if batch.get("skipped") else "")
+            print(f"Updated note for {pdf_filename}: {store.append_note(pdf_filename, message)}")
+        self.reviewed.add(pdf_filename)
+        self._save_state()
+        self.applied += 1
+        self.deleted += deleted
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"reviewed": sorted(self.reviewed)}, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def close(self):
+        """Finish everything submitted so far and stop."""
+        self.queue.put(None)
+        self.join()
+
+
+class ReviewSession:
+    """The review queue (PDFs with charts, in date order) and the state shared by the request handlers."""
+
+    def __init__(self, image_dir, pdf_dir, store_path=DEFAULT_STORE_PATH, state_path=DEFAULT_STATE_PATH,
+                 prefetch=DEFAULT_PREFETCH, preview_side=DEFAULT_PREVIEW_SIDE, include_reviewed=False):
+        self.image_dir = image_dir
+        self.pdf_dir = pdf_dir
+        self.prefetch_pdfs = prefetch
+        self.preview_side = preview_side
+        self.catalogue = ImageCatalogue(image_dir)
+        self.previews = PreviewCache()
+        self._pages = {}  # pdf_filename -> (page_count, {title: page})
+        self._lock = threading.Lock()  # the catalogue and _pages are shared by the handler threads
+
+        reviewed = set()
+        if os.path.isfile(state_path):
+            with open(state_path, encoding="utf-8") as f:
+                reviewed = set(json.load(f).get("reviewed", []))
+        self.pdfs = self._queue_order(store_path, reviewed, include_reviewed)
+        self.applier = DecisionApplier(store_path, state_path, reviewed, on_delete=self._deleted)
+        self.applier.start()
+
+    def _queue_order(self, store_path, reviewed, include_reviewed):
+        """PDFs with charts, oldest first as 4.py went (catalogue date order, then the rest by name)."""
+        with_images = set(self.catalogue.pdfs())
+        ordered = []
+        if store_path and os.path.isfile(store_path):
+            with CatalogueStore(store_path) as store:
+                ordered = [row["pdf_filename"] for row in store.rows() if row["pdf_filename"] in with_images]
+        ordered += sorted(with_images - set(ordered))
+        return [pdf for pdf in ordered if include_reviewed or pdf not in reviewed]
+
+    def images_for(self, pdf_filename):
+        with self._lock:
+            return self.catalogue.images_for(pdf_filename)
+
+    def _deleted(self, path):
+        with self._lock:
+            self.catalogue.remove(path)
+        self.previews.discard(("image", path))
+
+    def pdf_path(self, pdf_filename):
+        return os.path.join(self.pdf_dir, pdf_filename)
+
+    def pages(self, pdf_filename):
+        with self._lock:
+            cached = self._pages.get(pdf_filename)
+        if cached is None:
+            titles = [image.title for image in self.images_for(pdf_filename)]
+            try:
+                cached = chart_pages(self.pdf_path(pdf_filename), titles)
+            except Exception:
+                cached = (0, {})
+            with self._lock:
+                self._pages[pdf_filename] = cached
+        return cached
+
+    def item(self, pdf_filename):
+        """What the page shows for one PDF: its charts, each with the page it was found on."""
+        page_count, pages = self.pages(pdf_filename)
+        first_page = 1 if page_count > 1 else 0
+        charts = []
+        for image in self.images_for(pdf_filename):
+            page = pages.get(image.title)
+            charts.append({"name": image.name, "title": image.title, "plot": image.plot_number,
+                           "page": first_page if page is None else page, "page_found": page is not None})
+        return {"pdf": pdf_filename, "page_count": page_count, "charts": charts,
+                "has_pdf": os.path.isfile(self.pdf_path(pdf_filename))}
+
+    def window(self, start, count):
+        """Items start..start+count, with the next prefetch_pdfs PDFs' previews queued for rendering."""
+        items = [self.item(pdf) for pdf in self.pdfs[start:start + count]]
+        for pdf in self.pdfs[start:start + count + self.prefetch_pdfs]:
+            self.prefetch(pdf)
+        return items
+
+    def prefetch(self, pdf_filename):
+        for image in self.images_for(pdf_filename):
+            self.previews.prefetch(("image", image.path), lambda path=image.path: image_preview(path, self.preview_side))
+        if os.path.isfile(self.pdf_path(pdf_filename)):
+            page_count, pages = self.pages(pdf_filename)
+            for page in {p for p in pages.values() if p is not None} or {1 if page_count > 1 else 0}:
+                self.thumbnail(pdf_filename, page, wait=False)
+
+    def preview(self, name):
+        path = os.path.join(self.image_dir, name)
+        return self.previews.get(("image", path), lambda: image_preview(path, self.preview_side))
+
+    def thumbnail(self, pdf_filename, page, wait=True):
+        key = ("page", pdf_filename, page)
+        make = lambda: page_thumbnail(self.pdf_path(pdf_filename), page)  # noqa: E731
+        if not wait:
+            return self.previews.prefetch(key, make)
+        return self.previews.get(key, make)
+
+    def decide(self, pdf_filename, delete, skipped=False):
+        """Queue a PDF's decisions; returns at once."""
+        known = {image.name: image.path for image in self.images_for(pdf_filename)}
+        paths = [known[name] for name in delete if name in known]
+        self.applier.submit({"pdf": pdf_filename, "delete": paths, "skipped": skipped})
+        return len(paths)
+
+    def status(self):
+        return {"pending": self.applier.pending(), "applied": self.applier.applied,
+                "deleted": self.applier.deleted, "errors": self.applier.errors[-10:], "total": len(self.pdfs)}
+
+    def close(self):
+        self.applier.close()
+        self.previews.shutdown()
+
+
+class ReviewHandler(BaseHTTPRequestHandler):
+    session = None  # set by serve()
+
+    def log_message(self, format, *args):
+        pass  # the review loop prints its own progress
+
+    def _send(self, body, content_type, status=200, cache=False):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=3600" if cache else "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, value, status=200):
+        self._send(json.dumps(value).encode("utf-8"), "application/json", status)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        parts = [urllib.parse.unquote(part) for part in url.path.strip("/").split("/")]
+        try:
+            if url.path == "/":
+                page = _PAGE_HTML.replace("__PREFETCH__", str(self.session.prefetch_pdfs))
+                self._send(page.encode("utf-8"), "text/html; charset=utf-8")
+            elif parts[:2] == ["api", "queue"]:
+                start = int(query.get("start", ["0"])[0])
+                count = int(query.get("count", ["1"])[0])
+                self._json({"items": self.session.window(start, count), "total": len(self.session.pdfs)})
+            elif parts[:2] == ["api", "status"]:
+                self._json(self.session.status())
+            elif parts[0] == "image" and len(parts) == 2:
+                self._send(self.session.preview(os.path.basename(parts[1])), "image/jpeg", cache=True)
+            elif parts[0] == "page" and len(parts) == 3:
+                self._send(self.session.thumbnail(os.path.basename(parts[1]), int(parts[2])), "image/jpeg",
+                           cache=True)
+            elif parts[0] == "pdf" and len(parts) == 2:
+                with open(self.session.pdf_path(os.path.basename(parts[1])), "rb") as f:
+                    self._send(f.read(), "application/pdf")
+            else:
+                self._json({"error": "not found"}, 404)
+        except (FileNotFoundError, IndexError, ValueError) as e:
+            self._json({"error": str(e)}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/decisions":
+            self._json({"error": "not found"}, 404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        queued = self.session.decide(os.path.basename(body["pdf"]), body.get("delete", []), body.get("skipped", False))
+        self._json({"queued": queued})
+
+
+def serve(session, host="127.0.0.1", port=8765, open_browser=True):
+    """Serve the review until interrupted, then finish the queued decisions."""
+    handler = type("Handler", (ReviewHandler,), {"session": session})
+    server = ThreadingHTTPServer((host, port), handler)
+    url = f"http://{host}:{server.server_address[1]}/"
+    print(f"Reviewing {len(session.pdfs)} PDFs at {url} (Ctrl+C to stop)")
+    if open_browser:
+        webbrowser.open(url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("Applying the remaining decisions...")
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Review extracted charts in the browser (replaces 4.py's loop).")
+    parser.add_argument("--image-dir", default=os.path.join("pdfs", "Images"))
+    parser.add_argument("--pdf-dir", default=os.path.join("pdfs", "pdfs"))
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Catalogue store for the order and the notes")
+    parser.add_argument("--seed-csv", default=None, help="Import this CSV (e.g. df_6.csv) if the store is empty")
+    parser.add_argument("--export", default=None, help="Export the store as df_7.csv to this path when done")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH, help="PDFs already reviewed, to resume from")
+    parser.add_argument("--all", action="store_true", help="Include PDFs reviewed in earlier sessions")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH, help="PDFs ahead to render previews for")
+    parser.add_argument("--preview-side", type=int, default=DEFAULT_PREVIEW_SIDE,
+                        help="Longer side of the chart previews in pixels")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-browser", action="store_true")
+    args = parser.parse_args()
+
+    if args.seed_csv:
+        with CatalogueStore(args.store) as store:
+            if len(store) == 0:
+                store.import_csv(args.seed_csv)
+
+    session = ReviewSession(args.image_dir, args.pdf_dir, args.store, args.state, prefetch=args.prefetch,
+                            preview_side=args.preview_side, include_reviewed=args.all)
+    serve(session, args.host, args.port, open_browser=not args.no_browser)
+    status = session.status()
+    print(f"Applied decisions for {status['applied']} PDFs, deleted {status['deleted']} images")
+    if args.export:
+        with CatalogueStore(args.store) as store:
+            store.export_csv(args.export, "df_7")
+        print(f"CSV file updated at: {args.export}")
+
+
+_PAGE_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Chart review</title>
+<style>
+body { font-family: sans-serif; margin: 0; display: flex; height: 100vh; }
+#page { width: 42%; overflow: auto; background: #333; text-align: center; }
+#page img { max-width: 100%; }
+#page .nav { color: #eee; padding: 4px; }
+#main { flex: 1; overflow: auto; padding: 8px; }
+#grid { display: flex; flex-wrap: wrap; gap: 8px; }
+.chart { border: 4px solid transparent; width: 300px; cursor: pointer; }
+.chart img { width: 100%; display: block; }
+.chart .name { font-size: 11px; word-break: break-all; }
+.chart.focus { border-color: #36c; }
+.chart.delete { opacity: 0.35; border-color: #c33; }
+.chart.delete.focus { border-color: #c3c; }
+#status { font-size: 12px; color: #666; }
+</style></head>
+<body>
+<div id="page"><div class="nav" id="pagenav"></div><img id="pageimg"></div>
+<div id="main">
+  <h3 id="title">Loading...</h3>
+  <div>arrows: move &middot; d: delete &middot; k: keep &middot; Enter: apply and next PDF &middot;
+       s: skip rest of PDF &middot; [ ]: page &middot; o: open PDF</div>
+  <div id="status"></div>
+  <div id="grid"></div>
+</div>
+<script>
+const AHEAD = __PREFETCH__;
+let items = [], total = 0, index = 0, focus = 0, page = 0, marks = {};
+const warmed = new Set();
+
+async function load(start) {
+  const r = await fetch(`/api/queue?start=${start}&count=${AHEAD + 1}`);
+  const data = await r.json();
+  total = data.total;
+  data.items.forEach((item, i) => { items[start + i] = item; });
+  // Let the browser fetch the next PDFs' previews while this one is reviewed
+  data.items.slice(1).forEach(item => item.charts.forEach(c => {
+    const src = `/image/${encodeURIComponent(c.name)}`;
+    if (!warmed.has(src)) { warmed.add(src); new Image().src = src; }
+  }));
+}
+
+function current() { return items[index]; }
+
+function showPage() {
+  const item = current();
+  if (!item || !item.has_pdf) { document.getElementById("pageimg").src = ""; return; }
+  document.getElementById("pageimg").src = `/page/${encodeURIComponent(item.pdf)}/${page}`;
+  document.getElementById("pagenav").textContent = `page ${page + 1} of ${item.page_count}`;
+}
+
+function render() {
+  const item = current();
+  const grid = document.getElementById("grid");
+  grid.innerHTML = "";
+  if (!item) { document.getElementById("title").textContent = "Review complete"; showPage(); return; }
+  document.getElementById("title").textContent = `${item.pdf} (${index + 1} of ${total})`;
+  item.charts.forEach((c, i) => {
+    const div = document.createElement("div");
+    div.className = "chart" + (i === focus ? " focus" : "") + (marks[c.name] ? " delete" : "");
+    div.innerHTML = `<img src="/image/${encodeURIComponent(c.name)}"><div class="name"></div>`;
+    div.querySelector(".name").textContent = c.name + (c.page_found ? ` (p. ${c.page + 1})` : "");
+    div.onclick = () => { focus = i; page = c.page; marks[c.name] = !marks[c.name]; render(); showPage(); };
+    grid.appendChild(div);
+  });
+}
+
+async function refreshStatus() {
+  const s = await (await fetch("/api/status")).json();
+  document.getElementById("status").textContent =
+    `applied ${s.applied}, deleted ${s.deleted}, pending ${s.pending}` + (s.errors.length ? `; errors: ${s.errors.join("; ")}` : "");
+}
+
+async function submit(skipped) {
+  const item = current();
+  if (!item) return;
+  const del = item.charts.filter(c => marks[c.name]);
+  fetch("/api/decisions", {method: "POST", headers: {"Content-Type": "application/json"},
+    body: JSON.stringify({pdf: item.pdf, delete: del.map(c => c.name), skipped: skipped})}).then(refreshStatus);
+  index += 1; focus = 0; marks = {};
+  if (!items[index] && index < total) await load(index);
+  else if (index + AHEAD < total && !items[index + AHEAD]) load(index + 1);
+  const next = current();
+  page = next && next.charts.length ? next.charts[0].page : 0;
+  render(); showPage();
+}
+
+function move(delta) {
+  const item = current();
+  if (!item || !item.charts.length) return;
+  focus = Math.max(0, Math.min(item.charts.length - 1, focus + delta));
+  page = item.charts[focus].page;
+  render(); showPage();
+  document.querySelector(".chart.focus").scrollIntoView({block: "nearest"});
+}
+
+document.addEventListener("keydown", e => {
+  const item = current();
+  if (e.key === "Enter") submit(false);
+  else if (e.key === "s") submit(true);
+  else if (e.key === "ArrowRight" || e.key === "ArrowDown") move(1);
+  else if (e.key === "ArrowLeft" || e.key === "ArrowUp") move(-1);
+  else if (item && item.charts.length && (e.key === "d" || e.key === "k")) {
+    marks[item.charts[focus].name] = e.key === "d"; move(1);
+  }
+  else if (item && e.key === "]") { page = Math.min(item.page_count - 1, page + 1); showPage(); }
+  else if (item && e.key === "[") { page = Math.max(0, page - 1); showPage(); }
+  else if (item && e.key === "o") window.open(`/pdf/${encodeURIComponent(item.pdf)}`);
+  else return;
+  e.preventDefault();
+});
+
+load(0).then(() => {
+  const item = current();
+  page = item && item.charts.length ? item.charts[0].page : 0;
+  render(); showPage(); refreshStatus();
+});
+setInterval(refreshStatus, 5000);
+</script></body></html>
+"""
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Per-page index of the text layer, used for chart title lookup and for
+finding the blocks that contain a given phrase.
+
+5.ipynb, 5_5.ipynb and 3.ipynb called page.get_text("dict") and then, for
+every candidate chart, walked every block, line and span of the page again
+(and ran page.search_for for every search text). Here the text layer is
+read once per page: block texts are joined once, blocks are kept sorted by
+their top edge so "blocks intersecting this rect" only looks at the blocks
+in the rect's y-interval, and span texts are joined into one lowercase
+string so a phrase lookup is a single str.find.
+
+Results come back in the original block order, so anything that sorted or
+picked the "first" block in the notebooks still gets the same answer.
+"""
+import bisect
+
+import fitz  # PyMuPDF
+import numpy as np
+
+
+class TextBlock:
+    """One text block: its rect and the text the notebooks built from it."""
+
+    __slots__ = ("index", "rect", "text")
+
+    def __init__(self, index, rect, text):
+        self.index = index
+        self.rect = rect
+        self.text = text
+
+    def __repr__(self):
+        return f"TextBlock({self.index}, {tuple(self.rect)}, {self.text[:40]!r})"
+
+
+class PageTextIndex:
+    """Text blocks of one page, indexed by y-interval and by span text."""
+
+    def __init__(self, blocks):
+        """`blocks` is the "blocks" list of page.get_text("dict")."""
+        self.blocks = []
+        span_texts = []
+        span_blocks = []
+        for block in blocks:
+            if block["type"] != 0:  # Text blocks only
+                continue
+
+            block_text = ""
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    block_text += span["text"] + " "
+                    span_texts.append(span["text"].lower())
+                    span_blocks.append(len(self.blocks))
+
+            self.blocks.append(TextBlock(len(self.blocks), fitz.Rect(block["bbox"]), block_text.strip()))
+
+        # Sorted y-intervals: blocks ordered by top edge, plus the tallest
+        # block height to bound how far above a query a block can start
+        boxes = np.array([tuple(b.rect) for b in self.blocks], dtype=np.float64).reshape(-1, 4)
+        self._order = np.argsort(boxes[:, 1], kind="stable")
+        self._boxes = boxes[self._order]
+        heights = self._boxes[:, 3] - self._boxes[:, 1]
+        self._max_height = float(heights.max()) if len(heights) else 0.0
+
+        # All span texts in block order, one per line, for phrase lookups
+        self._span_text = "\n".join(span_texts)
+        self._span_starts = []
+        offset = 0
+        for text in span_texts:
+            self._span_starts.append(offset)
+            offset += len(text) + 1
+        self._span_blocks = span_blocks
+
+    @classmethod
+    def from_page(cls, page):
+        return cls(page.get_text("dict")["blocks"])
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def intersecting(self, rect):
+        """
+        Blocks whose rect intersects `rect` (as fitz.Rect.intersects
+        decides it), in page order.
+        """
+        rect = fitz.Rect(rect)
+        if rect.is_empty or not self.blocks:
+            return []
+
+        # Only blocks starting inside [rect.y0 - tallest block, rect.y1) can reach the rect
+        y0s = self._boxes[:, 1]
+        lo = np.searchsorted(y0s, rect.y0 - self._max_height, side="right")
+        hi = np.searchsorted(y0s, rect.y1, side="left")
+        window = self._boxes[lo:hi]
+
+        hit = ((window[:, 0] < rect.x1) & (rect.x0 < window[:, 2]) &
+               (window[:, 1] < rect.y1) & (rect.y0 < window[:, 3]) &
+               (window[:, 0] < window[:, 2]) & (window[:, 1] < window[:, 3]))
+        return [self.blocks[i] for i in sorted(self._order[lo:hi][hit])]
+
+    def find(self, text):
+        """
+        First block (in page order) with a span containing `text`, ignoring
+        case, or None.
+        """
+        pos = self._span_text.find(text.lower())
+        if pos < 0:
+            return None
+        span = bisect.bisect_right(self._span_starts, pos) - 1
+        return self.blocks[self._span_blocks[span]]
+
+
+class PdfTextIndex:
+    """Lazily built PageTextIndex for every page of an open document."""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._pages = {}
+
+    def page(self, page_num):
+        if page_num not in self._pages:
+            self._pages[page_num] = PageTextIndex.from_page(self.doc[page_num])
+        return self._pages[page_num]
+
+    def find(self, text, pages=None):
+        """(page number, block) of the first block containing `text`, or (None, None)."""
+        for page_num in (range(len(self.doc)) if pages is None else pages):
+            block = self.page(page_num).find(text)
+            if block is not None:
+                return page_num, block
+        return None, None
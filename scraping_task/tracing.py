@@ -0,0 +1,567 @@
+"""
+Spans, counters and opt-in profiling for the scrapers and extractors.
+
+None of the tools recorded timings: progress was print statements, such as
+5.ipynb's "Edge ratio ... Plot score" lines for every image, and finding
+out which stage dominated on one month's PDF meant adding time.time() calls
+by hand. The code is now instrumented once, with nested spans and counters:
+
+    with tracing.span("page", pdf=pdf_file, page=n):
+        with tracing.span("render", zoom=8):
+            ...
+        tracing.count("candidates", len(candidates))
+
+Until a run is started tracing is off: span() hands back a shared
+do-nothing object and count() returns at once, so instrumented code pays a
+function call and a None check.
+
+A started run collects every span and, when it finishes, writes one JSON
+report: wall time, per-stage totals (count, total and self time, share of
+all traced self time), counters, a per-PDF breakdown of stage times and
+counters (the pdf, page and url attributes are inherited by nested spans,
+and counted while inside them), the slowest PDFs and pages, and optionally
+a profile:
+
+    cprofile   cProfile of the thread that started the run (and of each
+               worker process); the report lists the functions with the
+               most self time and the merged stats are saved next to it
+    sample     a thread samples every thread's stack every few ms; the
+               report lists the hottest lines and the stage each sample
+               fell in, at far lower overhead than cProfile
+
+Pool workers find the run through environment variables (or inherit it
+when forked), spill their spans, counters and profiles to a directory next
+to the report in flush() after each task, and the parent merges them.
+
+The numbered scripts have no argument parser, so a run can also be asked
+for through the environment:
+    SCRAPING_TASK_TRACE=traces/     (a directory, or a .json path)
+    SCRAPING_TASK_PROFILE=sample
+
+Usage:
+    python -m scraping_task.batch_extract --trace-report trace.json --profile sample
+    SCRAPING_TASK_TRACE=traces/ python 1.py
+    python -m scraping_task.tracing trace.json --pdf 05_2024.pdf
+"""
+import argparse
+import contextlib
+import cProfile
+import datetime
+import itertools
+import json
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+TRACE_ENV = "SCRAPING_TASK_TRACE"
+PROFILE_ENV = "SCRAPING_TASK_PROFILE"
+# Set for worker processes while a run is active
+_SPILL_ENV = "SCRAPING_TASK_TRACE_SPILL"
+_SPILL_PROFILE_ENV = "SCRAPING_TASK_TRACE_SPILL_PROFILE"
+
+PROFILE_MODES = ("cprofile", "sample")
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Attributes inherited by nested spans, so a render knows its PDF and page
+CONTEXT_ATTRS = ("pdf", "page", "url")
+# Spans listed in the report's "slowest" section
+SLOWEST_SPANS = ("pdf", "page", "download", "fetch")
+TOP_N = 25
+
+# Innermost frames of a thread that is only waiting (pool workers, queues, sockets)
+_IDLE_FILES = ("threading.py", "queue.py", "thread.py", "pool.py", "selectors.py", "connection.py", "socket.py",
+               "ssl.py")
+
+
+class _NullSpan:
+    """What span() returns while tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed section; use as a context manager. set() adds attributes while it is open."""
+
+    __slots__ = ("tracer", "id", "parent", "name", "attrs", "context", "start", "thread")
+
+    def __init__(self, tracer, name, parent, attrs):
+        self.tracer = tracer
+        self.id = tracer.new_id()
+        self.parent = parent if parent is not None else tracer.current()
+        self.name = name
+        self.attrs = attrs
+        self.context = dict(self.parent.context) if self.parent is not None else {}
+        self.context.update((key, attrs[key]) for key in CONTEXT_ATTRS if key in attrs)
+        self.start = None
+        self.thread = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        self.context.update((key, attrs[key]) for key in CONTEXT_ATTRS if key in attrs)
+
+    def __enter__(self):
+        self.thread = threading.get_ident()
+        self.tracer.push(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.tracer.pop(self)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self, end)
+        return False
+
+
+class Tracer:
+    """
+    The spans, counters and profile of one run (or of one worker process's
+    share of it, when `worker` is set).
+    """
+
+    def __init__(self, name, report_path=None, profile=None, spill_dir=None, worker=False,
+                 sample_interval=DEFAULT_SAMPLE_INTERVAL):
+        if profile not in (None,) + PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {profile!r} (expected one of {PROFILE_MODES})")
+        self.name = name
+        self.report_path = report_path
+        self.profile = profile
+        self.spill_dir = spill_dir
+        self.worker = worker
+        self.sample_interval = sample_interval
+        self.pid = os.getpid()
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = Counter()
+        self.pdf_counters = defaultdict(Counter)
+        self.samples = Counter()  # (stage, frame) -> samples
+        self.depth = 1
+        self._ids = itertools.count(1)
+        self._stacks = {}  # thread ident -> open spans, also read by the sampler
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._sampler = None
+        self._stop = threading.Event()
+
+    # Spans and counters
+
+    def new_id(self):
+        return f"{self.pid}:{next(self._ids)}"
+
+    def current(self):
+        stack = self._stacks.get(threading.get_ident())
+        return stack[-1] if stack else None
+
+    def push(self, span):
+        self._stacks.setdefault(span.thread, []).append(span)
+
+    def pop(self, span):
+        stack = self._stacks.get(span.thread)
+        if stack and stack[-1] is span:
+            stack.pop()
+        elif stack and span in stack:
+            stack.remove(span)
+
+    def record(self, span, end):
+        entry = {
+            "id": span.id,
+            "parent": span.parent.id if span.parent is not None else None,
+            "name": span.name,
+            "start": round(self.started_at + (span.start - self.started), 6),
+            "seconds": end - span.start,
+            "thread": f"{self.pid}:{span.thread}",
+            "context": span.context,
+            "attrs": span.attrs,
+        }
+        with self._lock:
+            self.spans.append(entry)
+
+    def count(self, name, n=1):
+        span = self.current()
+        pdf = span.context.get("pdf") if span is not None else None
+        with self._lock:
+            self.counters[name] += n
+            if pdf is not None:
+                self.pdf_counters[pdf][name] += n
+
+    # Profiling
+
+    def start_profile(self):
+        if self.profile == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.profile == "sample":
+            self._sampler = threading.Thread(target=self._sample_loop, name="trace-sampler", daemon=True)
+            self._sampler.start()
+
+    def stop_profile(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.sample_interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                if filename in _IDLE_FILES:
+                    continue
+                try:
+                    stage = self._stacks[ident][-1].name
+                except (KeyError, IndexError):  # no open span, or it closed meanwhile
+                    stage = "-"
+                self.samples[(stage, f"{code.co_name} ({filename}:{frame.f_lineno})")] += 1
+
+    # Worker processes
+
+    def spill(self):
+        """Append this worker's spans, counters and samples to the spill directory and forget them."""
+        with self._lock:
+            spans, self.spans = self.spans, []
+            counters, self.counters = self.counters, Counter()
+            pdf_counters, self.pdf_counters = self.pdf_counters, defaultdict(Counter)
+        samples, self.samples = self.samples, Counter()
+        part = {"spans": spans, "counters": counters, "pdf_counters": pdf_counters,
+                "samples": [[stage, frame, n] for (stage, frame), n in samples.items()]}
+        with open(os.path.join(self.spill_dir, f"worker-{self.pid}.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(part, default=str) + "\n")
+        if self._profiler is not None:
+            # dump_stats disables the profiler; the stats keep accumulating once re-enabled
+            self._profiler.dump_stats(os.path.join(self.spill_dir, f"worker-{self.pid}.prof"))
+            self._profiler.enable()
+
+    def merge_spilled(self):
+        """Fold the workers' spilled spans, counters and samples into this run; returns the .prof paths."""
+        profiles = []
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return profiles
+        for filename in sorted(os.listdir(self.spill_dir)):
+            path = os.path.join(self.spill_dir, filename)
+            if filename.endswith(".prof"):
+                profiles.append(path)
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    part = json.loads(line)
+                    self.spans.extend(part["spans"])
+                    self.counters.update(part["counters"])
+                    for pdf, counters in part["pdf_counters"].items():
+                        self.pdf_counters[pdf].update(counters)
+                    for stage, frame, n in part["samples"]:
+                        self.samples[(stage, frame)] += n
+        return profiles
+
+    # Report
+
+    def report(self, profiles=()):
+        """The run's JSON-ready report."""
+        wall = time.perf_counter() - self.started
+        by_id = {span["id"]: span for span in self.spans}
+        child_seconds = Counter()
+        for span in self.spans:
+            parent = by_id.get(span["parent"])
+            # Work handed to another thread overlaps its parent rather than dividing it
+            if parent is not None and parent["thread"] == span["thread"]:
+                child_seconds[parent["id"]] += span["seconds"]
+
+        stages = {}
+        pdfs = defaultdict(lambda: {"seconds": 0.0, "stages": Counter()})
+        for span in self.spans:
+            self_seconds = max(0.0, span["seconds"] - child_seconds[span["id"]])
+            stage = stages.setdefault(span["name"], {"count": 0, "seconds": 0.0, "self_seconds": 0.0,
+                                                     "max_ms": 0.0})
+            stage["count"] += 1
+            stage["seconds"] += span["seconds"]
+            stage["self_seconds"] += self_seconds
+            stage["max_ms"] = max(stage["max_ms"], span["seconds"] * 1000)
+            pdf = span["context"].get("pdf")
+            if pdf is not None:
+                pdfs[pdf]["stages"][span["name"]] += self_seconds
+                if span["name"] == "pdf":
+                    pdfs[pdf]["seconds"] += span["seconds"]
+
+        traced = sum(stage["self_seconds"] for stage in stages.values()) or 1.0
+        for stage in stages.values():
+            stage["mean_ms"] = stage["seconds"] * 1000 / stage["count"]
+            stage["share"] = stage["self_seconds"] / traced
+
+        by_pdf = {}
+        for pdf in sorted(set(pdfs) | set(self.pdf_counters)):
+            entry = pdfs[pdf]
+            by_pdf[pdf] = {
+                # PDFs extracted page by page have no "pdf" span; their stages add up instead
+                "seconds": entry["seconds"] or sum(entry["stages"].values()),
+                "stages": dict(entry["stages"].most_common()),
+                "counters": dict(self.pdf_counters.get(pdf, {})),
+            }
+
+        slowest = sorted((span for span in self.spans if span["name"] in SLOWEST_SPANS),
+                         key=lambda span: span["seconds"], reverse=True)[:TOP_N]
+        report = {
+            "run": self.name,
+            "started": datetime.datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "wall_seconds": wall,
+            "argv": sys.argv,
+            "spans": len(self.spans),
+            "stages": dict(sorted(stages.items(), key=lambda item: item[1]["self_seconds"], reverse=True)),
+            "counters": dict(self.counters.most_common()),
+            "by_pdf": by_pdf,
+            "slowest": [{"name": span["name"], "seconds": span["seconds"], **span["context"], **span["attrs"]}
+                        for span in slowest],
+        }
+        if self.profile == "cprofile":
+            report["profile"] = self._cprofile_report(profiles)
+        elif self.profile == "sample":
+            report["profile"] = self._sample_report()
+        return report
+
+    def _cprofile_report(self, profiles):
+        stats = pstats.Stats(self._profiler)
+        for path in profiles:
+            stats.add(path)
+        stats_path = os.path.splitext(self.report_path)[0] + ".prof"
+        stats.dump_stats(stats_path)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_N]
+        return {
+            "mode": "cprofile",
+            "stats_file": stats_path,
+            "top": [{"function": f"{name} ({os.path.basename(filename)}:{line})", "calls": calls,
+                     "self_seconds": self_seconds, "cumulative_seconds": cumulative}
+                    for (filename, line, name), (_, calls, self_seconds, cumulative, _) in top],
+        }
+
+    def _sample_report(self):
+        total = sum(self.samples.values()) or 1
+        by_stage = Counter()
+        by_frame = Counter()
+        for (stage, frame), n in self.samples.items():
+            by_stage[stage] += n
+            by_frame[frame] += n
+        return {
+            "mode": "sample",
+            "interval_ms": self.sample_interval * 1000,
+            "samples": sum(self.samples.values()),
+            "by_stage": {stage: n / total for stage, n in by_stage.most_common()},
+            "top": [{"frame": frame, "samples": n, "share": n / total} for frame, n in by_frame.most_common(TOP_N)],
+        }
+
+
+_tracer = None
+
+
+def enabled():
+    """Whether a run (or a worker's share of one) is being traced."""
+    return _tracer is not None
+
+
+def span(name, parent=None, **attrs):
+    """
+    Context manager timing one stage. `parent` is a span from another
+    thread (see current()) for work handed to a pool; by default the
+    innermost open span of this thread.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return Span(tracer, name, parent, attrs)
+
+
+def count(name, n=1):
+    """Add `n` to a counter (and to the current PDF's counter, inside a pdf-attributed span)."""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.count(name, n)
+
+
+def current():
+    """This thread's innermost open span, to pass as another thread's parent (None when off)."""
+    tracer = _tracer
+    return None if tracer is None else tracer.current()
+
+
+def _report_path(name, report_path):
+    filename = f"trace_{name}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    if not report_path:
+        return filename
+    if os.path.isdir(report_path) or report_path.endswith(("/", os.sep)):
+        os.makedirs(report_path, exist_ok=True)
+        return os.path.join(report_path, filename)
+    return report_path
+
+
+def start(name, report_path=None, profile=None, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+    """
+    Start tracing a run, if a report path or profile mode is given here or
+    in the environment; returns the Tracer, or None when tracing stays off.
+    Starting inside a running trace joins it (finish() then only writes
+    the report once the outermost run finishes).
+    """
+    global _tracer
+    report_path = report_path or os.environ.get(TRACE_ENV)
+    profile = profile or os.environ.get(PROFILE_ENV) or None
+    if _tracer is not None:
+        if not _tracer.worker:
+            _tracer.depth += 1
+        return _tracer
+    if not report_path and not profile:
+        return None
+
+    report_path = _report_path(name, report_path)
+    spill_dir = tempfile.mkdtemp(prefix=".trace-", dir=os.path.dirname(os.path.abspath(report_path)))
+    _tracer = Tracer(name, report_path, profile, spill_dir, sample_interval=sample_interval)
+    os.environ[_SPILL_ENV] = spill_dir
+    os.environ[_SPILL_PROFILE_ENV] = profile or ""
+    _tracer.start_profile()
+    return _tracer
+
+
+def finish():
+    """Stop the run started by start(), write its report and return it (None if tracing was off)."""
+    global _tracer
+    tracer = _tracer
+    if tracer is None or tracer.worker:
+        return None
+    tracer.depth -= 1
+    if tracer.depth:
+        return None
+
+    tracer.stop_profile()
+    _tracer = None
+    os.environ.pop(_SPILL_ENV, None)
+    os.environ.pop(_SPILL_PROFILE_ENV, None)
+    try:
+        report = tracer.report(tracer.merge_spilled())
+    finally:
+        shutil.rmtree(tracer.spill_dir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(tracer.report_path)), exist_ok=True)
+    tmp_path = tracer.report_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1, default=str)
+    os.replace(tmp_path, tracer.report_path)
+    print(f"Trace report written to {tracer.report_path}")
+    return report
+
+
+@contextlib.contextmanager
+def run(name, report_path=None, profile=None):
+    """start() and finish() around a block."""
+    start(name, report_path, profile)
+    try:
+        yield
+    finally:
+        finish()
+
+
+def flush():
+    """In a pool worker, hand the spans recorded so far to the parent; call after each task."""
+    tracer = _tracer
+    if tracer is not None and tracer.worker:
+        tracer.spill()
+
+
+def add_arguments(parser):
+    """--trace-report and --profile, for the tools' parsers."""
+    parser.add_argument("--trace-report", default=None, metavar="PATH",
+                        help=f"Write a JSON timing report here (a directory gets a timestamped file; "
+                             f"default: ${TRACE_ENV})")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default=None,
+                        help=f"Also profile the run (implies a report; default: ${PROFILE_ENV})")
+
+
+def run_from_args(args, name):
+    """run() with the options added by add_arguments."""
+    return run(name, args.trace_report, args.profile)
+
+
+def _worker_tracer(spill_dir, profile):
+    tracer = Tracer("worker", profile=profile or None, spill_dir=spill_dir, worker=True)
+    tracer.start_profile()
+    return tracer
+
+
+def _after_fork():
+    """A forked pool worker starts its own share of the parent's run."""
+    global _tracer
+    if _tracer is not None:
+        _tracer = _worker_tracer(_tracer.spill_dir, _tracer.profile)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+# Spawned pool workers find the run through the environment
+if os.environ.get(_SPILL_ENV) and os.path.isdir(os.environ[_SPILL_ENV]):
+    _tracer = _worker_tracer(os.environ[_SPILL_ENV], os.environ.get(_SPILL_PROFILE_ENV))
+
+
+def summarise(report, pdf=None, top=10):
+    """Printable summary of a report: the stages and slowest spans, or one PDF's breakdown."""
+    lines = [f"{report['run']} started {report['started']}, {report['wall_seconds']:.1f} s wall, "
+             f"{report['spans']} spans"]
+    if pdf is not None:
+        entry = report["by_pdf"].get(pdf)
+        if entry is None:
+            return f"No spans for {pdf} in this report"
+        lines.append(f"\n{pdf}: {entry['seconds']:.2f} s")
+        total = sum(entry["stages"].values()) or 1.0
+        lines += [f"  {name:<14} {seconds:8.3f} s  {seconds / total:6.1%}" for name, seconds in entry["stages"].items()]
+        lines += [f"  {name}: {value}" for name, value in entry["counters"].items()]
+        return "\n".join(lines)
+
+    lines.append(f"\n{'stage':<14} {'count':>7} {'total s':>9} {'self s':>9} {'mean ms':>9} {'share':>7}")
+    for name, stage in report["stages"].items():
+        lines.append(f"{name:<14} {stage['count']:>7} {stage['seconds']:>9.2f} {stage['self_seconds']:>9.2f} "
+                     f"{stage['mean_ms']:>9.1f} {stage['share']:>7.1%}")
+    if report["counters"]:
+        lines.append("\ncounters: " + ", ".join(f"{name}={value}" for name, value in report["counters"].items()))
+    if report["slowest"]:
+        lines.append("\nslowest:")
+        for entry in report["slowest"][:top]:
+            where = ", ".join(f"{key}={entry[key]}" for key in CONTEXT_ATTRS if key in entry)
+            lines.append(f"  {entry['name']:<9} {entry['seconds']:8.2f} s  {where}")
+    profile = report.get("profile")
+    if profile:
+        lines.append(f"\n{profile['mode']} profile:")
+        if profile["mode"] == "cprofile":
+            lines += [f"  {entry['self_seconds']:8.2f} s self  {entry['function']}" for entry in profile["top"][:top]]
+        else:
+            lines += [f"  {entry['share']:6.1%}  {entry['frame']}" for entry in profile["top"][:top]]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a timing report written with --trace-report.")
+    parser.add_argument("report", help="JSON report")
+    parser.add_argument("--pdf", default=None, help="Show one PDF's stage breakdown and counters")
+    parser.add_argument("--top", type=int, default=10, help="Slowest spans and profile entries to list")
+    args = parser.parse_args()
+    with open(args.report, encoding="utf-8") as f:
+        report = json.load(f)
+    print(summarise(report, args.pdf, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Threshold tuning from one feature pass over the corpus.
+
+The notebooks' constants (the minimum area "LOWERED from 5% to 2%", the
+aspect range, the 30% tolerance around 535x369, is_likely_plot's edge,
+colour and line bins) were each tried by re-running the whole extraction.
+Here the expensive part runs once: `collect` renders or decodes every
+candidate with deliberately loose limits and stores its measurements and
+feature row in an .npz table. `evaluate` then applies the extractor's own
+decision rules (candidate_mask in chart_extractor / image_extractor) to the
+whole table for every combination of a parameter grid at once, with the
+grid as a broadcast axis, and scores each combination's per-PDF counts
+against accepted_images_count in Reference.csv or df_8.csv the way the
+benchmark does: charts beyond the reference count are false positives,
+missing ones are misses.
+
+The result is the precision/recall frontier: the settings that no other
+setting beats on both. Grid values outside the limits a table was collected
+with are refused, since candidates beyond them were never measured.
+
+Charts are modelled as 5_5.ipynb wrote them (whole-page renders), which is
+also what region rendering reproduces.
+
+Usage:
+    python -m scraping_task.tuning collect --extractor charts --output tuning_charts.npz
+    python -m scraping_task.tuning evaluate tuning_charts.npz \\
+        --grid min_area_ratio=0.005:0.05:0.005 --grid max_density=0.3,0.4,0.5 --grid min_axis_lines=1:5
+    python -m scraping_task.tuning evaluate tuning_images.npz --grid min_plot_score=3:7 \\
+        --grid edge_ratio_bins=0.1/0.05/0.02,0.08/0.04/0.02
+"""
+import argparse
+import io
+import json
+import math
+import os
+import time
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from scraping_task import benchmark, chart_extractor, features, image_extractor, layout, raster_cache
+
+EXTRACTORS = {"charts": chart_extractor, "images": image_extractor}
+
+# Limits candidates are collected with; tuned values must stay inside them
+COLLECT_LIMITS = {
+    "charts": {"max_contours": 30, "min_area_ratio": 0.005, "max_area_ratio": 1.0, "min_aspect_ratio": 0.1,
+               "max_aspect_ratio": 8.0, "min_density": 0.0, "max_density": 1.0},
+    "images": {"min_size": 100, "min_aspect_ratio": 0.1, "max_aspect_ratio": 8.0},
+}
+
+# Candidates x settings decided per step of evaluate()
+_CHUNK_CELLS = 20_000_000
+
+
+def _chart_candidates(page, params, limits, rasters=None):
+    """Measurements and feature rows of one page's contours within `limits`."""
+    zoom = params["zoom"]
+    page_pixels = (page.rect * fitz.Matrix(zoom, zoom)).irect
+    total_area = page_pixels.width * page_pixels.height
+    img_cv = rasters.page(page, zoom) if rasters is not None else chart_extractor._render(page, zoom)[0]
+    binary = chart_extractor._threshold(img_cv, params)
+
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    areas = np.array([cv2.contourArea(contour) for contour in contours])
+    rows, feats = [], []
+    for rank, i in enumerate(layout.largest(areas, limits["max_contours"])):
+        contour, area = contours[i], areas[i]
+        if area < total_area * limits["min_area_ratio"] or area > total_area * limits["max_area_ratio"]:
+            continue
+        x, y, w, h = (int(v) for v in cv2.boundingRect(contour))
+        if not limits["min_aspect_ratio"] <= w / h <= limits["max_aspect_ratio"] or (w > 3000 and h < 800):
+            continue
+        density = np.count_nonzero(binary[y:y + h, x:x + w]) / (w * h)
+        if not limits["min_density"] <= density <= limits["max_density"]:
+            continue
+        rows.append((page.number, rank, area, total_area, w, h, density))
+        feats.append(features.image_features(img_cv[y:y + h, x:x + w], max_side=params["feature_max_side"]))
+    return rows, feats
+
+
+def _image_candidates(page, params, limits, rasters=None):
+    """Sizes and feature rows of one page's embedded images within `limits`."""
+    rows, feats = [], []
+    for img in page.get_images(full=True):
+        try:
+            image = Image.open(io.BytesIO(page.parent.extract_image(img[0])["image"]))
+            width, height = image.size
+            if min(width, height) < limits["min_size"]:
+                continue
+            if not limits["min_aspect_ratio"] <= width / height <= limits["max_aspect_ratio"]:
+                continue
+            feats.append(features.image_features(image, max_side=params["feature_max_side"]))
+        except Exception as e:
+            print(f"Skipping image xref {img[0]} on page {page.number + 1}: {e}")
+            continue
+        rows.append((page.number, width, height))
+    return rows, feats
+
+
+_COLLECTORS = {
+    "charts": (_chart_candidates, ("page", "rank", "area", "total_area", "width", "height", "density")),
+    "images": (_image_candidates, ("page", "width", "height")),
+}
+
+
+def collect(extractor="charts", corpora=benchmark.DEFAULT_CORPORA, limit=None, params=None, raster_cache_dir=None,
+            verbose=True):
+    """
+    Measure every candidate of every page of the corpus once. Returns the
+    table evaluate() works on: a dict of per-candidate columns, the feature
+    matrix, the PDF index of every candidate and the PDF names.
+    """
+    module = EXTRACTORS[extractor]
+    params = {**module.DEFAULT_PARAMS, **(params or {})}
+    limits = COLLECT_LIMITS[extractor]
+    measure, columns = _COLLECTORS[extractor]
+    rasters = raster_cache.open_cache(raster_cache_dir) if raster_cache_dir else None
+
+    pdf_names, pdf_index, rows, feats = [], [], [], []
+    for corpus, pdf_file in benchmark.list_corpus(corpora, limit):
+        started = time.perf_counter()
+        found = 0
+        try:
+            with fitz.open(os.path.join(corpus, pdf_file)) as doc:
+                for page in doc:
+                    page_rows, page_feats = measure(page, params, limits, rasters)
+                    rows.extend(page_rows)
+                    feats.extend(page_feats)
+                    found += len(page_rows)
+        except Exception as e:
+            print(f"Error reading {corpus}/{pdf_file}: {e}")
+            continue
+        pdf_index.extend([len(pdf_names)] * found)
+        pdf_names.append(pdf_file)
+        if verbose:
+            print(f"{corpus}/{pdf_file}: {found} candidates in {time.perf_counter() - started:.1f}s")
+
+    table = {name: np.array([row[i] for row in rows], dtype=np.float64) for i, name in enumerate(columns)}
+    table["features"] = np.vstack(feats) if feats else np.empty((0, len(features.FEATURE_NAMES)))
+    table["pdf"] = np.array(pdf_index, dtype=np.int64)
+    table["pdf_names"] = np.array(pdf_names)
+    meta = {"extractor": extractor, "limits": limits, "corpora": list(corpora),
+            "params": {k: v for k, v in params.items() if isinstance(v, (int, float, str, bool, type(None)))},
+            "feature_names": list(features.FEATURE_NAMES)}
+    table["meta"] = np.array(json.dumps(meta))
+    return table
+
+
+def save_table(path, table):
+    np.savez_compressed(path, **table)
+
+
+def load_table(path):
+    with np.load(path, allow_pickle=False) as data:
+        table = {name: data[name] for name in data.files}
+    meta = json.loads(str(table.pop("meta")))
+    if meta["feature_names"] != list(features.FEATURE_NAMES):
+        raise ValueError(f"{path} was collected with different features; collect it again")
+    return table, meta
+
+
+def _parse_value(text):
+    if text.lower() in ("true", "false"):
+        return text.lower() == "true"
+    if "/" in text:
+        return tuple(float(part) for part in text.split("/"))
+    return float(text) if any(c in text for c in ".e") else int(text)
+
+
+def parse_grid(specs):
+    """
+    {name: [values]} from "name=start:stop[:step]" (stop included),
+    "name=v1,v2,..." or, for the score bins, "name=a/b/c,d/e/f".
+    """
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if not values:
+            raise ValueError(f"Grid entries look like name=values, got {spec!r}")
+        if ":" in values:
+            parts = [_parse_value(v) for v in values.split(":")]
+            start, stop, step = (parts + [1])[:3]
+            count = int(math.floor((stop - start) / step + 1e-9)) + 1
+            grid[name] = [round(start + i * step, 10) for i in range(count)]
+        else:
+            grid[name] = [_parse_value(v) for v in values.split(",")]
+    return grid
+
+
+def _check_grid(grid, meta, module):
+    limits = meta["limits"]
+    for name, values in grid.items():
+        if name not in module.DEFAULT_PARAMS:
+            raise ValueError(f"{name} is not a {meta['extractor']} parameter")
+        if name.startswith("min_") and name in limits and min(values) < limits[name]:
+            raise ValueError(f"{name} below {limits[name]}, the limit the table was collected with")
+        if (name.startswith("max_") and name in limits) and max(values) > limits[name]:
+            raise ValueError(f"{name} above {limits[name]}, the limit the table was collected with")
+
+
+def evaluate(table, meta, grid, reference):
+    """
+    Count accuracy of every combination of `grid` ({name: [values]}, other
+    parameters at their defaults) against `reference` ({pdf_filename:
+    accepted count}). Returns arrays over the combinations: found,
+    expected, matched, exact (PDFs whose count matches), precision and
+    recall, plus the grid index of each combination.
+    """
+    module = EXTRACTORS[meta["extractor"]]
+    _check_grid(grid, meta, module)
+    base = {**module.DEFAULT_PARAMS, **meta["params"]}
+    names = list(grid)
+    sizes = [len(grid[name]) for name in names]
+    combinations = int(np.prod(sizes)) if names else 1
+
+    # Only PDFs with a reference count are scored; candidates -> scored PDF one-hot
+    expected = np.array([reference.get(benchmark.reference_name(str(f)), -1) for f in table["pdf_names"]])
+    scored = np.flatnonzero(expected >= 0)
+    column_of = np.full(len(expected), -1)
+    column_of[scored] = np.arange(len(scored))
+    candidate_columns = column_of[table["pdf"]]
+    onehot = np.zeros((len(candidate_columns), len(scored)), dtype=np.float32)
+    keep = candidate_columns >= 0
+    onehot[np.flatnonzero(keep), candidate_columns[keep]] = 1
+    expected = expected[scored].astype(np.float32)
+
+    candidates = {name: values for name, values in table.items() if values.ndim == 1 and name != "pdf_names"}
+    feats = table["features"]
+    found = np.empty(combinations)
+    matched = np.empty(combinations)
+    exact = np.empty(combinations, dtype=np.int64)
+
+    step = max(1, _CHUNK_CELLS // max(1, len(candidate_columns)))
+    for start in range(0, combinations, step):
+        stop = min(combinations, start + step)
+        index = np.unravel_index(np.arange(start, stop), sizes) if names else ()
+        params = dict(base)
+        for name, idx in zip(names, index):
+            values = grid[name]
+            if isinstance(values[0], tuple):
+                columns = np.array(values, dtype=np.float64)[idx]
+                params[name] = tuple(columns[:, k:k + 1] for k in range(columns.shape[1]))
+            else:
+                params[name] = np.array(values)[idx][:, None]
+        mask = np.broadcast_to(module.candidate_mask(candidates, feats, params), (stop - start, len(onehot)))
+        counts = mask.astype(np.float32) @ onehot
+        found[start:stop] = counts.sum(axis=1)
+        matched[start:stop] = np.minimum(counts, expected).sum(axis=1)
+        exact[start:stop] = (counts == expected).sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(found > 0, matched / found, np.nan)
+    return {
+        "names": names,
+        "sizes": sizes,
+        "pdfs_scored": len(scored),
+        "expected": float(expected.sum()),
+        "found": found,
+        "matched": matched,
+        "exact": exact,
+        "precision": precision,
+        "recall": matched / expected.sum() if expected.sum() else np.full(combinations, np.nan),
+    }
+
+
+def frontier(result):
+    """Indices of the combinations no other one beats on both precision and recall, by recall."""
+    precision = np.nan_to_num(result["precision"], nan=0.0)
+    recall = np.nan_to_num(result["recall"], nan=0.0)
+    # Highest recall first, then highest precision; keep each point that raises the best precision so far
+    order = np.lexsort((-precision, -recall))
+    best = -1.0
+    points = []
+    for i in order:
+        if precision[i] > best:
+            points.append(i)
+            best = precision[i]
+    return points[::-1]
+
+
+def describe(result, grid, i):
+    """One combination's settings and scores as a JSON-ready dict."""
+    index = np.unravel_index(i, result["sizes"]) if result["names"] else ()
+    precision, recall = result["precision"][i], result["recall"][i]
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+    return {
+        "params": {name: grid[name][k] for name, k in zip(result["names"], index)},
+        "precision": None if np.isnan(precision) else round(float(precision), 4),
+        "recall": round(float(recall), 4),
+        "f1": round(float(f1), 4),
+        "exact_matches": int(result["exact"][i]),
+        "images_found": int(result["found"][i]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect candidate features once, then score threshold grids.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    collect_parser = commands.add_parser("collect", help="Measure every candidate of the corpus")
+    collect_parser.add_argument("--extractor", choices=sorted(EXTRACTORS), default="charts")
+    collect_parser.add_argument("--corpus", nargs="+", default=benchmark.DEFAULT_CORPORA)
+    collect_parser.add_argument("--limit", type=int, default=None, help="Only the first N PDFs of each corpus")
+    collect_parser.add_argument("--raster-cache-dir", default=None, help="charts: reuse whole-page renders")
+    collect_parser.add_argument("--output", default=None, help="Table to write (default: tuning_<extractor>.npz)")
+
+    evaluate_parser = commands.add_parser("evaluate", help="Score a parameter grid against the reference counts")
+    evaluate_parser.add_argument("table")
+    evaluate_parser.add_argument("--grid", action="append", default=[],
+                                 help="name=start:stop[:step] or name=v1,v2 (repeatable)")
+    evaluate_parser.add_argument("--reference", default="Reference.csv",
+                                 help="CSV with pdf_filename and accepted_images_count (Reference.csv or df_8.csv)")
+    evaluate_parser.add_argument("--output", default=None, help="Write the defaults' score and the frontier as JSON")
+    args = parser.parse_args()
+
+    if args.command == "collect":
+        output = args.output or f"tuning_{args.extractor}.npz"
+        started = time.perf_counter()
+        table = collect(args.extractor, args.corpus, args.limit, raster_cache_dir=args.raster_cache_dir)
+        save_table(output, table)
+        print(f"{len(table['pdf'])} candidates from {len(table['pdf_names'])} PDFs in "
+              f"{time.perf_counter() - started:.1f}s, saved to {output}")
+        return
+
+    table, meta = load_table(args.table)
+    reference = benchmark.load_reference(args.reference)
+    grid = parse_grid(args.grid)
+
+    defaults = describe(evaluate(table, meta, {}, reference), {}, 0)
+    started = time.perf_counter()
+    result = evaluate(table, meta, grid, reference)
+    seconds = time.perf_counter() - started
+    points = [describe(result, grid, i) for i in frontier(result)]
+
+    print(f"{len(result['found'])} settings x {len(table['pdf'])} candidates scored on {result['pdfs_scored']} PDFs "
+          f"in {seconds:.2f}s")
+    print(f"defaults: precision {defaults['precision']}, recall {defaults['recall']}, "
+          f"exact {defaults['exact_matches']}/{result['pdfs_scored']}")
+    print("frontier:")
+    for point in points:
+        print(f"  precision {point['precision']}, recall {point['recall']}, f1 {point['f1']}, "
+              f"exact {point['exact_matches']}: {point['params']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"table": args.table, "reference": args.reference, "grid": grid, "defaults": defaults,
+                       "frontier": points}, f, indent=1)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
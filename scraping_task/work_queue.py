@@ -0,0 +1,633 @@
+"""
+Shared, lease-based work queue for extraction runs on any number of nodes.
+
+batch_extract ties a run to one process pool looping over os.listdir, so a
+re-extraction after a detector change is bounded by one machine and a crash
+starts it over. Here a run is a set of jobs (one per PDF, or per page) in a
+SQLite file on a shared volume. Workers anywhere lease a few jobs at a time
+in a write transaction, renew their leases from a heartbeat thread while
+they work, write the chart images to the run's output directory and mark
+the jobs done with the files they wrote. A lease that is not renewed
+expires and its job is handed to the next worker that asks, so a crashed or
+killed worker costs only the jobs it held; jobs already done are never
+leased again. A job that keeps failing (or keeps losing its worker) is
+given up after max_attempts.
+
+Page jobs keep their charts in a staging directory until every page of the
+PDF is done. The transaction that completes the last page adds a finalise
+job for the PDF, leased like any other: its worker numbers the staged
+charts in page order, as batch_extract does, moves them into place and
+records the PDF in the same transaction that completes the job. A worker
+that dies while finalising loses only its lease, and two workers never
+publish the same PDF. Staged paths are stored relative to the output
+directory, so nodes that mount the volume elsewhere can finalise too.
+
+A run's name defaults to the extractor and a digest of its parameters, so
+submitting again after the monthly download only adds the new PDFs, and a
+detector change starts a fresh run. collect is the single writer of
+pdf_image_data.csv (and the catalogue store), for PDFs finished since the
+last collect.
+
+The database uses SQLite's rollback journal rather than WAL, which needs
+shared memory and so does not work across machines; the shared volume must
+support POSIX locks (NFSv4, SMB). On one machine any number of --processes
+share it as well.
+
+Usage:
+    python -m scraping_task.work_queue submit --db queue.sqlite --by-page
+    python -m scraping_task.work_queue work --db queue.sqlite --processes 4     (on every node)
+    python -m scraping_task.work_queue status --db queue.sqlite
+    python -m scraping_task.work_queue collect --db queue.sqlite --store catalogue.sqlite
+"""
+import argparse
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import fitz  # PyMuPDF
+
+from scraping_task import batch_extract, tracing
+from scraping_task.catalogue_store import CatalogueStore
+from scraping_task.result_cache import params_digest
+
+DEFAULT_DB_PATH = "work_queue.sqlite"
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_SECONDS = 10
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS runs (
+    name TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    run TEXT NOT NULL,
+    pdf_filename TEXT NOT NULL,
+    page INTEGER NOT NULL,             -- -1 for a whole-PDF job, -2 to finalise a PDF's page jobs
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    finished REAL,
+    UNIQUE (run, pdf_filename, page)
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (run, state, lease_expires);
+CREATE TABLE IF NOT EXISTS pdfs (
+    run TEXT NOT NULL,
+    pdf_filename TEXT NOT NULL,
+    files TEXT NOT NULL,
+    finished REAL NOT NULL,
+    collected INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run, pdf_filename)
+);
+"""
+
+# Job states
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+_WHOLE_PDF = -1
+_FINALISE = -2
+
+
+def worker_id():
+    """Host, process and a random suffix, so restarted workers never share an id."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _to_json(value):
+    """numpy scalars in extractor results (widths, flags) as plain numbers."""
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serialisable")
+
+
+def default_run_name(extractor, params):
+    return f"{extractor}-{params_digest(extractor, params)}"
+
+
+class WorkQueue:
+    """Runs, their jobs and the leases on them, in one SQLite file."""
+
+    def __init__(self, path=DEFAULT_DB_PATH, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Autocommit; write transactions are opened with BEGIN IMMEDIATE so leasing never races
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(_SCHEMA_SQL)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self):
+        """Context manager for one write transaction (BEGIN IMMEDIATE ... COMMIT)."""
+        return _Transaction(self.conn)
+
+    # Runs
+
+    def create_run(self, name, config):
+        """Register a run's configuration (extractor, params, directories); an existing run keeps its own."""
+        with self._write():
+            self.conn.execute("INSERT OR IGNORE INTO runs (name, config, created) VALUES (?, ?, ?)",
+                              (name, json.dumps(config, default=list), datetime.datetime.now().isoformat(timespec="seconds")))
+        return self.run_config(name)
+
+    def run_config(self, name):
+        row = self.conn.execute("SELECT config FROM runs WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"No run named {name!r} in {self.path}")
+        return json.loads(row["config"])
+
+    def runs(self):
+        return [row["name"] for row in self.conn.execute("SELECT name FROM runs ORDER BY created")]
+
+    def enqueue(self, run, items):
+        """Add (pdf_filename, page) jobs, page None for a whole PDF; existing ones are kept. Returns the number added."""
+        with self._write():
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO jobs (run, pdf_filename, page) VALUES (?, ?, ?)",
+                                  [(run, pdf_file, _WHOLE_PDF if page is None else page) for pdf_file, page in items])
+            return self.conn.total_changes - before
+
+    # Leases
+
+    def lease(self, run, worker, n=1):
+        """
+        Lease up to `n` jobs: pending ones first, then ones whose lease has
+        expired. Expired jobs that have used up their attempts are marked
+        failed instead. Returns dicts with id, pdf_filename, page (None for a
+        whole PDF, -2 for a PDF's finalise job) and attempts.
+        """
+        now = time.time()
+        with self._write():
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, error = COALESCE(error, 'lease expired'), worker = NULL "
+                "WHERE run = ? AND state = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, run, LEASED, now, self.max_attempts))
+            rows = self.conn.execute(
+                "SELECT id, pdf_filename, page, attempts FROM jobs "
+                "WHERE run = ? AND (state = ? OR (state = ? AND lease_expires < ?)) "
+                "ORDER BY state = ?, id LIMIT ?",
+                (run, PENDING, LEASED, now, LEASED, n)).fetchall()
+            self.conn.executemany(
+                "UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                [(LEASED, worker, now + self.lease_seconds, row["id"]) for row in rows])
+        return [{"id": row["id"], "pdf_filename": row["pdf_filename"],
+                 "page": None if row["page"] == _WHOLE_PDF else row["page"], "attempts": row["attempts"] + 1}
+                for row in rows]
+
+    def heartbeat(self, job_ids, worker):
+        """Renew this worker's leases on `job_ids`; returns the ids it no longer holds."""
+        if not job_ids:
+            return set()
+        expires = time.time() + self.lease_seconds
+        with self._write():
+            self.conn.executemany("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND state = ?",
+                                  [(expires, job_id, worker, LEASED) for job_id in job_ids])
+            held = {row["id"] for row in self.conn.execute(
+                f"SELECT id FROM jobs WHERE worker = ? AND state = ? AND id IN ({','.join('?' * len(job_ids))})",
+                [worker, LEASED, *job_ids])}
+        return set(job_ids) - held
+
+    def complete(self, run, job, worker, result, files=None):
+        """
+        Mark a leased job done with its result (JSON-serialisable). `files`
+        records a whole PDF's output filenames for collect. Completing the
+        last page job of a PDF queues its finalise job. Returns False,
+        changing nothing, if the lease was lost to another worker.
+        """
+        now = time.time()
+        with self._write():
+            cursor = self.conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = NULL, finished = ?, lease_expires = NULL "
+                "WHERE id = ? AND worker = ? AND state = ?",
+                (DONE, json.dumps(result, default=_to_json), now, job["id"], worker, LEASED))
+            if cursor.rowcount == 0:
+                return False
+            if files is not None:
+                self._record_pdf(run, job["pdf_filename"], files, now)
+            elif job["page"] is not None and job["page"] >= 0:
+                self._queue_finalise(run, job["pdf_filename"])
+        return True
+
+    def fail(self, job, worker, error):
+        """Give a job back after an error; it is retried until it has used max_attempts."""
+        with self._write():
+            self.conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?, worker = NULL, "
+                "lease_expires = NULL WHERE id = ? AND worker = ? AND state = ?",
+                (self.max_attempts, FAILED, PENDING, error, job["id"], worker, LEASED))
+
+    def release(self, job_ids, worker):
+        """Hand leased jobs back untouched (a worker shutting down)."""
+        with self._write():
+            self.conn.executemany(
+                "UPDATE jobs SET state = ?, worker = NULL, lease_expires = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND worker = ? AND state = ?", [(PENDING, job_id, worker, LEASED) for job_id in job_ids])
+
+    def retry_failed(self, run):
+        """Give failed jobs a fresh set of attempts; returns how many."""
+        with self._write():
+            return self.conn.execute("UPDATE jobs SET state = ?, attempts = 0 WHERE run = ? AND state = ?",
+                                     (PENDING, run, FAILED)).rowcount
+
+    # Page jobs
+
+    def _queue_finalise(self, run, pdf_filename):
+        """Add the PDF's finalise job once no page job is left; inside the completing transaction."""
+        left = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE run = ? AND pdf_filename = ? AND page >= 0 "
+                                 "AND state != ?", (run, pdf_filename, DONE)).fetchone()[0]
+        if left == 0:
+            self.conn.execute("INSERT OR IGNORE INTO jobs (run, pdf_filename, page) VALUES (?, ?, ?)",
+                              (run, pdf_filename, _FINALISE))
+
+    def page_results(self, run, pdf_filename):
+        """{page: result} of the PDF's page jobs, all of which are done once its finalise job exists."""
+        return {row["page"]: json.loads(row["result"]) for row in self.conn.execute(
+            "SELECT page, result FROM jobs WHERE run = ? AND pdf_filename = ? AND page >= 0 AND state = ?",
+            (run, pdf_filename, DONE))}
+
+    def record_pdf(self, run, pdf_filename, files):
+        with self._write():
+            self._record_pdf(run, pdf_filename, files, time.time())
+
+    def _record_pdf(self, run, pdf_filename, files, finished):
+        # A PDF is recorded once; replacing the row would make collect write it again
+        self.conn.execute("INSERT OR IGNORE INTO pdfs (run, pdf_filename, files, finished) VALUES (?, ?, ?, ?)",
+                          (run, pdf_filename, json.dumps(files), finished))
+
+    # Reads
+
+    def remaining(self, run):
+        """Jobs not yet done or failed."""
+        return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE run = ? AND state IN (?, ?)",
+                                 (run, PENDING, LEASED)).fetchone()[0]
+
+    def status(self, run):
+        counts = dict.fromkeys((PENDING, LEASED, DONE, FAILED), 0)
+        counts.update((row["state"], row["n"]) for row in self.conn.execute(
+            "SELECT state, COUNT(*) AS n FROM jobs WHERE run = ? GROUP BY state", (run,)))
+        workers = [dict(row) for row in self.conn.execute(
+            "SELECT worker, COUNT(*) AS jobs, MAX(lease_expires) AS lease_expires FROM jobs "
+            "WHERE run = ? AND state = ? GROUP BY worker", (run, LEASED))]
+        failures = [dict(row) for row in self.conn.execute(
+            "SELECT pdf_filename, page, attempts, error FROM jobs WHERE run = ? AND state = ? ORDER BY id",
+            (run, FAILED))]
+        pdfs = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(collected = 0), 0) FROM pdfs WHERE run = ?",
+                                 (run,)).fetchone()
+        return {"jobs": counts, "workers": workers, "failures": failures, "pdfs_done": pdfs[0],
+                "pdfs_uncollected": pdfs[1]}
+
+    def uncollected(self, run):
+        return [(row["pdf_filename"], json.loads(row["files"]), row["finished"]) for row in self.conn.execute(
+            "SELECT pdf_filename, files, finished FROM pdfs WHERE run = ? AND collected = 0 ORDER BY pdf_filename",
+            (run,))]
+
+    def mark_collected(self, run, pdf_files):
+        with self._write():
+            self.conn.executemany("UPDATE pdfs SET collected = 1 WHERE run = ? AND pdf_filename = ?",
+                                  [(run, pdf_file) for pdf_file in pdf_files])
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
+
+
+class _Heartbeat(threading.Thread):
+    """Renews the leases of the jobs a worker holds, on its own connection."""
+
+    def __init__(self, db_path, worker, lease_seconds):
+        super().__init__(name="work-queue-heartbeat", daemon=True)
+        self.db_path = db_path
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.held = set()
+        self.lost = set()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def hold(self, job_ids):
+        with self._lock:
+            self.held |= set(job_ids)
+
+    def drop(self, job_id):
+        with self._lock:
+            self.held.discard(job_id)
+
+    def run(self):
+        queue = WorkQueue(self.db_path, self.lease_seconds)
+        try:
+            while not self._stopping.wait(self.lease_seconds / 3):
+                with self._lock:
+                    held = sorted(self.held)
+                try:
+                    lost = queue.heartbeat(held, self.worker)
+                except sqlite3.Error as e:
+                    print(f"Heartbeat failed ({e}); retrying")
+                    continue
+                if lost:
+                    with self._lock:
+                        self.lost |= lost
+                    print(f"Lost the lease on {len(lost)} job(s); their results will be discarded")
+        finally:
+            queue.close()
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
+
+
+def _write_file(path, data):
+    """Write atomically, so a worker killed mid-write never leaves a truncated chart."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _staging_dir(run, pdf_file):
+    """A PDF's staging directory, relative to the output directory and with '/' separators."""
+    return f".pages/{run}/{os.path.splitext(pdf_file)[0]}"
+
+
+def _output_path(config, relative):
+    """Where this node sees a path relative to the run's output directory."""
+    return os.path.join(config["output_dir"], *relative.split("/"))
+
+
+def _run_pdf_job(queue, run, config, job, worker):
+    extractor = batch_extract.EXTRACTORS[config["extractor"]]
+    outputs = extractor["pdf"](os.path.join(config["pdf_dir"], job["pdf_filename"]), params=config["params"])
+    for filename, data in outputs:
+        _write_file(os.path.join(config["output_dir"], filename), data)
+    files = [filename for filename, _ in outputs]
+    return queue.complete(run, job, worker, {"files": files}, files=files)
+
+
+def _run_page_job(queue, run, config, job, worker):
+    """Extract one page into the staging directory; the PDF's finalise job names and publishes them."""
+    extractor = batch_extract.EXTRACTORS[config["extractor"]]
+    pdf_file, page = job["pdf_filename"], job["page"]
+    charts = extractor["page"](os.path.join(config["pdf_dir"], pdf_file), page, params=config["params"])
+
+    staging = _staging_dir(run, pdf_file)
+    os.makedirs(_output_path(config, staging), exist_ok=True)
+    stored = []
+    for k, chart in enumerate(charts):
+        staged = f"{staging}/p{page}_{k}"
+        _write_file(_output_path(config, staged), chart["image"])
+        stored.append({**{key: value for key, value in chart.items() if key != "image"}, "staged": staged})
+    return queue.complete(run, job, worker, {"charts": stored})
+
+
+def _run_finalise_job(queue, run, config, job, worker):
+    """Number a PDF's staged page charts in page order and move them into the output directory."""
+    extractor = batch_extract.EXTRACTORS[config["extractor"]]
+    pdf_file = job["pdf_filename"]
+    page_results = queue.page_results(run, pdf_file)
+    charts = []
+    for page in sorted(page_results):
+        page_charts = []
+        for chart in page_results[page]["charts"]:
+            with open(_output_path(config, chart["staged"]), "rb") as f:
+                page_charts.append({**chart, "image": f.read()})
+        charts.append(page_charts)
+    named = extractor["name"](pdf_file, charts)
+    for filename, data in named:
+        _write_file(os.path.join(config["output_dir"], filename), data)
+    files = [filename for filename, _ in named]
+    if not queue.complete(run, job, worker, {"files": files}, files=files):
+        return False
+    # Only the worker that completed the job removes the staged charts
+    staging = _output_path(config, _staging_dir(run, pdf_file))
+    shutil.rmtree(staging, ignore_errors=True)
+    try:
+        os.removedirs(os.path.dirname(staging))
+    except OSError:
+        pass  # other PDFs of the run are still in progress
+    return True
+
+
+def _job_label(job):
+    if job["page"] is None:
+        return job["pdf_filename"]
+    if job["page"] == _FINALISE:
+        return f"{job['pdf_filename']} (finalise)"
+    return f"{job['pdf_filename']} page {job['page'] + 1}"
+
+
+def work(db_path, run, worker=None, batch=1, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+         poll_seconds=DEFAULT_POLL_SECONDS, pdf_dir=None, output_dir=None, max_jobs=None):
+    """
+    Lease and run jobs of `run` until none are left (waiting for other
+    workers' leases to finish or expire). `pdf_dir`/`output_dir` override
+    the run's paths where this node mounts the shared volume elsewhere.
+    Returns the number of jobs completed.
+    """
+    worker = worker or worker_id()
+    queue = WorkQueue(db_path, lease_seconds, max_attempts)
+    config = queue.run_config(run)
+    config["pdf_dir"] = pdf_dir or config["pdf_dir"]
+    config["output_dir"] = output_dir or config["output_dir"]
+    os.makedirs(config["output_dir"], exist_ok=True)
+    run_page = _run_page_job if config["by_page"] else _run_pdf_job
+
+    heartbeat = _Heartbeat(db_path, worker, lease_seconds)
+    heartbeat.start()
+    completed = 0
+    jobs = []
+    try:
+        while max_jobs is None or completed < max_jobs:
+            jobs = queue.lease(run, worker, batch)
+            if not jobs:
+                if queue.remaining(run) == 0:
+                    break
+                # Other workers hold the rest; one of them may die and let its leases expire
+                time.sleep(poll_seconds)
+                continue
+            heartbeat.hold(job["id"] for job in jobs)
+            while jobs:
+                job = jobs.pop(0)
+                where = _job_label(job)
+                run_job = _run_finalise_job if job["page"] == _FINALISE else run_page
+                try:
+                    with tracing.span("job", pdf=job["pdf_filename"], page=job["page"]):
+                        done = run_job(queue, run, config, job, worker)
+                except Exception as e:
+                    queue.fail(job, worker, str(e))
+                    print(f"[{worker}] {where}: failed (attempt {job['attempts']}): {e}")
+                else:
+                    if done:
+                        completed += 1
+                        print(f"[{worker}] {where}: done")
+                    else:
+                        print(f"[{worker}] {where}: lease lost to another worker, result discarded")
+                heartbeat.drop(job["id"])
+    finally:
+        if jobs:
+            queue.release([job["id"] for job in jobs], worker)
+        heartbeat.stop()
+        queue.close()
+    return completed
+
+
+def _work_process(kwargs):
+    try:
+        return work(**kwargs)
+    finally:
+        tracing.flush()
+
+
+def submit(db_path, pdf_dir, output_dir, extractor="charts", params=None, by_page=False, run=None):
+    """Create (or extend) a run with a job for every PDF, or every page, in `pdf_dir`; returns (run, added)."""
+    params = {**batch_extract.EXTRACTORS[extractor]["defaults"], **(params or {})}
+    run = run or default_run_name(extractor, params)
+    with WorkQueue(db_path) as queue:
+        queue.create_run(run, {"extractor": extractor, "params": params, "by_page": by_page,
+                               "pdf_dir": pdf_dir, "output_dir": output_dir})
+        items = []
+        for pdf_file in batch_extract.list_pdfs(pdf_dir):
+            if not by_page:
+                items.append((pdf_file, None))
+                continue
+            with fitz.open(os.path.join(pdf_dir, pdf_file)) as doc:
+                pages = batch_extract.EXTRACTORS[extractor]["pages"](len(doc), params)
+            if not pages:
+                # Nothing to extract: finished as soon as it is known
+                queue.record_pdf(run, pdf_file, [])
+            items.extend((pdf_file, page) for page in pages)
+        return run, queue.enqueue(run, items)
+
+
+def collect(db_path, run, csv_path, store_path=None):
+    """Append PDFs finished since the last collect to pdf_image_data.csv (and the catalogue store)."""
+    with WorkQueue(db_path) as queue:
+        finished = queue.uncollected(run)
+        if not finished:
+            return 0
+        csv_exists = os.path.isfile(csv_path)
+        store = CatalogueStore(store_path) if store_path else None
+        try:
+            with open(csv_path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=batch_extract.CSV_FIELDNAMES)
+                if not csv_exists:
+                    writer.writeheader()
+                for pdf_file, files, finished_at in finished:
+                    date_extracted = datetime.datetime.fromtimestamp(finished_at).strftime("%Y-%m-%d %H:%M:%S")
+                    writer.writerow({"date_extracted": date_extracted, "pdf_filename": pdf_file,
+                                     "accepted_images_count": len(files)})
+                    if store is not None:
+                        store.record_extraction(pdf_file, len(files), date_extracted)
+        finally:
+            if store is not None:
+                store.close()
+        queue.mark_collected(run, [pdf_file for pdf_file, _, _ in finished])
+    return len(finished)
+
+
+def _latest_run(db_path):
+    with WorkQueue(db_path) as queue:
+        runs = queue.runs()
+    if not runs:
+        raise SystemExit(f"No runs in {db_path}; submit one first")
+    return runs[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared lease-based work queue for extraction runs.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Queue database (on a volume all workers share)")
+    parser.add_argument("--run", default=None, help="Run name (default: the latest run for work/status/collect)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = subparsers.add_parser("submit", help="Queue every PDF (or page) not yet in the run")
+    submit_parser.add_argument("--pdf-dir", default=os.path.join("pdfs", "pdfs"))
+    submit_parser.add_argument("--output-dir", default=os.path.join("pdfs", "Images"))
+    submit_parser.add_argument("--extractor", choices=sorted(batch_extract.EXTRACTORS), default="charts")
+    submit_parser.add_argument("--by-page", action="store_true", help="One job per page instead of per PDF")
+    batch_extract.add_chart_arguments(submit_parser)
+
+    work_parser = subparsers.add_parser("work", help="Lease and run jobs until the run is finished")
+    work_parser.add_argument("--processes", type=int, default=1, help="Worker processes on this node")
+    work_parser.add_argument("--batch", type=int, default=1, help="Jobs leased at a time")
+    work_parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+    work_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    work_parser.add_argument("--poll-seconds", type=float, default=DEFAULT_POLL_SECONDS)
+    work_parser.add_argument("--max-jobs", type=int, default=None, help="Stop after this many jobs per process")
+    work_parser.add_argument("--pdf-dir", default=None, help="Where this node sees the run's PDF directory")
+    work_parser.add_argument("--output-dir", default=None, help="Where this node sees the run's output directory")
+    tracing.add_arguments(work_parser)
+
+    subparsers.add_parser("status", help="Job counts, active workers and failures")
+    subparsers.add_parser("retry", help="Queue the failed jobs again")
+
+    collect_parser = subparsers.add_parser("collect", help="Record finished PDFs in pdf_image_data.csv")
+    collect_parser.add_argument("--csv-path", default="pdf_image_data.csv")
+    collect_parser.add_argument("--store", default=None, help="Also record them in this catalogue store (SQLite)")
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        run, added = submit(args.db, args.pdf_dir, args.output_dir, args.extractor,
+                            batch_extract._cli_params(args), args.by_page, args.run)
+        print(f"Run {run}: {added} new job(s) queued in {args.db}")
+        return
+
+    run = args.run or _latest_run(args.db)
+    if args.command == "work":
+        kwargs = {"db_path": args.db, "run": run, "batch": args.batch, "lease_seconds": args.lease_seconds,
+                  "max_attempts": args.max_attempts, "poll_seconds": args.poll_seconds, "pdf_dir": args.pdf_dir,
+                  "output_dir": args.output_dir, "max_jobs": args.max_jobs}
+        with tracing.run_from_args(args, "work"):
+            if args.processes > 1:
+                with multiprocessing.Pool(processes=args.processes) as pool:
+                    completed = sum(pool.map(_work_process, [kwargs] * args.processes))
+            else:
+                completed = work(**kwargs)
+        print(f"Completed {completed} job(s) of run {run}")
+    elif args.command == "retry":
+        with WorkQueue(args.db) as queue:
+            print(f"{queue.retry_failed(run)} failed job(s) queued again")
+    elif args.command == "collect":
+        print(f"Recorded {collect(args.db, run, args.csv_path, args.store)} PDF(s) in {args.csv_path}")
+    else:
+        with WorkQueue(args.db) as queue:
+            status = queue.status(run)
+        jobs = status["jobs"]
+        print(f"Run {run}: {jobs[DONE]} done, {jobs[LEASED]} leased, {jobs[PENDING]} pending, {jobs[FAILED]} failed; "
+              f"{status['pdfs_done']} PDFs finished ({status['pdfs_uncollected']} not yet collected)")
+        now = time.time()
+        for entry in status["workers"]:
+            print(f"  {entry['worker']}: {entry['jobs']} job(s), lease ends in {entry['lease_expires'] - now:.0f}s")
+        for entry in status["failures"]:
+            page = {_WHOLE_PDF: "", _FINALISE: " (finalise)"}.get(entry["page"], f" page {entry['page'] + 1}")
+            print(f"  failed: {entry['pdf_filename']}{page} after {entry['attempts']} attempt(s): {entry['error']}")
+
+
+if __name__ == "__main__":
+    main()
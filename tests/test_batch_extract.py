@@ -0,0 +1,52 @@
+import csv
+
+import pytest
+
+from scraping_task import batch_extract
+
+
+def _fake_pdf(pdf_path, params=None):
+    stem = pdf_path.rsplit("/", 1)[-1][:-4]
+    return [(f"{stem}_plot_1.png", b"png"), (f"{stem}_plot_2.png", b"png")]
+
+
+@pytest.fixture
+def pdf_dir(tmp_path, monkeypatch):
+    # Pool workers are forked, so they see the patched table too
+    monkeypatch.setitem(batch_extract.EXTRACTORS, "fake", {**batch_extract.EXTRACTORS["charts"], "pdf": _fake_pdf})
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    for name in ("a.pdf", "b.pdf"):
+        (pdf_dir / name).write_bytes(b"%PDF-1.4")
+    return pdf_dir
+
+
+def test_pdf_with_a_failed_write_is_not_recorded(pdf_dir, tmp_path):
+    output_dir = tmp_path / "out"
+    # A directory where a's second chart should go makes that write fail
+    (output_dir / "a_plot_2.png").mkdir(parents=True)
+    csv_path = tmp_path / "pdf_image_data.csv"
+
+    processed = batch_extract.extract_charts_from_all_pdfs(str(pdf_dir), str(output_dir), str(csv_path), workers=1,
+                                                           extractor="fake", cache_dir=None)
+    assert processed == 1
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [(row["pdf_filename"], row["accepted_images_count"]) for row in rows] == [("b.pdf", "2")]
+    assert (output_dir / "b_plot_2.png").read_bytes() == b"png"
+
+
+def test_failed_write_is_not_cached(pdf_dir, tmp_path):
+    output_dir = tmp_path / "out"
+    (output_dir / "a_plot_1.png").mkdir(parents=True)
+    csv_path, cache_dir = tmp_path / "data.csv", tmp_path / "cache"
+    batch_extract.extract_charts_from_all_pdfs(str(pdf_dir), str(output_dir), str(csv_path), workers=1,
+                                               extractor="fake", cache_dir=str(cache_dir))
+
+    # Once the path is writable, a is extracted again rather than served from the cache
+    (output_dir / "a_plot_1.png").rmdir()
+    batch_extract.extract_charts_from_all_pdfs(str(pdf_dir), str(output_dir), str(csv_path), workers=1,
+                                               extractor="fake", cache_dir=str(cache_dir))
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        assert [row["pdf_filename"] for row in csv.DictReader(f)] == ["b.pdf", "a.pdf", "b.pdf"]
+    assert (output_dir / "a_plot_1.png").is_file()
@@ -0,0 +1,77 @@
+import csv
+
+import pytest
+
+from scraping_task.catalogue_store import CatalogueStore
+
+DF_7 = (
+    "date_extracted,pdf_filename,accepted_images_count,month,year,date,note\n"
+    "2018-01-01,01_2018.pdf,0,1,2018,2018-01-01,Manual correction implemented\n"
+    "2018-02-01,02_2018.pdf,7,2,2018,2018-02-01,Manually deleted 5 images\n"
+    "2019-11-01,11_2019.pdf,12,11,2019,2019-11-01,\n"
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    with CatalogueStore(str(tmp_path / "catalogue.sqlite")) as store:
+        yield store
+
+
+def test_df_7_round_trips(store, tmp_path):
+    source = tmp_path / "df_7.csv"
+    source.write_text(DF_7, encoding="utf-8")
+    assert store.import_csv(str(source)) == 3
+    assert store.get("02_2018.pdf")["accepted_images_count"] == 7
+    assert store.get("11_2019.pdf")["note"] is None
+
+    exported = tmp_path / "exported.csv"
+    assert store.export_csv(str(exported), schema="df_7") == 3
+    assert exported.read_text(encoding="utf-8") == DF_7
+
+
+def test_import_takes_pandas_floats_and_any_row_order(store, tmp_path):
+    header, *rows = DF_7.splitlines(keepends=True)
+    shuffled = [rows[2], rows[0], rows[1].replace(",7,2,", ",7.0,2.0,")]
+    source = tmp_path / "df_7.csv"
+    source.write_text(header + "".join(shuffled), encoding="utf-8")
+    store.import_csv(str(source))
+
+    exported = tmp_path / "exported.csv"
+    store.export_csv(str(exported), schema="df_7")
+    assert exported.read_text(encoding="utf-8") == DF_7
+
+
+def test_df_8_export_keeps_its_columns(store, tmp_path):
+    source = tmp_path / "df_7.csv"
+    source.write_text(DF_7, encoding="utf-8")
+    store.import_csv(str(source))
+
+    exported = tmp_path / "df_8.csv"
+    store.export_csv(str(exported), schema="df_8")
+    with open(exported, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["pdf_filename", "accepted_images_count", "date", "note"]
+    assert rows[2] == ["02_2018.pdf", "7", "2018-02-01", "Manually deleted 5 images"]
+
+
+def test_append_note_and_add_accepted_on_an_existing_row(store):
+    store.record_extraction("02_2018.pdf", 12, date_extracted="2018-02-01")
+    assert store.append_note("02_2018.pdf", "Manually deleted 5 images") == "Manually deleted 5 images"
+    assert store.append_note("02_2018.pdf", "manually added 0 images") == \
+        "Manually deleted 5 images; manually added 0 images"
+    assert store.add_accepted("02_2018.pdf", -5) == 7
+    assert store.add_accepted("02_2018.pdf", 2) == 9
+
+    row = store.get("02_2018.pdf")
+    assert row["date_extracted"] == "2018-02-01"
+    assert (row["month"], row["year"], row["date"]) == (2, 2018, "2018-02-01")
+
+
+def test_append_note_and_add_accepted_on_a_new_row(store):
+    assert store.append_note("03_2018.pdf", "Manual correction implemented") == "Manual correction implemented"
+    assert store.add_accepted("04_2018.pdf", 3) == 3
+    # A deletion never takes a new row below zero
+    assert store.add_accepted("05_2018.pdf", -1) == 0
+    assert len(store) == 3
+    assert store.get("03_2018.pdf")["accepted_images_count"] is None
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from scraping_task.chart_digitiser import digitise_pdf, parse_date_label, parse_value
+
+PDF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pdfs", "pdfs")
+
+
+def _digitise(pdf_file):
+    pdf_path = os.path.join(PDF_DIR, pdf_file)
+    if not os.path.isfile(pdf_path):
+        pytest.skip(f"{pdf_file} is not in pdfs/pdfs")
+    return digitise_pdf(pdf_path)
+
+
+def test_parse_labels():
+    assert parse_value("$90,000") == 90000
+    assert parse_value("-5%") == -5
+    assert parse_value("1.5K") == 1500
+    assert parse_value("Jan-16") is None
+    assert parse_date_label("Jan-16") == (1, 2016, False)
+    assert parse_date_label("18-Jan") == (1, 2018, False)
+    assert parse_date_label("Dec (est.)") == (12, None, True)
+    assert parse_date_label("2019") == (None, 2019, False)
+    assert parse_date_label("Sleeper") is None
+
+
+def test_retail_selling_price_chart_of_01_2019():
+    chart = _digitise("01_2019.pdf")
+    assert chart["page"] == 3 and chart["reason"] is None
+    assert chart["chart"].startswith("Average Retail Selling Price: 3-5 Year-Old Sleeper Tractors")
+    series = {s["name"]: s for s in chart["series"]}
+    # The 3-year-old line has no legend swatch in the PDF
+    assert sorted(series) == ["3-5YO Avg.", "4YO", "5YO", "series #4f81bd"]
+
+    for s in series.values():
+        assert s["kind"] == "line"
+        dates = [date for date, _, _ in s["points"]]
+        assert len(dates) == 36 and dates[0] == "2016-01" and dates[-1] == "2018-12"
+        assert [estimated for _, _, estimated in s["points"]] == [False] * 35 + [True]
+        assert all(30_000 < value < 100_000 for _, value, _ in s["points"])
+
+    values = {name: dict((date, value) for date, value, _ in s["points"]) for name, s in series.items()}
+    assert values["series #4f81bd"]["2016-01"] == pytest.approx(92_884, abs=200)
+    assert values["5YO"]["2018-06"] == pytest.approx(48_531, abs=200)
+    # The average line sits on the mean of the three model-year lines
+    for date, average in values["3-5YO Avg."].items():
+        mean = (values["series #4f81bd"][date] + values["4YO"][date] + values["5YO"][date]) / 3
+        assert average == pytest.approx(mean, rel=0.005)
+
+
+def test_consecutive_reports_agree():
+    december = {s["name"]: dict((d, v) for d, v, _ in s["points"]) for s in _digitise("12_2018.pdf")["series"]}
+    january = {s["name"]: dict((d, v) for d, v, _ in s["points"]) for s in _digitise("01_2019.pdf")["series"]}
+    for name in january:
+        for date in ("2016-06", "2017-06", "2018-06"):
+            assert january[name][date] == pytest.approx(december[name][date], rel=0.001)
+
+
+def test_chart_without_vector_series_reports_why():
+    chart = _digitise("01_2021.pdf")
+    assert chart["series"] == [] and chart["reason"] == "no vector series"
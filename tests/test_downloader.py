@@ -0,0 +1,133 @@
+import csv
+import glob
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scraping_task import downloader
+from scraping_task.rate_scheduler import RateScheduler
+
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """A CDN stand-in: one PDF with an ETag, conditional GETs, ranges and an HTML page."""
+
+    body = b""
+    etag = ""
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        type(self).requests.append((self.path, dict(self.headers)))
+        if self.path == "/page":
+            return self._send(200, b"<html></html>", "text/html")
+        if self.path != "/report.pdf":
+            return self._send(404, b"not found", "text/plain")
+        if self.headers.get("If-None-Match") == self.etag:
+            return self._send(304, b"", None)
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", self.etag) == self.etag:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            return self._send(206, self.body[start:], "application/pdf",
+                              {"Content-Range": f"bytes {start}-{len(self.body) - 1}/{len(self.body)}"})
+        return self._send(200, self.body, "application/pdf")
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("ETag", self.etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    StandIn.body = b"%PDF-1.4 " + bytes(range(256)) * 64
+    StandIn.etag = '"v1"'
+    StandIn.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def session():
+    # A private scheduler: no pacing to speak of and no rate_state.json
+    session = downloader.make_session(scheduler=RateScheduler(limits={"rate": 1000.0, "burst": 100}))
+    yield session
+    session.close()
+
+
+def _read_csv(pattern):
+    path, = glob.glob(pattern)
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_download_all_and_rerun(server, session, tmp_path):
+    pdfs, logs = str(tmp_path / "pdfs"), str(tmp_path / "logs")
+    links = [f"{server}/report.pdf", f"{server}/report.pdf", f"{server}/page", f"{server}/missing.pdf"]
+
+    counts = downloader.download_all(links, pdfs, logs, workers=2, session=session)
+    assert counts == {"downloaded": 1, "not_modified": 0, "duplicates": 1, "non_pdf": 1, "errors": 1}
+    assert (tmp_path / "pdfs" / "report.pdf").read_bytes() == StandIn.body
+    assert not (tmp_path / "pdfs" / "report.pdf.part").exists()
+    state = downloader.load_state(pdfs)[f"{server}/report.pdf"]
+    assert state == {"filename": "report.pdf", "etag": '"v1"', "last_modified": LAST_MODIFIED}
+
+    assert _read_csv(os.path.join(logs, "duplicate_links_*.csv")) == [["URL"], [f"{server}/report.pdf"]]
+    assert _read_csv(os.path.join(logs, "non_pdf_links_*.csv")) == [["URL", "Content-Type"],
+                                                                    [f"{server}/page", "text/html"]]
+    errors = _read_csv(os.path.join(logs, "error_links_*.csv"))
+    assert errors[1][0] == f"{server}/missing.pdf" and "404" in errors[1][1]
+    summary = dict(_read_csv(os.path.join(logs, "download_summary_*.csv"))[1:])
+    assert summary["Successful Downloads"] == "1" and summary["Non-PDF Links"] == "1"
+
+    # A rerun sends the remembered validators and keeps the file
+    for path in glob.glob(os.path.join(logs, "*.csv")):
+        os.remove(path)
+    StandIn.requests = []
+    counts = downloader.download_all([f"{server}/report.pdf"], pdfs, logs, session=session)
+    assert counts["not_modified"] == 1 and counts["downloaded"] == 0
+    headers = StandIn.requests[0][1]
+    assert headers["If-None-Match"] == '"v1"' and headers["If-Modified-Since"] == LAST_MODIFIED
+    assert (tmp_path / "pdfs" / "report.pdf").read_bytes() == StandIn.body
+
+
+def test_partial_download_is_resumed_with_range(server, session, tmp_path):
+    output_path = str(tmp_path / "report.pdf")
+    with open(output_path + ".part", "wb") as f:
+        f.write(StandIn.body[:1000])
+
+    result = downloader.download_pdf(session, f"{server}/report.pdf", output_path, {"partial_etag": '"v1"'})
+    assert result["status"] == "downloaded" and result["resumed"]
+    headers = StandIn.requests[0][1]
+    assert headers["Range"] == "bytes=1000-" and headers["If-Range"] == '"v1"'
+    assert (tmp_path / "report.pdf").read_bytes() == StandIn.body
+
+
+def test_changed_pdf_is_downloaded_again_in_full(server, session, tmp_path):
+    output_path = str(tmp_path / "report.pdf")
+    with open(output_path + ".part", "wb") as f:
+        f.write(StandIn.body[:1000])
+    StandIn.body = b"%PDF-1.4 new edition " + bytes(range(256)) * 32
+    StandIn.etag = '"v2"'
+
+    result = downloader.download_pdf(session, f"{server}/report.pdf", output_path, {"partial_etag": '"v1"'})
+    assert result["status"] == "downloaded" and not result["resumed"]
+    assert result["etag"] == '"v2"'
+    assert StandIn.requests[0][1]["If-Range"] == '"v1"'
+    assert (tmp_path / "report.pdf").read_bytes() == StandIn.body
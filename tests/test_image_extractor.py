@@ -0,0 +1,26 @@
+import os
+
+import fitz  # PyMuPDF
+import pytest
+
+from scraping_task import image_extractor
+
+PDF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pdfs", "pdfs")
+
+
+@pytest.fixture
+def pdf_02_2019():
+    pdf_path = os.path.join(PDF_DIR, "02_2019.pdf")
+    if not os.path.isfile(pdf_path):
+        pytest.skip("02_2019.pdf is not in pdfs/pdfs")
+    return pdf_path
+
+
+def test_images_are_scored_at_full_size(pdf_02_2019):
+    # 5.ipynb accepted 7 images; scored on a 1024 px copy, xref 64 (1280x749) scores 6 instead of 4
+    assert len(image_extractor.extract_images_from_pdf(pdf_02_2019)) == 7
+    with fitz.open(pdf_02_2019) as doc:
+        full_size = [image["xref"] for image in image_extractor.extract_page_images(doc[4])]
+        downscaled = [image["xref"] for image in image_extractor.extract_page_images(
+            doc[4], params={"feature_max_side": 1024})]
+    assert full_size == [62] and downscaled == [62, 64]
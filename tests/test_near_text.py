@@ -0,0 +1,42 @@
+import os
+
+import fitz  # PyMuPDF
+import numpy as np
+import pytest
+
+from scraping_task.near_text import extract_chart_near_text
+
+PDF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pdfs", "pdfs")
+
+
+def _capture(pdf_file, raster_cache_dir=None):
+    pdf_path = os.path.join(PDF_DIR, pdf_file)
+    if not os.path.isfile(pdf_path):
+        pytest.skip(f"{pdf_file} is not in pdfs/pdfs")
+    # Start from an empty MuPDF store, as a fresh process would
+    fitz.TOOLS.store_shrink(100)
+    return extract_chart_near_text(pdf_path, ["Retail Selling Price"], pixels_above=20, pixels_below=300,
+                                   raster_cache_dir=raster_cache_dir)
+
+
+def _pixels(png):
+    pix = fitz.Pixmap(png)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+
+def test_cached_strip_is_identical_without_embedded_images(tmp_path):
+    uncached = _capture("01_2018.pdf")
+    _capture("01_2018.pdf", str(tmp_path))
+    cached = _capture("01_2018.pdf", str(tmp_path))
+    assert cached == uncached
+
+
+def test_cached_strip_matches_the_clipped_render(tmp_path):
+    # The strip cuts through the page's background image, which MuPDF resamples per clip
+    filename, uncached = _capture("01_2019.pdf")
+    cached_filename, cached = _capture("01_2019.pdf", str(tmp_path))
+    assert cached_filename == filename
+    a, b = _pixels(uncached), _pixels(cached)
+    assert a.shape == b.shape
+    assert (a != b).any(axis=2).mean() < 0.02
+    assert abs(len(cached) - len(uncached)) < 0.01 * len(uncached)
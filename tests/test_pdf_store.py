@@ -0,0 +1,138 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scraping_task import downloader
+from scraping_task.pdf_store import PdfStore
+from scraping_task.rate_scheduler import RateScheduler
+
+REPORT = b"%PDF-1.4 report " + bytes(range(256)) * 64
+# Same size as REPORT, different content
+OTHER = b"%PDF-1.4 others " + bytes(reversed(range(256))) * 64
+
+
+class Mirrors(BaseHTTPRequestHandler):
+    """CDN and mirror stand-ins: each path serves a body with its own ETag, to HEAD and GET."""
+
+    files = {}  # path -> (body, etag)
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def _respond(self, send_body):
+        type(self).requests.append((self.command, self.path))
+        if self.path not in self.files:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body, etag = self.files[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    Mirrors.files = {"/report.pdf": (REPORT, '"r1"')}
+    Mirrors.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Mirrors)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def session():
+    session = downloader.make_session(scheduler=RateScheduler(limits={"rate": 1000.0, "burst": 100}))
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PdfStore(str(tmp_path / "store"))
+
+
+def _names(tmp_path):
+    return str(tmp_path / "pdfs")
+
+
+def _fetch_report(store, session, server, tmp_path):
+    result = store.fetch(session, f"{server}/report.pdf", _names(tmp_path), "02_2019.pdf")
+    assert result["status"] == "downloaded" and result["created"]
+    Mirrors.requests = []
+    return result
+
+
+def test_known_url_makes_no_request(server, session, store, tmp_path):
+    first = _fetch_report(store, session, server, tmp_path)
+    assert (tmp_path / "pdfs" / "02_2019.pdf").read_bytes() == REPORT
+
+    # A fresh store reads the index back
+    result = PdfStore(store.root).fetch(session, f"{server}/report.pdf", _names(tmp_path), "02_2019.pdf")
+    assert result == {"status": "known", "sha256": first["sha256"], "filename": "02_2019.pdf", "created": False}
+    assert Mirrors.requests == []
+
+
+def test_etag_and_size_match_skips_the_download(server, session, store, tmp_path):
+    first = _fetch_report(store, session, server, tmp_path)
+    Mirrors.files["/mirror.pdf"] = (REPORT, 'W/"r1"')
+
+    result = store.fetch(session, f"{server}/mirror.pdf", _names(tmp_path), "February 2019.pdf")
+    assert result["status"] == "duplicate" and result["sha256"] == first["sha256"]
+    assert result["filename"] == "02_2019.pdf" and not result["created"]
+    assert Mirrors.requests == [("HEAD", "/mirror.pdf")]
+    assert store.urls[f"{server}/mirror.pdf"]["sha256"] == first["sha256"]
+
+
+def test_size_only_match_under_another_month_is_downloaded(server, session, store, tmp_path):
+    _fetch_report(store, session, server, tmp_path)
+    Mirrors.files["/other.pdf"] = (OTHER, '"o1"')
+    assert store.likely_duplicate(len(OTHER), None, "02_2019.pdf") is not None
+
+    result = store.fetch(session, f"{server}/other.pdf", _names(tmp_path), "03_2019.pdf")
+    assert result["status"] == "downloaded" and result["filename"] == "03_2019.pdf" and result["created"]
+    assert Mirrors.requests == [("HEAD", "/other.pdf"), ("GET", "/other.pdf")]
+    assert (tmp_path / "pdfs" / "03_2019.pdf").read_bytes() == OTHER
+    assert len(store.blobs) == 2
+
+
+def test_downloaded_copy_of_a_stored_pdf_is_deduplicated(server, session, store, tmp_path):
+    first = _fetch_report(store, session, server, tmp_path)
+    # No ETag match and a name the size check will not trust
+    Mirrors.files["/copy.pdf"] = (REPORT, '"c1"')
+
+    result = store.fetch(session, f"{server}/copy.pdf", _names(tmp_path), "03_2019.pdf")
+    assert result["status"] == "deduplicated" and result["sha256"] == first["sha256"]
+    assert result["filename"] == "02_2019.pdf" and not result["created"]
+    assert ("GET", "/copy.pdf") in Mirrors.requests
+    assert list(store.blobs) == [first["sha256"]]
+    assert os.listdir(os.path.join(store.root, "incoming")) == []
+    assert not (tmp_path / "pdfs" / "03_2019.pdf").exists()
+
+
+def test_name_held_by_different_content_gets_a_suffix(server, session, store, tmp_path):
+    (tmp_path / "pdfs").mkdir()
+    (tmp_path / "pdfs" / "02_2019.pdf").write_bytes(OTHER)
+
+    result = store.fetch(session, f"{server}/report.pdf", _names(tmp_path), "02_2019.pdf")
+    assert result["status"] == "downloaded"
+    assert result["filename"] == "02_2019_1.pdf" and result["created"]
+    assert (tmp_path / "pdfs" / "02_2019.pdf").read_bytes() == OTHER
+    assert (tmp_path / "pdfs" / "02_2019_1.pdf").read_bytes() == REPORT
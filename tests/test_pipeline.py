@@ -0,0 +1,65 @@
+import sqlite3
+import threading
+
+from scraping_task import pipeline
+from scraping_task.pipeline import Pipeline, _DONE
+
+
+def _run_catalogue(p, items):
+    """Feed items through the catalogue stage the way the extract workers do; returns whether it finished."""
+    thread = threading.Thread(target=p._catalogue, daemon=True)
+    thread.start()
+    for item in items:
+        p.catalogue_queue.put(item, timeout=10)
+    p.catalogue_queue.put(_DONE, timeout=10)
+    thread.join(timeout=10)
+    return not thread.is_alive()
+
+
+def _items(n):
+    return [(f"{i:02d}_2020.pdf", [(f"{i:02d}_2020_plot_1.png", b"png")], "extracted", None) for i in range(n)]
+
+
+def test_catalogue_survives_a_failing_store(tmp_path, monkeypatch):
+    class BrokenStore:
+        def __init__(self, path):
+            pass
+
+        def record_extraction(self, *args):
+            raise sqlite3.OperationalError("database is locked")
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(pipeline, "CatalogueStore", BrokenStore)
+    p = Pipeline(str(tmp_path / "pdfs"), str(tmp_path / "out"), str(tmp_path / "data.csv"), queue_size=2,
+                 cache_dir=None, store_path=str(tmp_path / "catalogue.sqlite"))
+    assert _run_catalogue(p, _items(6))
+    assert p.stats["catalogue"].failed == 6
+
+
+def test_catalogue_drains_when_it_cannot_start(tmp_path):
+    # The CSV's directory does not exist
+    p = Pipeline(str(tmp_path / "pdfs"), str(tmp_path / "out"), str(tmp_path / "missing" / "data.csv"),
+                 queue_size=2, cache_dir=None)
+    assert _run_catalogue(p, _items(5))
+    assert p.stats["catalogue"].failed == 5
+
+
+def test_catalogue_records_every_pdf(tmp_path):
+    p = Pipeline(str(tmp_path / "pdfs"), str(tmp_path / "out"), str(tmp_path / "data.csv"), queue_size=2,
+                 cache_dir=None)
+    assert _run_catalogue(p, _items(3))
+    assert p.stats["catalogue"].processed == 3
+    assert len((tmp_path / "data.csv").read_text().splitlines()) == 4
+    assert sorted(path.name for path in (tmp_path / "out").iterdir()) == [
+        "00_2020_plot_1.png", "01_2020_plot_1.png", "02_2020_plot_1.png"]
+
+
+def test_pdf_with_a_failed_write_is_not_recorded(tmp_path):
+    (tmp_path / "out" / "00_2020_plot_1.png").mkdir(parents=True)
+    p = Pipeline(str(tmp_path / "pdfs"), str(tmp_path / "out"), str(tmp_path / "data.csv"), queue_size=2,
+                 cache_dir=None)
+    assert _run_catalogue(p, _items(2))
+    assert (p.stats["catalogue"].processed, p.stats["catalogue"].failed) == (1, 1)
+    assert [line.split(",")[1] for line in (tmp_path / "data.csv").read_text().splitlines()[1:]] == ["01_2020.pdf"]
@@ -0,0 +1,148 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scraping_task.rate_scheduler import DEFAULT_LIMITS, HostLimiter, RateScheduler, ScheduledSession, parse_retry_after
+
+
+def _limiter(**limits):
+    return HostLimiter("example.com", {**DEFAULT_LIMITS, **limits})
+
+
+def test_token_bucket_paces_after_the_burst():
+    limiter = _limiter(rate=20.0, burst=2, increase=0.0)
+    started = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+        limiter.release()
+    # Two requests from the burst, then one every 1/20 s
+    assert 0.18 <= time.monotonic() - started < 0.5
+
+
+def test_concurrency_limit_blocks_until_release():
+    limiter = _limiter(rate=1000.0, burst=10, concurrency=1)
+    limiter.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(1)
+    thread.join()
+
+
+def test_parse_retry_after():
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(format_datetime(now + timedelta(seconds=30), usegmt=True), now=now) == 30.0
+    assert parse_retry_after(format_datetime(now - timedelta(seconds=30), usegmt=True), now=now) == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+@pytest.mark.parametrize("outcome", [{"status": 429}, {"status": 503}, {"status": 500}, {"error": True}])
+def test_throttling_and_errors_halve_the_rate(outcome):
+    limiter = _limiter(rate=4.0)
+    limiter.record(latency=0.1, **outcome)
+    assert limiter.rate == 2.0
+    # The burst is spent: the next request waits a full interval at the new rate
+    assert limiter.tokens <= 0 and limiter.blocked_until > time.monotonic()
+
+
+def test_rate_grows_after_fast_successes_up_to_max_rate():
+    limiter = _limiter(rate=1.0, increase=0.25, max_rate=1.5)
+    limiter.record(200, 0.1)
+    assert limiter.rate == 1.25
+    for _ in range(5):
+        limiter.record(200, 0.1)
+    assert limiter.rate == 1.5
+
+
+def test_slow_responses_halve_the_rate():
+    limiter = _limiter(rate=4.0, slow_seconds=1.0)
+    limiter.record(200, 5.0)
+    assert limiter.rate == 2.0 and limiter.stats["slow"] == 1
+
+
+def test_retry_after_blocks_the_host():
+    limiter = _limiter(rate=100.0, max_retry_after=300.0)
+    limiter.record(429, 0.1, retry_after=0.3)
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.25
+    # A huge Retry-After is capped
+    limiter.record(429, 0.1, retry_after=10_000)
+    assert limiter.blocked_until - time.monotonic() <= 300.0
+
+
+class StandIn(BaseHTTPRequestHandler):
+    throttle = 0
+    redirect_to = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/throttled" and type(self).throttle > 0:
+            type(self).throttle -= 1
+            return self._send(429, {"Retry-After": "0"})
+        if self.path == "/moved":
+            return self._send(302, {"Location": type(self).redirect_to})
+        self._send(200, {"Content-Type": "application/pdf"}, b"%PDF-1.4")
+
+    def _send(self, status, headers, body=b""):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_port
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def scheduler():
+    return RateScheduler(limits={"rate": 100.0, "burst": 10})
+
+
+def test_session_retries_a_429(server, scheduler):
+    StandIn.throttle = 1
+    with ScheduledSession(scheduler) as session:
+        response = session.get(f"http://127.0.0.1:{server}/throttled")
+    assert response.status_code == 200
+    summary = scheduler.summary()["127.0.0.1"]
+    assert summary["requests"] == 2 and summary["throttled"] == 1
+
+
+def test_session_paces_each_redirect_hop_on_its_own_host(server, scheduler):
+    # "localhost" and "127.0.0.1" are the same server but different hosts to the scheduler
+    StandIn.redirect_to = f"http://localhost:{server}/report.pdf"
+    with ScheduledSession(scheduler) as session:
+        response = session.get(f"http://127.0.0.1:{server}/moved")
+        assert response.status_code == 200 and response.content == b"%PDF-1.4"
+        assert [r.status_code for r in response.history] == [302]
+        streamed = session.get(f"http://127.0.0.1:{server}/moved", stream=True)
+        streamed.close()
+    summary = scheduler.summary()
+    assert summary["127.0.0.1"]["requests"] == 2 and summary["localhost"]["requests"] == 2
+    assert scheduler.host("http://127.0.0.1/").active == 0 and scheduler.host("http://localhost/").active == 0
+
+
+def test_redirects_can_be_left_unfollowed(server, scheduler):
+    StandIn.redirect_to = f"http://localhost:{server}/report.pdf"
+    with ScheduledSession(scheduler) as session:
+        response = session.get(f"http://127.0.0.1:{server}/moved", allow_redirects=False)
+    assert response.status_code == 302
+    assert "localhost" not in scheduler.summary()
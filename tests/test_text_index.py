@@ -0,0 +1,34 @@
+import os
+
+import fitz  # PyMuPDF
+import pytest
+
+from scraping_task.chart_extractor import find_chart_title
+from scraping_task.text_index import PageTextIndex, PdfTextIndex
+
+PDF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pdfs", "pdfs")
+
+
+def _open(pdf_file):
+    pdf_path = os.path.join(PDF_DIR, pdf_file)
+    if not os.path.isfile(pdf_path):
+        pytest.skip(f"{pdf_file} is not in pdfs/pdfs")
+    return fitz.open(pdf_path)
+
+
+def test_blocks_are_the_notebooks_text_blocks():
+    with _open("01_2019.pdf") as doc:
+        for page in doc:
+            expected = [fitz.Rect(block["bbox"]) for block in page.get_text("dict")["blocks"] if block["type"] == 0]
+            assert [block.rect for block in PageTextIndex.from_page(page).blocks] == expected
+
+
+# Images whose titles change if MuPDF groups the text differently (e.g. without TEXT_PRESERVE_IMAGES)
+@pytest.mark.parametrize("pdf_file, page_num, xref", [
+    ("01_2019.pdf", 1, 47), ("01_2019.pdf", 1, 161), ("01_2019.pdf", 5, 59), ("01_2019.pdf", 5, 348),
+    ("09_2020.pdf", 2, 55),
+])
+def test_untitled_images_stay_untitled(pdf_file, page_num, xref):
+    with _open(pdf_file) as doc:
+        rect = doc[page_num].get_image_rects(xref)[0]
+        assert find_chart_title(PdfTextIndex(doc).page(page_num), rect) == ("Unknown_Title", None)
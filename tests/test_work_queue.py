@@ -0,0 +1,146 @@
+import os
+import time
+
+import pytest
+
+from scraping_task import batch_extract, work_queue
+from scraping_task.work_queue import DONE, FAILED, LEASED, PENDING, WorkQueue
+
+RUN = "test-run"
+
+
+def _fake_page(pdf_path, page, params=None):
+    return [{"clean_title": f"page{page}", "image": f"{os.path.basename(pdf_path)}:{page}".encode()}]
+
+
+def _fake_name(pdf_file, page_results):
+    return [(f"{pdf_file}_{n}.png", chart["image"])
+            for n, chart in enumerate((chart for charts in page_results for chart in charts), 1)]
+
+
+@pytest.fixture
+def fake_extractor(monkeypatch):
+    monkeypatch.setitem(batch_extract.EXTRACTORS, "fake", {
+        "defaults": {}, "pdf": None, "page": _fake_page, "pages": lambda count, params: list(range(count)),
+        "name": _fake_name})
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=60, max_attempts=2)
+    queue.create_run(RUN, {"extractor": "fake", "params": {}, "by_page": True,
+                           "pdf_dir": str(tmp_path / "pdfs"), "output_dir": str(tmp_path / "out")})
+    yield queue
+    queue.close()
+
+
+def _expire(queue, worker):
+    queue.conn.execute("UPDATE jobs SET lease_expires = ? WHERE worker = ?", (time.time() - 1, worker))
+
+
+def test_expired_lease_is_reclaimed(queue):
+    queue.enqueue(RUN, [("a.pdf", None), ("b.pdf", None)])
+    first = queue.lease(RUN, "w1", n=2)
+    assert queue.lease(RUN, "w2") == []
+
+    _expire(queue, "w1")
+    reclaimed = queue.lease(RUN, "w2", n=2)
+    assert [job["pdf_filename"] for job in reclaimed] == ["a.pdf", "b.pdf"]
+    assert all(job["attempts"] == 2 for job in reclaimed)
+    # The first worker's late results are discarded
+    assert not queue.complete(RUN, first[0], "w1", {})
+    assert queue.heartbeat([job["id"] for job in first], "w1") == {job["id"] for job in first}
+    assert queue.complete(RUN, reclaimed[0], "w2", {}, files=[])
+
+
+def test_pending_jobs_are_leased_before_expired_ones(queue):
+    queue.enqueue(RUN, [("a.pdf", None)])
+    queue.lease(RUN, "w1")
+    _expire(queue, "w1")
+    queue.enqueue(RUN, [("b.pdf", None)])
+    assert [job["pdf_filename"] for job in queue.lease(RUN, "w2", n=2)] == ["b.pdf", "a.pdf"]
+
+
+def test_max_attempts(queue):
+    queue.enqueue(RUN, [("a.pdf", None), ("b.pdf", None)])
+    a, b = queue.lease(RUN, "w1", n=2)
+    queue.fail(a, "w1", "boom")
+    _expire(queue, "w1")
+    a, b = queue.lease(RUN, "w1", n=2)
+    assert (a["attempts"], b["attempts"]) == (2, 2)
+
+    # Out of attempts: a failure and an expired lease both end in FAILED
+    queue.fail(a, "w1", "boom again")
+    _expire(queue, "w1")
+    assert queue.lease(RUN, "w2") == []
+    status = queue.status(RUN)
+    assert status["jobs"][FAILED] == 2 and queue.remaining(RUN) == 0
+    assert {entry["error"] for entry in status["failures"]} == {"boom again", "lease expired"}
+
+    assert queue.retry_failed(RUN) == 2
+    assert len(queue.lease(RUN, "w2", n=2)) == 2
+
+
+def test_release_does_not_use_an_attempt(queue):
+    queue.enqueue(RUN, [("a.pdf", None)])
+    job, = queue.lease(RUN, "w1")
+    queue.release([job["id"]], "w1")
+    assert queue.status(RUN)["jobs"][PENDING] == 1
+    assert queue.lease(RUN, "w2")[0]["attempts"] == 1
+
+
+def test_last_page_queues_one_finalise_job(queue):
+    queue.enqueue(RUN, [("a.pdf", 0), ("a.pdf", 1)])
+    p0, p1 = queue.lease(RUN, "w1", n=2)
+    assert queue.complete(RUN, p0, "w1", {"charts": []})
+    assert queue.lease(RUN, "w2") == []
+    assert queue.complete(RUN, p1, "w1", {"charts": []})
+
+    finalise, = queue.lease(RUN, "w2", n=5)
+    assert finalise["page"] == work_queue._FINALISE
+    assert queue.remaining(RUN) == 1 and queue.status(RUN)["pdfs_done"] == 0
+    assert queue.complete(RUN, finalise, "w2", {"files": ["x.png"]}, files=["x.png"])
+    assert queue.uncollected(RUN)[0][:2] == ("a.pdf", ["x.png"])
+    assert queue.remaining(RUN) == 0
+
+
+def test_crashed_finaliser_is_reclaimed(queue, fake_extractor, tmp_path):
+    config = queue.run_config(RUN)
+    queue.enqueue(RUN, [("a.pdf", 0), ("a.pdf", 1)])
+    for job in queue.lease(RUN, "w1", n=2):
+        assert work_queue._run_page_job(queue, RUN, config, job, "w1")
+    staged = queue.page_results(RUN, "a.pdf")[0]["charts"][0]["staged"]
+    assert not os.path.isabs(staged)
+
+    # w1 leases the finalise job and dies before publishing
+    queue.lease(RUN, "w1")
+    _expire(queue, "w1")
+    assert queue.status(RUN)["pdfs_done"] == 0 and queue.remaining(RUN) == 1
+
+    # Another node sees the output directory elsewhere
+    moved = tmp_path / "mounted"
+    os.rename(config["output_dir"], moved)
+    completed = work_queue.work(queue.path, RUN, worker="w2", lease_seconds=60, poll_seconds=0,
+                                output_dir=str(moved))
+    assert completed == 1
+    assert sorted(os.listdir(moved)) == ["a.pdf_1.png", "a.pdf_2.png"]
+    assert (moved / "a.pdf_2.png").read_bytes() == b"a.pdf:1"
+    assert queue.status(RUN)["jobs"] == {PENDING: 0, LEASED: 0, DONE: 3, FAILED: 0}
+    assert [pdf for pdf, _, _ in queue.uncollected(RUN)] == ["a.pdf"]
+
+    # Completing it again (a stale worker) records nothing twice
+    queue.mark_collected(RUN, ["a.pdf"])
+    queue.record_pdf(RUN, "a.pdf", ["other.png"])
+    assert queue.uncollected(RUN) == []
+
+
+def test_work_runs_a_paged_pdf_end_to_end(queue, fake_extractor, tmp_path):
+    queue.enqueue(RUN, [("a.pdf", 0), ("a.pdf", 1), ("b.pdf", 0)])
+    assert work_queue.work(queue.path, RUN, worker="w1", poll_seconds=0, batch=2) == 5
+    out = tmp_path / "out"
+    assert sorted(os.listdir(out)) == ["a.pdf_1.png", "a.pdf_2.png", "b.pdf_1.png"]
+
+    csv_path = tmp_path / "pdf_image_data.csv"
+    assert work_queue.collect(queue.path, RUN, str(csv_path)) == 2
+    assert work_queue.collect(queue.path, RUN, str(csv_path)) == 0
+    assert len(csv_path.read_text().splitlines()) == 3